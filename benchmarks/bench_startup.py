@@ -0,0 +1,87 @@
+# Start-up benchmark of the command line client answering from the cache.
+#
+#   python benchmarks/bench_startup.py [--runs N] [--budget MS]
+#
+# Runs 'mnb-exchange-rate eur --cache-only' in fresh interpreters against a temporary cache,
+# reports the wall time and the import time of the package (python -X importtime), and fails
+# if a networking or XML module is imported on the cache-hit path or the import time exceeds
+# the budget.
+import argparse
+import os
+import pickle
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RATES = {'date': '2024-03-14', 'rates': [('1', 'EUR', '393,95'), ('1', 'USD', '360,12')]}
+FORBIDDEN_MODULES = ('requests', 'urllib3', 'http.client', 'xml.etree.ElementTree', 'xml.parsers.expat', 'html')
+CACHE_HIT = ("import sys\n"
+             "from mnbexchangerates import mnbexchangerates_cli\n"
+             "mnbexchangerates_cli.main(['eur', '--cache-only'])\n"
+             f"print(','.join(m for m in {FORBIDDEN_MODULES!r} if m in sys.modules), file=sys.stderr)\n")
+IMPORT_BUDGET_MS = 60
+
+
+def _environment(home):
+    environment = dict(os.environ, HOME=home, PYTHONPATH=ROOT)
+    # The thin client would be used instead of the cache.
+    environment.pop('MNB_EXCHANGE_RATE_SERVER', None)
+    return environment
+
+
+def write_cache(home):
+    cache_dir = os.path.join(home, '.config', 'mnbexchangerates')
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, 'exchange_rates.cache'), 'wb') as cache:
+        pickle.dump(RATES, cache, pickle.HIGHEST_PROTOCOL)
+
+
+def run_cache_hit(home):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', CACHE_HIT], env=_environment(home),
+                            capture_output=True, text=True, check=True)
+    return time.perf_counter() - start, result.stderr.strip().splitlines()[-1] if result.stderr.strip() else ''
+
+
+def import_time_ms(home):
+    # Cumulative import time of the CLI module in microseconds, as reported by -X importtime.
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import mnbexchangerates.mnbexchangerates_cli'],
+                            env=_environment(home), capture_output=True, text=True, check=True)
+    for line in result.stderr.splitlines():
+        if line.rstrip().endswith('| mnbexchangerates.mnbexchangerates_cli'):
+            return int(line.split('|')[1]) / 1000
+    raise RuntimeError('mnbexchangerates.mnbexchangerates_cli not found in -X importtime output')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Start-up benchmark of the cache-hit path of the CLI')
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--budget', type=float, default=IMPORT_BUDGET_MS,
+                        help='maximum median import time of the CLI in ms (default: %(default)s)')
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as home:
+        write_cache(home)
+        runs = [run_cache_hit(home) for _ in range(args.runs)]
+        imports = [import_time_ms(home) for _ in range(args.runs)]
+    wall_times = [wall_time * 1000 for wall_time, _ in runs]
+    forbidden = {module for _, modules in runs for module in modules.split(',') if module}
+    print(f'cache hit wall time: median {statistics.median(wall_times):.1f} ms, '
+          f'min {min(wall_times):.1f} ms ({args.runs} runs)')
+    print(f'CLI import time:     median {statistics.median(imports):.1f} ms, '
+          f'min {min(imports):.1f} ms (budget {args.budget:.0f} ms)')
+    failed = False
+    if forbidden:
+        print(f'FAIL: imported on the cache-hit path: {", ".join(sorted(forbidden))}')
+        failed = True
+    if statistics.median(imports) > args.budget:
+        print('FAIL: CLI import time is over budget')
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,277 @@
+# Local stand-in for the MNB SOAP web service, for benchmarks and load tests.
+#
+#   python benchmarks/fake_mnb.py --port 8000 --currencies 40 --latency 0.05
+#   python benchmarks/fake_mnb.py --error-rate 0.2 --error-kind reset --replay recorded.json
+#
+# Answers GetCurrentExchangeRates with the rates of today (or of the date set by publish())
+# and GetExchangeRates with the rates of every weekday of the requested range, for the
+# requested currencies, and the GetCurrencies, GetCurrencyUnits and GetInfo metadata
+# operations. The number of currencies, the response latency and the rate of injected errors
+# are configurable. Responses recorded from MNB (see load_test.py record) can be replayed
+# instead of the generated ones.
+import argparse
+from datetime import date as datetime_date
+from datetime import datetime
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+import itertools
+import json
+import random
+import re
+import string
+import threading
+import time
+
+
+CURRENCIES = ['EUR', 'USD', 'CHF', 'GBP', 'JPY', 'CZK', 'PLN', 'RON', 'SEK', 'NOK', 'DKK', 'CAD', 'AUD', 'CNY']
+HUNDRED_UNIT_CURRENCIES = ('JPY', 'KRW', 'IDR', 'ISK')
+CURRENT = 'GetCurrentExchangeRates'
+# Checked in this order against the request body, CURRENT being the default
+OPERATIONS = ('GetExchangeRates', 'GetCurrencyUnits', 'GetCurrencies', 'GetInfo')
+# Injected errors: HTTP 500, connection closed without a response, or a body that is not SOAP
+ERROR_KINDS = ('500', 'reset', 'malformed')
+RECORDING_FORMAT = 'mnbexchangerates-recording'
+DAY_DATE = re.compile(rb'(Day date=(?:"|&quot;))\d{4}-\d{2}-\d{2}')
+ENVELOPE = """<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
+<s:Body>
+<{operation}Response xmlns="http://www.mnb.hu/webservices/" xmlns:i="http://www.w3.org/2001/XMLSchema-instance">
+<{operation}Result>{result}</{operation}Result>
+</{operation}Response>
+</s:Body>
+</s:Envelope>"""
+
+
+def currency_codes(count):
+    letters = string.ascii_uppercase
+    synthetic = (''.join(code) for code in itertools.product('XYZ', letters, letters))
+    return list(itertools.islice(itertools.chain(CURRENCIES, synthetic), count))
+
+
+def rate(currency, date):
+    # Deterministic rate that changes from day to day, with the comma separator of MNB.
+    seed = sum(ord(letter) * 31 ** index for index, letter in enumerate(currency))
+    value = 100 + seed % 400 + (date.toordinal() % 97) / 100
+    return f'{value:.2f}'.replace('.', ',')
+
+
+def day_xml(date, currencies):
+    rates = ''.join(f'&lt;Rate unit="{unit(currency)}" curr="{currency}"&gt;'
+                    f'{rate(currency, date)}&lt;/Rate&gt;' for currency in currencies)
+    return f'&lt;Day date="{date.isoformat()}"&gt;{rates}&lt;/Day&gt;'
+
+
+def current_rates_response(currencies, today=None):
+    today = today or datetime_date.today()
+    result = f'&lt;MNBCurrentExchangeRates&gt;{day_xml(today, currencies)}&lt;/MNBCurrentExchangeRates&gt;'
+    return ENVELOPE.format(operation='GetCurrentExchangeRates', result=result).encode()
+
+
+def history_response(start_date, end_date, currencies):
+    start = datetime_date.fromisoformat(start_date)
+    days = [start + timedelta(offset) for offset in range((datetime_date.fromisoformat(end_date) - start).days + 1)]
+    # Newest day first, like MNB.
+    result = ''.join(day_xml(day, currencies) for day in reversed(days) if day.weekday() < 5)
+    result = f'&lt;MNBExchangeRates&gt;{result}&lt;/MNBExchangeRates&gt;'
+    return ENVELOPE.format(operation='GetExchangeRates', result=result).encode()
+
+
+def unit(currency):
+    return 100 if currency in HUNDRED_UNIT_CURRENCIES else 1
+
+
+def currencies_response(currencies):
+    result = ''.join(f'&lt;Curr&gt;{currency}&lt;/Curr&gt;' for currency in ['HUF'] + currencies)
+    result = f'&lt;MNBCurrencies&gt;&lt;Currencies&gt;{result}&lt;/Currencies&gt;&lt;/MNBCurrencies&gt;'
+    return ENVELOPE.format(operation='GetCurrencies', result=result).encode()
+
+
+def currency_units_response(currencies):
+    result = ''.join(f'&lt;Unit curr="{currency}"&gt;{unit(currency)}&lt;/Unit&gt;' for currency in currencies)
+    result = f'&lt;MNBCurrencyUnits&gt;&lt;Units&gt;{result}&lt;/Units&gt;&lt;/MNBCurrencyUnits&gt;'
+    return ENVELOPE.format(operation='GetCurrencyUnits', result=result).encode()
+
+
+def info_response(currencies, first_date='1949-01-03', today=None):
+    currency_list = ''.join(f'&lt;Curr&gt;{currency}&lt;/Curr&gt;' for currency in currencies)
+    result = (f'&lt;MNBExchangeRatesQueryValues&gt;&lt;FirstDate&gt;{first_date}&lt;/FirstDate&gt;'
+              f'&lt;LastDate&gt;{(today or datetime_date.today()).isoformat()}&lt;/LastDate&gt;'
+              f'&lt;Currencies&gt;{currency_list}&lt;/Currencies&gt;&lt;/MNBExchangeRatesQueryValues&gt;')
+    return ENVELOPE.format(operation='GetInfo', result=result).encode()
+
+
+def save_recording(path, url, responses):
+    # responses: {operation: response body}
+    with open(path, 'w', encoding='utf-8') as recording:
+        json.dump({'format': RECORDING_FORMAT,
+                   'url': url,
+                   'recorded': datetime.now().isoformat(timespec='seconds'),
+                   'responses': {name: content.decode() for name, content in responses.items()}},
+                  recording, indent=1)
+
+
+def load_recording(path):
+    with open(path, encoding='utf-8') as recording:
+        data = json.load(recording)
+    if data.get('format') != RECORDING_FORMAT:
+        raise ValueError(f'Not a recording of MNB responses: {path}')
+    return {name: content.encode() for name, content in data['responses'].items()}
+
+
+def operation(body):
+    return next((name for name in OPERATIONS if name in body), CURRENT)
+
+
+def _element_text(body, name):
+    match = re.search(rf'<(?:\w+:)?{name}>([^<]*)</', body)
+    return match.group(1) if match else None
+
+
+def _currency_names(body):
+    return [currency for currency in (_element_text(body, 'currencyNames') or '').split(',') if currency]
+
+
+def generated_response(name, body, currencies, today=None):
+    if name == 'GetExchangeRates':
+        return history_response(_element_text(body, 'startDate'), _element_text(body, 'endDate'),
+                                _currency_names(body))
+    if name == 'GetCurrencyUnits':
+        return currency_units_response(_currency_names(body))
+    if name == 'GetCurrencies':
+        return currencies_response(currencies)
+    if name == 'GetInfo':
+        return info_response(currencies, today=today)
+    return current_rates_response(currencies, today)
+
+
+class FakeMNBRequestHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):  # pylint: disable=C0103
+        fake = self.server.fake
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+        fake.record(body)
+        if fake.latency:
+            time.sleep(fake.latency)
+        status, content = fake.respond(body)
+        if content is None:
+            # Connection closed without a response
+            self.close_connection = True
+            return
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/soap+xml; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):  # pylint: disable=W0622
+        pass
+
+
+class FakeMNBServer:
+
+    def __init__(self, currencies=len(CURRENCIES), latency=0, host='127.0.0.1', port=0,
+                 error_rate=0, error_kind=ERROR_KINDS[0], replay=None):
+        self.currencies = currency_codes(currencies)
+        self.latency = latency
+        self.errors = {'rate': error_rate, 'kind': error_kind, 'injected': 0}
+        # {operation: recorded response body}, served instead of the generated responses
+        self.replay = replay or {}
+        # {'old': date, 'new': date, 'time': monotonic time of the switch}, see publish()
+        self.publication = None
+        self.requests = []
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), FakeMNBRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.fake = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/arfolyamok.asmx'
+
+    def record(self, body):
+        with self._lock:
+            self.requests.append(body)
+
+    def publish(self, old_date, new_date, after=0):
+        # The current rates are of old_date for 'after' seconds, then of new_date, like MNB publishing
+        # the new rates some time after the refresh hour.
+        self.publication = {'old': old_date, 'new': new_date, 'time': time.monotonic() + after}
+
+    def published_date(self):
+        if self.publication is None:
+            return datetime_date.today()
+        return self.publication['new' if time.monotonic() >= self.publication['time'] else 'old']
+
+    def operations(self):
+        with self._lock:
+            requests = list(self.requests)
+        counts = {}
+        for body in requests:
+            counts[operation(body)] = counts.get(operation(body), 0) + 1
+        return counts
+
+    def _error(self):
+        with self._lock:
+            self.errors['injected'] += 1
+        if self.errors['kind'] == 'reset':
+            return None, None
+        if self.errors['kind'] == 'malformed':
+            return 200, b'<html><body>Service Unavailable</body></html>'
+        return 500, b'Internal Server Error'
+
+    def respond(self, body):
+        # (status, content); content None means the connection is closed without a response.
+        if self.errors['rate'] and random.random() < self.errors['rate']:
+            return self._error()
+        name = operation(body)
+        content = self.replay.get(name)
+        if content is None:
+            return 200, generated_response(name, body, self.currencies, self.published_date())
+        if name == CURRENT and self.publication is not None:
+            # Recorded rates, with the date of the simulated publication
+            content = DAY_DATE.sub(rb'\g<1>' + self.published_date().isoformat().encode(), content)
+        return 200, content
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the MNB SOAP web service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--currencies', type=int, default=len(CURRENCIES),
+                        help='number of currencies in the current rates (default: %(default)s)')
+    parser.add_argument('--latency', type=float, default=0, help='seconds to wait before answering')
+    parser.add_argument('--error-rate', type=float, default=0, help='fraction of requests answered with an error')
+    parser.add_argument('--error-kind', choices=ERROR_KINDS, default=ERROR_KINDS[0],
+                        help='kind of the injected errors (default: %(default)s)')
+    parser.add_argument('--replay', help='serve the responses recorded in REPLAY (see load_test.py record)')
+    args = parser.parse_args()
+    fake = FakeMNBServer(args.currencies, args.latency, args.host, args.port, args.error_rate, args.error_kind,
+                         load_recording(args.replay) if args.replay else None)
+    print(f'Serving fake MNB web service on {fake.url}')
+    try:
+        fake.httpd.serve_forever()
+    except KeyboardInterrupt:
+        fake.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,353 @@
+# Load test of the cache refresh path: many processes and threads query the current rates
+# through MNBExchangeRates (or the command line client) against the local fake MNB server.
+#
+#   python benchmarks/load_test.py --processes 4 --threads 8 --duration 10
+#   python benchmarks/load_test.py --latency 0.2 --flip-after 3 --recheck-interval 1
+#   python benchmarks/load_test.py --error-rate 0.2 --error-kind reset --backoff 0.05
+#   python benchmarks/load_test.py --mode cli --processes 2 --threads 4 --backend sqlite
+#   python benchmarks/load_test.py record recorded.json      # record the responses of MNB
+#   python benchmarks/load_test.py --replay recorded.json
+#
+# By default the cache starts stale, holding the rates of the publication day before the
+# latest one, so every client wants to refresh it at once, as at 11:00. With --flip-after the
+# fake MNB answers with the old date for that many seconds before publishing the new rates.
+#
+# Modes: api keeps one MNBExchangeRates per thread, cold creates one per query (like separate
+# CLI runs, reading the cache every time) and cli starts the command line client per query.
+# A checker thread per process reads the cache continuously; a read that fails or gives
+# invalid contents once the cache has been written is counted as a corruption event.
+#
+# Reports throughput, latency percentiles, the upstream requests by operation, the injected
+# errors, the dates of the answered rates, cache events and corruption events.
+import argparse
+from collections import Counter
+from datetime import date as datetime_date
+from datetime import datetime
+from datetime import time as datetime_time
+from datetime import timedelta
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fake_mnb  # noqa: E402 pylint: disable=C0413
+from mnbexchangerates import mnbexchangerates  # noqa: E402 pylint: disable=C0413
+from mnbexchangerates import mnbexchangerates_backends  # noqa: E402 pylint: disable=C0413
+from mnbexchangerates import mnbexchangerates_cache  # noqa: E402 pylint: disable=C0413
+from mnbexchangerates import mnbexchangerates_calendar  # noqa: E402 pylint: disable=C0413
+from mnbexchangerates import mnbexchangerates_metrics  # noqa: E402 pylint: disable=C0413
+
+
+MODES = ('api', 'cold', 'cli')
+CACHE_STATES = ('stale', 'empty', 'fresh')
+CURRENCY = 'EUR'
+CHECK_INTERVAL = 0.005
+PERCENTILES = (50, 90, 99, 99.9)
+RECORD_DAYS = 31
+CACHE_COUNTERS = ('cache_hits_total', 'cache_stale_total', 'cache_misses_total', 'cache_save_failures_total')
+CLI_SCRIPT = ("import sys\n"
+              "from mnbexchangerates import mnbexchangerates\n"
+              "from mnbexchangerates import mnbexchangerates_cli\n"
+              "mnbexchangerates.URL = sys.argv[1]\n"
+              "if sys.argv[2]:\n"
+              "    mnbexchangerates.RECHECK_INTERVAL = float(sys.argv[2])\n"
+              "sys.exit(mnbexchangerates_cli.main(sys.argv[3:]))\n")
+
+
+def publication_dates(now):
+    # The latest publication day whose rates are out by now (as of the refresh hour), and the one before.
+    day = now.date()
+    refresh = datetime_time(mnbexchangerates_cache.REFRESH_HOUR)
+    while not (mnbexchangerates_calendar.is_publication_day(day) and now >= datetime.combine(day, refresh)):
+        day -= timedelta(1)
+    previous = day - timedelta(1)
+    while not mnbexchangerates_calendar.is_publication_day(previous):
+        previous -= timedelta(1)
+    return previous, day
+
+
+def create_backend(config):
+    return mnbexchangerates_backends.create_backend(config['backend'] or mnbexchangerates_backends.FILE,
+                                                    config['cache_path'])
+
+
+def close_backend(backend):
+    if hasattr(backend, 'close'):
+        backend.close()
+
+
+def seed_cache(config, date, currencies):
+    os.makedirs(os.path.expanduser(mnbexchangerates_cache.RATES_CACHE_DIR), exist_ok=True)
+    backend = create_backend(config)
+    backend.save({'date': date.isoformat(),
+                  'rates': [(str(fake_mnb.unit(currency)), currency, fake_mnb.rate(currency, date))
+                            for currency in currencies]})
+    close_backend(backend)
+
+
+def create_client(config):
+    from mnbexchangerates import mnbexchangerates_transport  # pylint: disable=C0415
+    transport = mnbexchangerates_transport.MNBExchangeRateTransport(
+        mnbexchangerates.URL, mnbexchangerates.HEADERS, backoff=config['backoff'])
+    return mnbexchangerates.MNBExchangeRates(transport=transport, cache_backend=create_backend(config))
+
+
+def query_cli(config):
+    argv = [sys.executable, '-c', CLI_SCRIPT, config['url'], str(config['recheck_interval'] or ''),
+            CURRENCY, '--format', 'json']
+    if config['backend']:
+        argv += ['--backend', config['backend']]
+    if config['cache_path']:
+        argv += ['--cache-path', config['cache_path']]
+    environment = dict(os.environ, PYTHONPATH=ROOT)
+    environment.pop('MNB_EXCHANGE_RATE_SERVER', None)
+    result = subprocess.run(argv, env=environment, capture_output=True, text=True, check=False)
+    if result.returncode or not result.stdout.strip():
+        message = f'CLI exited with {result.returncode}: {result.stderr.strip()[-200:]}'
+        raise Exception(message)  # pylint: disable=W0719
+    record = json.loads(result.stdout.splitlines()[0])
+    if 'error' in record:
+        raise Exception(record['error'])  # pylint: disable=W0719
+    return record
+
+
+def query(config, client):
+    if config['mode'] == 'cli':
+        return query_cli(config)
+    if client is not None:
+        return client.get_rate_for_currency(CURRENCY)
+    client = create_client(config)
+    try:
+        return client.get_rate_for_currency(CURRENCY)
+    finally:
+        close_backend(client.cache.backend)
+
+
+def run_thread(config, deadline, results):
+    client = create_client(config) if config['mode'] == 'api' else None
+    latencies = []
+    dates = Counter()
+    errors = Counter()
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            dates[query(config, client)['date']] += 1
+        except Exception as exc:  # pylint: disable=W0703
+            errors[str(exc)[:200]] += 1
+        latencies.append(time.perf_counter() - start)
+    results.append({'latencies': latencies, 'dates': dates, 'errors': errors})
+
+
+def check_cache(config, deadline, results):
+    backend = create_backend(config)
+    written = config['cache'] != 'empty'
+    checks = corrupt = 0
+    while time.monotonic() < deadline:
+        rates = backend.load()
+        if isinstance(rates, dict) and rates.get('date') and rates.get('rates'):
+            written = True
+        elif written:
+            corrupt += 1
+        checks += 1
+        time.sleep(CHECK_INTERVAL)
+    close_backend(backend)
+    results.append({'checks': checks, 'corrupt': corrupt})
+
+
+def run_process(config, barrier, queue):
+    os.environ['HOME'] = config['home']
+    mnbexchangerates.URL = config['url']
+    if config['recheck_interval'] is not None:
+        mnbexchangerates.RECHECK_INTERVAL = config['recheck_interval']
+    metrics = mnbexchangerates_metrics.enable()
+    results = []
+    checks = []
+    barrier.wait()
+    deadline = time.monotonic() + config['duration']
+    threads = [threading.Thread(target=run_thread, args=(config, deadline, results))
+               for _ in range(config['threads'])]
+    threads.append(threading.Thread(target=check_cache, args=(config, deadline, checks)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    queue.put({'latencies': [latency for result in results for latency in result['latencies']],
+               'dates': sum((result['dates'] for result in results), Counter()),
+               'errors': sum((result['errors'] for result in results), Counter()),
+               'checks': checks[0]['checks'],
+               'corrupt': checks[0]['corrupt'],
+               'counters': metrics.snapshot()['counters']})
+
+
+def percentile(values, percent):
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def summarize(config, results, fake, elapsed):
+    latencies = sorted(latency for result in results for latency in result['latencies'])
+    counters = sum((Counter(result['counters']) for result in results), Counter())
+    return {'config': {key: value for key, value in config.items() if key not in ('home', 'url')},
+            'operations': len(latencies),
+            'ops_per_sec': len(latencies) / elapsed,
+            'latency_ms': {str(percent): percentile(latencies, percent) * 1000 for percent in PERCENTILES},
+            'max_latency_ms': (latencies[-1] if latencies else 0) * 1000,
+            'upstream': fake.operations(),
+            'injected_errors': fake.errors['injected'],
+            'dates': dict(sum((result['dates'] for result in results), Counter())),
+            'errors': dict(sum((result['errors'] for result in results), Counter())),
+            'cache': {name: counters.get(name, 0) for name in CACHE_COUNTERS},
+            'cache_checks': sum(result['checks'] for result in results),
+            'corruption_events': sum(result['corrupt'] for result in results)}
+
+
+def run_load_test(config, replay=None):
+    # config: see parse_arguments; returns the report of summarize()
+    context = multiprocessing.get_context('spawn')
+    old_date, new_date = publication_dates(datetime.now())
+    with tempfile.TemporaryDirectory() as home, fake_mnb.FakeMNBServer(
+            config['currencies'], config['latency'], error_rate=config['error_rate'],
+            error_kind=config['error_kind'], replay=replay) as fake:
+        config = dict(config, home=home, url=fake.url, old_date=old_date.isoformat(), new_date=new_date.isoformat())
+        previous_home = os.environ.get('HOME')
+        os.environ['HOME'] = home
+        try:
+            if config['cache'] != 'empty':
+                seed_cache(config, old_date if config['cache'] == 'stale' else new_date, fake.currencies)
+        finally:
+            if previous_home is not None:
+                os.environ['HOME'] = previous_home
+        barrier = context.Barrier(config['processes'] + 1)
+        queue = context.Queue()
+        processes = [context.Process(target=run_process, args=(config, barrier, queue))
+                     for _ in range(config['processes'])]
+        for process in processes:
+            process.start()
+        barrier.wait()
+        # Every process starts at once, as at the refresh hour.
+        fake.publish(old_date, new_date, config['flip_after'])
+        start = time.monotonic()
+        results = [queue.get() for _ in processes]
+        elapsed = time.monotonic() - start
+        for process in processes:
+            process.join()
+        return summarize(config, results, fake, elapsed)
+
+
+def print_report(report):
+    config = report['config']
+    print(f"{config['mode']} mode, {config['processes']} processes x {config['threads']} threads, "
+          f"{config['duration']} s, {config['cache']} cache ({config['old_date']} -> {config['new_date']}, "
+          f"published after {config['flip_after']} s)")
+    print(f"operations      {report['operations']} ({report['ops_per_sec']:.1f}/s), "
+          f"errors {sum(report['errors'].values())}")
+    latencies = '  '.join(f'p{percent} {value:.2f}' for percent, value in report['latency_ms'].items())
+    print(f"latency ms      {latencies}  max {report['max_latency_ms']:.2f}")
+    upstream = ', '.join(f'{name} {count}' for name, count in sorted(report['upstream'].items())) or 'none'
+    print(f"upstream        {upstream}; injected errors {report['injected_errors']}")
+    print(f"answered dates  {', '.join(f'{date}: {count}' for date, count in sorted(report['dates'].items()))}")
+    if config['mode'] == 'cli':
+        # The command line clients run in their own processes, their metrics are not collected.
+        print('cache events    not collected in cli mode')
+    else:
+        print(f"cache events    {', '.join(f'{name} {count}' for name, count in report['cache'].items())}")
+    print(f"corruption      {report['corruption_events']} of {report['cache_checks']} cache reads")
+    for message, count in sorted(report['errors'].items(), key=lambda item: -item[1])[:5]:
+        print(f'error           {count} x {message}')
+
+
+def record(argv):
+    # Records the responses of the real (or any) MNB endpoint for --replay.
+    from mnbexchangerates import mnbexchangerates_currencies  # pylint: disable=C0415
+    from mnbexchangerates import mnbexchangerates_transport  # pylint: disable=C0415
+    parser = argparse.ArgumentParser(prog='load_test.py record', description='Record the responses of MNB')
+    parser.add_argument('output', help='recording file (JSON)')
+    parser.add_argument('--url', default=mnbexchangerates.URL, help='endpoint (default: %(default)s)')
+    parser.add_argument('--days', type=int, default=RECORD_DAYS,
+                        help='days of history to record (default: %(default)s)')
+    args = parser.parse_args(argv)
+    transport = mnbexchangerates_transport.MNBExchangeRateTransport(args.url, mnbexchangerates.HEADERS)
+
+    def post(body):
+        response = transport.post(body)
+        if response.status_code != 200:
+            raise Exception(f'Server response: {response.status_code}')  # pylint: disable=W0719
+        return response.content
+
+    current = post(mnbexchangerates.BODY)
+    rates = mnbexchangerates.MNBExchangeRates()._parse_soap_xml(current)  # pylint: disable=W0212
+    if rates is None:
+        raise Exception('Malformed content received from server')  # pylint: disable=W0719
+    currencies = [currency for _, currency, _ in rates['rates']]
+    end = datetime_date.today()
+    currency_names = ','.join(currencies)
+    responses = {fake_mnb.CURRENT: current,
+                 'GetExchangeRates': post(mnbexchangerates.history_body(
+                     (end - timedelta(args.days)).isoformat(), end.isoformat(), currencies)),
+                 'GetCurrencies': post(mnbexchangerates_currencies.CURRENCIES_BODY),
+                 'GetCurrencyUnits': post(mnbexchangerates_currencies.UNITS_BODY.format(currencies=currency_names)),
+                 'GetInfo': post(mnbexchangerates_currencies.INFO_BODY)}
+    fake_mnb.save_recording(args.output, args.url, responses)
+    print(f"Recorded {len(responses)} responses ({rates['date']}, {len(currencies)} currencies) to {args.output}")
+    return 0
+
+
+def parse_arguments(argv=None):
+    from mnbexchangerates import mnbexchangerates_transport  # pylint: disable=C0415
+    parser = argparse.ArgumentParser(description='Load test of the cache refresh path of mnbexchangerates')
+    parser.add_argument('--mode', choices=MODES, default=MODES[0], help='client mode (default: %(default)s)')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8, help='threads per process (default: %(default)s)')
+    parser.add_argument('--duration', type=float, default=5, help='seconds (default: %(default)s)')
+    parser.add_argument('--cache', choices=CACHE_STATES, default=CACHE_STATES[0],
+                        help='state of the cache at the start (default: %(default)s)')
+    parser.add_argument('--backend', choices=sorted(mnbexchangerates_backends.BACKENDS),
+                        help='cache backend (default: file)')
+    parser.add_argument('--cache-path', help='path of the cache file or database')
+    parser.add_argument('--currencies', type=int, default=len(fake_mnb.CURRENCIES))
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='latency of the fake MNB in seconds (default: %(default)s)')
+    parser.add_argument('--error-rate', type=float, default=0, help='fraction of upstream requests that fail')
+    parser.add_argument('--error-kind', choices=fake_mnb.ERROR_KINDS, default=fake_mnb.ERROR_KINDS[0])
+    parser.add_argument('--flip-after', type=float, default=0,
+                        help='seconds until the new rates are published (default: %(default)s)')
+    parser.add_argument('--recheck-interval', type=float,
+                        help=f'seconds before asking again for unpublished rates '
+                             f'(default: {mnbexchangerates.RECHECK_INTERVAL})')
+    parser.add_argument('--backoff', type=float, default=mnbexchangerates_transport.BACKOFF,
+                        help='retry backoff of the api and cold modes (default: %(default)s)')
+    parser.add_argument('--replay', help='serve the responses recorded in REPLAY instead of generated ones')
+    parser.add_argument('--report', help='write the report as JSON to REPORT')
+    parser.add_argument('--max-upstream', type=int,
+                        help='fail if more current rate requests than this reach the fake MNB')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == 'record':
+        return record(argv[1:])
+    args = parse_arguments(argv)
+    config = {key: value for key, value in vars(args).items() if key not in ('replay', 'report', 'max_upstream')}
+    report = run_load_test(config, fake_mnb.load_recording(args.replay) if args.replay else None)
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as report_file:
+            json.dump(report, report_file, indent=2, sort_keys=True)
+    failed = report['corruption_events'] > 0
+    if args.max_upstream is not None and report['upstream'].get(fake_mnb.CURRENT, 0) > args.max_upstream:
+        print(f'FAIL: more than {args.max_upstream} current rate requests reached MNB')
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+# Benchmark suite of the parse, cache, formatting and end-to-end CLI paths.
+#
+#   python benchmarks/run_benchmarks.py                  # run and compare with baselines.json
+#   python benchmarks/run_benchmarks.py --save           # store the results as the new baselines
+#   python benchmarks/run_benchmarks.py --check          # exit with 1 on a regression
+#   python benchmarks/run_benchmarks.py -k cache --currencies 80 --days 250 --latency 0.02
+#
+# Network calls go to the local fake MNB server (fake_mnb.py), the cache and the history
+# file to a temporary home directory. Every benchmark reports operations per second and the
+# peak memory allocated by one operation (tracemalloc).
+import argparse
+import contextlib
+from datetime import date as datetime_date
+from datetime import timedelta
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_mnb  # noqa: E402 pylint: disable=C0413
+from mnbexchangerates import mnbexchangerates  # noqa: E402 pylint: disable=C0413
+from mnbexchangerates import mnbexchangerates_cache  # noqa: E402 pylint: disable=C0413
+from mnbexchangerates import mnbexchangerates_cli  # noqa: E402 pylint: disable=C0413
+from mnbexchangerates import mnbexchangerates_format  # noqa: E402 pylint: disable=C0413
+from mnbexchangerates import mnbexchangerates_vector  # noqa: E402 pylint: disable=C0413
+
+
+VECTOR_SIZE = 100000
+FORMAT_BATCH_SIZE = 10000
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+TOLERANCE = 0.3
+MIN_TIME = 0.5
+
+
+def measure(operation, min_time=MIN_TIME):
+    operation()  # warm-up
+    tracemalloc.start()
+    operation()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    count = 0
+    start = time.perf_counter()
+    while True:
+        operation()
+        count += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return {'ops_per_sec': count / elapsed, 'peak_kib': peak / 1024}
+
+
+class Benchmarks:
+
+    def __init__(self, fake, days):
+        self.fake = fake
+        self.client = mnbexchangerates.MNBExchangeRates()
+        self.current_response = fake_mnb.current_rates_response(fake.currencies)
+        end_date = (datetime_date(2023, 1, 1) + timedelta(days - 1)).isoformat()
+        self.history_response = fake_mnb.history_response('2023-01-01', end_date, fake.currencies)
+        self.rates = self.client._parse_soap_xml(self.current_response)  # pylint: disable=W0212
+        self.cache = mnbexchangerates_cache.MNBExchangeRateCache()
+        self.cache.save(self.rates)
+        self.format_batch = [index * 1237.0625 for index in range(FORMAT_BATCH_SIZE)]
+        np = mnbexchangerates_vector.np
+        if np is not None:
+            self.engine = mnbexchangerates_vector.MNBExchangeRateVectorEngine(self.client)
+            self.positions = (np.arange(VECTOR_SIZE, dtype=np.int64) * 1237,
+                              np.resize(np.array(fake.currencies), VECTOR_SIZE))
+
+    def parse_current_rates(self):
+        self.client._parse_soap_xml(self.current_response)  # pylint: disable=W0212
+
+    def parse_history(self):
+        self.client._parse_soap_days(self.history_response)  # pylint: disable=W0212
+
+    def cache_save(self):
+        self.cache.save(self.rates)
+
+    def cache_load(self):
+        self.cache.load()
+
+    def simplified_number_format(self):
+        for number in ('393,95', 1234567.891, '0,0100', 100):
+            self.client._simplified_number_format(number)  # pylint: disable=W0212
+
+    def format_many_10k(self):
+        mnbexchangerates_format.NUMBER_FORMATTER.format_many(self.format_batch)
+
+    def get_exchange_of_amount(self):
+        self.client.get_exchange_of_amount('eur', 1234.5)
+
+    def get_exchange_of_amount_cold(self):
+        # A new client per call, as in a separate CLI process: the cache file is read every time.
+        mnbexchangerates.MNBExchangeRates().get_exchange_of_amount('eur', 1234.5)
+
+    @classmethod
+    def cli_cache_hit(cls):
+        with contextlib.redirect_stdout(io.StringIO()):
+            mnbexchangerates_cli.main(['eur:100', 'usd'])
+
+    @classmethod
+    def cli_cache_hit_json(cls):
+        with contextlib.redirect_stdout(io.StringIO()):
+            mnbexchangerates_cli.main(['eur:100', 'usd', '--format', 'json'])
+
+    def cli_fetch(self):
+        # Cache miss: the rates are fetched from the fake server, parsed, cached and printed.
+        os.remove(os.path.expanduser(mnbexchangerates_cache.RATES_CACHE_FILE))
+        with contextlib.redirect_stdout(io.StringIO()):
+            mnbexchangerates_cli.main(['eur:100', 'usd'])
+
+    def vector_convert_100k(self):
+        self.engine.convert(*self.positions, amounts_scaled=True)
+
+    @classmethod
+    def names(cls):
+        names = ['parse_current_rates', 'parse_history', 'cache_save', 'cache_load', 'simplified_number_format',
+                 'format_many_10k', 'get_exchange_of_amount', 'get_exchange_of_amount_cold', 'cli_cache_hit',
+                 'cli_cache_hit_json', 'cli_fetch']
+        if mnbexchangerates_vector.np is not None:
+            names.append('vector_convert_100k')
+        return names
+
+
+def load_baselines(path):
+    try:
+        with open(path, encoding='utf-8') as baselines:
+            return json.load(baselines)
+    except (IOError, ValueError):
+        return {}
+
+
+def compare(result, baseline, tolerance):
+    if not baseline:
+        return '', False
+    speed = result['ops_per_sec'] / baseline['ops_per_sec']
+    memory = result['peak_kib'] / baseline['peak_kib'] if baseline['peak_kib'] else 1
+    regression = speed < 1 - tolerance or memory > 1 + tolerance
+    return f"{speed:6.2f}x speed {memory:6.2f}x memory{'  REGRESSION' if regression else ''}", regression
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark suite of mnbexchangerates')
+    parser.add_argument('-k', '--filter', default='', help='run the benchmarks whose name contains FILTER')
+    parser.add_argument('--currencies', type=int, default=len(fake_mnb.CURRENCIES),
+                        help='number of currencies in the responses (default: %(default)s)')
+    parser.add_argument('--days', type=int, default=365,
+                        help='number of days in the history response (default: %(default)s)')
+    parser.add_argument('--latency', type=float, default=0, help='latency of the fake server in seconds')
+    parser.add_argument('--min-time', type=float, default=MIN_TIME,
+                        help='minimum run time of a benchmark in seconds (default: %(default)s)')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='allowed relative slowdown or memory growth (default: %(default)s)')
+    parser.add_argument('--baselines', default=BASELINES, help='baseline file (default: benchmarks/baselines.json)')
+    parser.add_argument('--save', action='store_true', help='store the results as the new baselines')
+    parser.add_argument('--check', action='store_true', help='exit with 1 if a benchmark regressed')
+    return parser.parse_args(argv)
+
+
+def run(args):
+    results = {}
+    with tempfile.TemporaryDirectory() as home, fake_mnb.FakeMNBServer(args.currencies, args.latency) as fake:
+        os.environ['HOME'] = home
+        os.environ.pop(mnbexchangerates_cli.SERVER_ENV, None)
+        mnbexchangerates.URL = fake.url
+        benchmarks = Benchmarks(fake, args.days)
+        for name in benchmarks.names():
+            if args.filter in name:
+                results[name] = measure(getattr(benchmarks, name), args.min_time)
+                yield name, results[name]
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    params = {'currencies': args.currencies, 'days': args.days, 'latency': args.latency}
+    baselines = load_baselines(args.baselines)
+    if baselines.get('params', params) != params:
+        print(f"Baselines were recorded with {baselines['params']}, not comparing.")
+        baselines = {}
+    results = {}
+    regressions = []
+    for name, result in run(args):
+        results[name] = result
+        comparison, regression = compare(result, baselines.get('results', {}).get(name), args.tolerance)
+        if regression:
+            regressions.append(name)
+        print(f"{name:30} {result['ops_per_sec']:12.1f} ops/s {result['peak_kib']:10.1f} KiB peak  {comparison}")
+    if args.save:
+        # The baselines of benchmarks left out by -k are kept.
+        saved = dict(baselines.get('results', {}))
+        saved.update({name: {key: round(value, 1) for key, value in result.items()}
+                      for name, result in results.items()})
+        with open(args.baselines, 'w', encoding='utf-8') as baselines_file:
+            json.dump({'params': params,
+                       'python': platform.python_version(),
+                       'machine': platform.machine(),
+                       'results': saved},
+                      baselines_file, indent=2, sort_keys=True)
+            baselines_file.write('\n')
+        print(f'Baselines saved to {args.baselines}')
+    if regressions:
+        print(f"Regressed: {', '.join(regressions)}")
+    return 1 if args.check and regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
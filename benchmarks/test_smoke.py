@@ -0,0 +1,50 @@
+# Smoke tests of the benchmark tools, kept out of the unit suite:
+#
+#   python -m pytest benchmarks
+#
+# Runs a short load test against the fake MNB server and checks its error injection,
+# publication and replay.
+from datetime import datetime
+import unittest
+
+import fake_mnb
+import load_test
+
+
+class LoadTestSmokeTest(unittest.TestCase):
+
+    @classmethod
+    def _config(cls, **config):
+        return dict({'mode': 'api', 'processes': 2, 'threads': 3, 'duration': 0.5, 'cache': 'stale', 'backend': None,
+                     'cache_path': None, 'currencies': 5, 'latency': 0.1, 'error_rate': 0, 'error_kind': '500',
+                     'flip_after': 0, 'recheck_interval': None, 'backoff': 0.01}, **config)
+
+    def test_stale_cache_is_refreshed_once(self):
+        report = load_test.run_load_test(self._config())
+        self.assertEqual({fake_mnb.CURRENT: 1}, report['upstream'])
+        self.assertEqual({}, report['errors'])
+        self.assertEqual(0, report['corruption_events'])
+        self.assertIn(report['config']['new_date'], report['dates'])
+
+    def test_unpublished_rates_are_rechecked_once(self):
+        # MNB keeps returning the old rates, which every process then keeps until the recheck.
+        report = load_test.run_load_test(self._config(processes=4, threads=1, duration=1, latency=0.02, flip_after=10))
+        self.assertEqual({fake_mnb.CURRENT: 1}, report['upstream'])
+        self.assertEqual({}, report['errors'])
+
+    def test_fake_mnb_publication_errors_and_replay(self):
+        today = datetime(2024, 3, 15).date()
+        fake = fake_mnb.FakeMNBServer(currencies=2, error_rate=1, error_kind='reset',
+                                      replay={fake_mnb.CURRENT: fake_mnb.current_rates_response(['EUR'], today)})
+        self.assertEqual((None, None), fake.respond('<ns0:GetCurrentExchangeRates/>'))
+        fake.errors['rate'] = 0
+        fake.publish(datetime(2024, 3, 14).date(), today, after=3600)
+        status, content = fake.respond('<ns0:GetCurrentExchangeRates/>')
+        self.assertEqual(200, status)
+        self.assertIn(b'Day date="2024-03-14"', content)
+        self.assertEqual(1, fake.errors['injected'])
+        fake.httpd.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,14 @@
-import html
-import xml.etree.ElementTree as ET
-
-import requests
+from datetime import date as datetime_date
+from datetime import timedelta
 
 from mnbexchangerates import mnbexchangerates_cache
+from mnbexchangerates import mnbexchangerates_format
+from mnbexchangerates import mnbexchangerates_history
 from mnbexchangerates import mnbexchangerates_logger
+from mnbexchangerates import mnbexchangerates_metrics
+from mnbexchangerates import mnbexchangerates_table
+# The transport (requests) and the parser (xml) are imported only when rates are fetched,
+# so that answering from the cache does not pay for loading them.
 
 
 URL = 'http://www.mnb.hu/arfolyamok.asmx?wsdl'
@@ -18,116 +22,274 @@ BODY = """<?xml version="1.0" encoding="UTF-8"?>
     <SOAP-ENV:Header/>
     <ns1:Body><ns0:GetCurrentExchangeRates/></ns1:Body>
 </SOAP-ENV:Envelope>"""
+# Envelope of the operations of the webservices namespace
+SOAP_BODY = """<?xml version="1.0" encoding="UTF-8"?>
+<SOAP-ENV:Envelope
+  xmlns:ns0="http://www.mnb.hu/webservices/"
+  xmlns:ns1="http://schemas.xmlsoap.org/soap/envelope/"
+  xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
+  xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/">
+    <SOAP-ENV:Header/>
+    <ns1:Body>{operation}</ns1:Body>
+</SOAP-ENV:Envelope>"""
+HISTORY_BODY = SOAP_BODY.replace('{operation}', """<ns0:GetExchangeRates>
+        <ns0:startDate>{start_date}</ns0:startDate>
+        <ns0:endDate>{end_date}</ns0:endDate>
+        <ns0:currencyNames>{currencies}</ns0:currencyNames>
+    </ns0:GetExchangeRates>""")
+HISTORY_LOOKBACK_DAYS = 10
+HISTORY_LOOKAHEAD_DAYS = 21
+# Seconds to keep using the cached rates after MNB answered with the same date again
+RECHECK_INTERVAL = 300
+
+
+def date_str(date):
+    return date if isinstance(date, str) else date.isoformat()
+
+
+def is_past(date):
+    return date is not None and date_str(date) < datetime_date.today().isoformat()
+
+
+def history_body(start_date, end_date, currencies):
+    return HISTORY_BODY.format(start_date=start_date, end_date=end_date, currencies=','.join(currencies))
+
+
+def _count_bytes(chunks, metrics):
+    for chunk in chunks:
+        metrics.increment('bytes_received_total', len(chunk))
+        yield chunk
+
+
+def last_complete_date():
+    # Rates of today may still be published later, so today is never marked as fetched.
+    return (datetime_date.today() - timedelta(1)).isoformat()
+
+
+def history_range_around(date):
+    day = datetime_date.fromisoformat(date)
+    return ((day - timedelta(HISTORY_LOOKBACK_DAYS)).isoformat(),
+            min((day + timedelta(HISTORY_LOOKAHEAD_DAYS)).isoformat(), last_complete_date()))
 
 
 class MNBExchangeRates:
 
-    def __init__(self, debug=False, cache_only=False):
+    def __init__(self, debug=False, cache_only=False, transport=None, wait_for_refresh=False, cache_backend=None):
         self.log = mnbexchangerates_logger.MNBExchangeRatesLogger(debug=debug).get_logger()
         self.log.debug('ON')
-        self.cache = mnbexchangerates_cache.MNBExchangeRateCache(debug=debug, cache_only=cache_only)
+        self._transport = transport
+        self.cache = mnbexchangerates_cache.MNBExchangeRateCache(debug=debug, cache_only=cache_only,
+                                                                 backend=cache_backend)
+        self.history = mnbexchangerates_history.MNBExchangeRateHistory(debug=debug)
+        self.wait_for_refresh = wait_for_refresh
+        self._table = None
+        self._tables = mnbexchangerates_table.MNBExchangeRateTableCache()
 
-    def _parse_soap_xml(self, xml_content):
-        unescaped = html.unescape(xml_content.decode())
-        self.log.debug('Unescaped xml content: %s', unescaped)
+    @property
+    def transport(self):
+        if self._transport is None:
+            from mnbexchangerates import mnbexchangerates_transport  # pylint: disable=C0415
+            self._transport = mnbexchangerates_transport.MNBExchangeRateTransport(
+                URL, HEADERS, debug=self.log.isEnabledFor(mnbexchangerates_logger.DEBUG))
+        return self._transport
+
+    def _parse_soap_days(self, xml_content):
+        from mnbexchangerates import mnbexchangerates_parser  # pylint: disable=C0415
+        metrics = mnbexchangerates_metrics.get_metrics()
         try:
-            root = ET.fromstring(unescaped)
-        except ET.ParseError as exc:
+            # For a streamed response this includes reading the rest of the body.
+            with metrics.timer('parse_seconds'):
+                days = list(mnbexchangerates_parser.iter_days(xml_content))
+        except mnbexchangerates_parser.ParseError as exc:
+            metrics.increment('parse_errors_total')
             self.log.debug('Parse error: %s', str(exc))
             return None
+        self.log.debug('Parsed %s days', len(days))
+        return days
 
-        day_list = root.findall(".//{http://www.mnb.hu/webservices/}Day")
-        rates = root.findall(".//{http://www.mnb.hu/webservices/}Rate")
-
-        if day_list and rates:
-            return {'date': day_list[0].attrib['date'],
-                    'rates': [(rate.attrib['unit'], rate.attrib['curr'], rate.text) for rate in rates]}
+    def _parse_soap_xml(self, xml_content):
+        days = self._parse_soap_days(xml_content)
+        if days and days[0]['rates']:
+            return days[0]
         return None
 
-    @classmethod
-    def _group_digits(cls, number):
-        if ',' in number:
-            index = number.find(',')
-            grouped = number[index:]
-            number = number[:index]
-        else:
-            grouped = ''
-        while len(number) > 0:
-            grouped = '\'' + number[-3:] + grouped
-            number = number[:-3]
-        return grouped.strip('\'')
-
     @classmethod
     def _simplified_number_format(cls, number):
-        number = str(number).replace('.', ',')
-        number = cls._group_digits(number)
-        if ',' in number:
-            while number[-1] == '0':
-                number = number[:-1]
-            if number[-1] == ',':
-                number = number[:-1]
-        return number
+        return mnbexchangerates_format.NUMBER_FORMATTER.format(number)
 
-    def fetch_rates(self, cache_date=None):
-        response = requests.post(URL, data=BODY, headers=HEADERS, timeout=10)
-        self.log.debug('Response from url %s : %s -- %s', URL, response.status_code, response.content)
-        if response.status_code == 200:
-            rates = self._parse_soap_xml(response.content)
+    def _post(self, body, stream=False):
+        response = self.transport.post(body, stream=stream)
+        self.log.debug('Response from url %s : %s', self.transport.url, response.status_code)
+        metrics = mnbexchangerates_metrics.get_metrics()
+        if stream:
+            from mnbexchangerates import mnbexchangerates_parser  # pylint: disable=C0415
+            chunks = response.iter_content(mnbexchangerates_parser.CHUNK_SIZE)
+            return response.status_code, _count_bytes(chunks, metrics) if metrics.enabled else chunks
+        metrics.increment('bytes_received_total', len(response.content))
+        return response.status_code, response.content
+
+    def process_rates_response(self, status_code, content, cache_date=None):
+        if status_code == 200:
+            rates = self._parse_soap_xml(content)
             if rates:
                 if rates['date'] != cache_date:
                     self.cache.save(rates)
                 else:
                     self.log.debug('Cache is old but fetched rates are from the same date.')
+                    self.cache.postpone(cache_date, RECHECK_INTERVAL)
                 return rates
             self.log.debug('Exchange rates parsing failed. Invalid content?')
             raise Exception('Malformed content received from server')  # pylint: disable=W0719
-        raise Exception(f'Server response: {response.status_code}')  # pylint: disable=W0719
+        raise Exception(f'Server response: {status_code}')  # pylint: disable=W0719
+
+    def _parse_history_response(self, status_code, content):
+        if status_code == 200:
+            days = self._parse_soap_days(content)
+            if days is None:
+                raise Exception('Malformed content received from server')  # pylint: disable=W0719
+            return days
+        raise Exception(f'Server response: {status_code}')  # pylint: disable=W0719
+
+    def process_history_response(self, status_code, content, start_date, end_date, currencies):
+        days = self._parse_history_response(status_code, content)
+        self.history.add(days, start_date, min(end_date, last_complete_date()), currencies)
+        return days
+
+    def fetch_rates(self, cache_date=None):
+        return self.process_rates_response(*self._post(BODY), cache_date)
 
-    def get_rates(self):
+    def fetch_rate_history(self, start_date, end_date, currencies=None, store=True):
+        # With store=False the rates are only returned, so that several ranges can be
+        # fetched concurrently and stored by one thread.
+        start_date = date_str(start_date)
+        end_date = date_str(end_date)
+        if currencies is None:
+            currencies = list(self.get_table().index)
+        response = self._post(history_body(start_date, end_date, currencies), stream=True)
+        if not store:
+            return self._parse_history_response(*response)
+        return self.process_history_response(*response, start_date, end_date, currencies)
+
+    def _historical_currencies(self, date):
+        # The currencies of the stored history, so that past dates are answered offline;
+        # today's currencies only before anything is stored.
+        currencies = self.history.currencies(date) or self.history.currencies()
+        return currencies or list(self.get_table().index)
+
+    def get_historical_rates(self, date, currencies=None):
+        date = date_str(date)
+        if currencies is None:
+            currencies = self._historical_currencies(date)
+        rates = self.history.get(date, currencies)
+        if rates is None:
+            self.log.debug('Rates of %s are not stored yet, so fetching now...', date)
+            self.fetch_rate_history(*history_range_around(date), currencies)
+            rates = self.history.get(date, currencies)
+        if rates is None:
+            raise Exception(f'No exchange rates found for {date}')  # pylint: disable=W0719
+        return rates
+
+    def get_historical_rate_for_currency(self, currency, date):
+        date = date_str(date)
+        rate_dict = self.history.lookup_rate(date, currency)
+        if rate_dict is None:
+            self.log.debug('Rates of %s are not stored yet, so fetching now...', date)
+            self.fetch_rate_history(*history_range_around(date), [currency])
+            rate_dict = self.history.lookup_rate(date, currency)
+        if rate_dict is None:
+            raise Exception(f'Currency not found: {currency} ({date})')  # pylint: disable=W0719
+        return rate_dict
+
+    def get_rates(self, date=None):
+        if is_past(date):
+            return self.get_historical_rates(date)
         cached_rates = self.cache.load()
-        if cached_rates is None:
-            self.log.debug('Cache is empty, so fetching now...')
-            rates = self.fetch_rates()
-        elif cached_rates['uptodate']:
-            rates = cached_rates
-        else:
+        if cached_rates is not None and cached_rates['uptodate']:
+            return cached_rates
+        # Only one process refreshes, the others serve the stale rates or wait for the refreshed ones.
+        with self.cache.refresh_lock(blocking=cached_rates is None or self.wait_for_refresh) as acquired:
+            if not acquired and cached_rates is not None:
+                self.log.debug('Cache is old, but another process is refreshing it.')
+                return cached_rates
+            reloaded_rates = self.cache.load()
+            if reloaded_rates is not None and reloaded_rates['uptodate']:
+                self.log.debug('Cache has been refreshed by another process.')
+                return reloaded_rates
+            if reloaded_rates is None:
+                self.log.debug('Cache is empty, so fetching now...')
+                return self.fetch_rates()
             self.log.debug('Cache is old, so fetching now...')
-            rates = self.fetch_rates(cached_rates['date'])
-        return rates
+            return self.fetch_rates(reloaded_rates['date'])
 
-    def get_rate_for_currency(self, currency):
-        rates_dict = self.get_rates()
-        rate = [r for r in rates_dict['rates'] if currency in r]
-        self.log.debug('Found rate: %s', rate)
-        if rate:
-            return {'date': rates_dict['date'],
-                    'unit': rate[0][0],
-                    'currency': rate[0][1],
-                    'rate': rate[0][2]}
+    def cached_table(self):
+        if self._table is not None and self.cache.is_uptodate(self._table.date):
+            return self._table
+        return None
+
+    def use_rates(self, rates):
+        self._table = mnbexchangerates_table.MNBExchangeRateTable.from_rates(rates)
+        return self._table
+
+    def get_table(self, date=None):
+        if is_past(date):
+            date = date_str(date)
+            table = self._tables.get(date)
+            if table is None:
+                rates = self.get_historical_rates(date)
+                table = self._tables.get(rates['date']) or mnbexchangerates_table.MNBExchangeRateTable.from_rates(rates)
+                self._tables.put(date, table.date, table)
+            return table
+        return self.cached_table() or self.use_rates(self.get_rates())
+
+    def get_rate_for_currency(self, currency, date=None):
+        if is_past(date):
+            return self.get_historical_rate_for_currency(currency, date)
+        rate_dict = self.get_table().rate_dict(currency)
+        self.log.debug('Found rate: %s', rate_dict)
+        if rate_dict:
+            return rate_dict
         raise Exception(f'Currency not found: {currency}')  # pylint: disable=W0719
 
-    def get_str_of_rate_for_currency(self, currency):
+    def exchange(self, currency, amount, date=None):
+        return mnbexchangerates_table.exchange_record(self.get_rate_for_currency(currency.upper(), date), amount)
+
+    def cross_rate(self, source, target, date=None):
+        # Price of 1 source currency in the target currency (either may be HUF)
+        return self.get_table(date).cross_rate(source.upper(), target.upper())
+
+    def convert(self, amount, source, target, date=None):
+        return float(amount) * self.cross_rate(source, target, date)
+
+    def convert_many(self, items, date=None):
+        return self.get_table(date).convert_many(items)
+
+    @classmethod
+    def format_rate(cls, rate_dict):
+        return (f"MNB exchange rate of  {rate_dict['unit']} {rate_dict['currency']} = "
+                f"{cls._simplified_number_format(rate_dict['rate'])} HUF  ({rate_dict['date']})")
+
+    @classmethod
+    def format_exchange(cls, exchange, amount):
+        total = mnbexchangerates_format.TOTAL_FORMATTER.format(exchange['value'])
+        return (f"MNB exchange rate of  {cls._simplified_number_format(amount)} "
+                f"{exchange['currency']} = {total} HUF  ({exchange['date']})")
+
+    def get_str_of_rate_for_currency(self, currency, date=None):
         currency = currency.upper()
         self.log.debug('Currency to look for: %s', currency)
         try:
-            rate_dict = self.get_rate_for_currency(currency)
-            answer = (f"MNB exchange rate of  {rate_dict['unit']} {rate_dict['currency']} = "
-                      f"{self._simplified_number_format(rate_dict['rate'])} HUF  ({rate_dict['date']})")
+            answer = self.format_rate(self.get_rate_for_currency(currency, date))
         except Exception as exc:  # pylint: disable=W0703
             answer = str(exc)
             self.log.debug(answer)
         return answer
 
-    def get_exchange_of_amount(self, currency, amount):
+    def get_exchange_of_amount(self, currency, amount, date=None):
         currency = currency.upper()
         self.log.debug('Currency to look for: %s', currency)
         self.log.debug('Requested amount: %s', amount)
         try:
-            rate_dict = self.get_rate_for_currency(currency)
-            total = (float(amount) * float(rate_dict['rate'].replace(',', '.'))) / float(rate_dict['unit'])
-            total = self._simplified_number_format(f"{total:.2f}")
-            answer = (f"MNB exchange rate of  {self._simplified_number_format(amount)} "
-                      f"{rate_dict['currency']} = {total} HUF  ({rate_dict['date']})")
+            answer = self.format_exchange(self.exchange(currency, amount, date), amount)
         except Exception as exc:  # pylint: disable=W0703
             answer = str(exc)
             self.log.debug(answer)
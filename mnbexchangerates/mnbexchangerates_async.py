@@ -0,0 +1,182 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import time
+from urllib.parse import urlsplit
+
+from mnbexchangerates import mnbexchangerates
+from mnbexchangerates import mnbexchangerates_metrics
+from mnbexchangerates import mnbexchangerates_table
+
+
+class AsyncMNBExchangeRates:
+
+    def __init__(self, debug=False, cache_only=False, timeout=10):
+        self.client = mnbexchangerates.MNBExchangeRates(debug, cache_only)
+        self.log = self.client.log
+        self.timeout = timeout
+        self._table = None
+        self._tables = mnbexchangerates_table.MNBExchangeRateTableCache()
+        self._in_flight = {}
+        # Cache and history files are read and written on one worker thread, off the event loop.
+        # One thread keeps the disk work in order, as the history is not shared between threads.
+        self._disk = ThreadPoolExecutor(1, thread_name_prefix='mnbexchangerates-disk')
+
+    async def _on_disk(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._disk, function, *args)
+
+    async def _send(self, host, port, ssl, request):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port, ssl=ssl), self.timeout)
+        try:
+            writer.write(request)
+            await writer.drain()
+            return await asyncio.wait_for(reader.read(), self.timeout)
+        finally:
+            writer.close()
+
+    async def _post(self, body):
+        url = urlsplit(mnbexchangerates.URL)
+        port = url.port or (443 if url.scheme == 'https' else 80)
+        path = url.path + (f'?{url.query}' if url.query else '')
+        data = body.encode()
+        metrics = mnbexchangerates_metrics.get_metrics()
+        metrics.increment('soap_requests_total')
+        start = time.perf_counter()
+        request = (f'POST {path} HTTP/1.0\r\n'
+                   f'Host: {url.hostname}\r\n'
+                   f"Content-Type: {mnbexchangerates.HEADERS['content-type']}\r\n"
+                   f'Content-Length: {len(data)}\r\n'
+                   f'Connection: close\r\n\r\n').encode() + data
+        try:
+            response = await self._send(url.hostname, port, url.scheme == 'https', request)
+        except asyncio.TimeoutError as exc:
+            # str() of the TimeoutError is empty, so the message is given here.
+            raise Exception(f'No response from server in {self.timeout} seconds') from exc  # pylint: disable=W0719
+        metrics.observe('soap_request_seconds', time.perf_counter() - start)
+        metrics.increment('bytes_received_total', len(response))
+        head, _, content = response.partition(b'\r\n\r\n')
+        status_code = int(head.split(b' ', 2)[1])
+        self.log.debug('Response from url %s : %s (%s bytes)', mnbexchangerates.URL, status_code, len(content))
+        return status_code, content
+
+    async def _single_flight(self, key, coroutine_function, *args):
+        # Concurrent callers asking for the same thing share one request.
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coroutine_function(*args))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.log.debug('Joining in-flight request: %s', key)
+        return await asyncio.shield(task)
+
+    async def _fetch_rates(self, cache_date):
+        response = await self._post(mnbexchangerates.BODY)
+        return await self._on_disk(self.client.process_rates_response, *response, cache_date)
+
+    async def fetch_rates(self, cache_date=None):
+        return await self._single_flight(('current', cache_date), self._fetch_rates, cache_date)
+
+    async def _fetch_rate_history(self, start_date, end_date, currencies):
+        body = mnbexchangerates.history_body(start_date, end_date, currencies)
+        response = await self._post(body)
+        return await self._on_disk(self.client.process_history_response, *response, start_date, end_date, currencies)
+
+    async def fetch_rate_history(self, start_date, end_date, currencies=None):
+        start_date = mnbexchangerates.date_str(start_date)
+        end_date = mnbexchangerates.date_str(end_date)
+        if currencies is None:
+            currencies = list((await self.get_table()).index)
+        key = ('history', start_date, end_date, tuple(currencies))
+        return await self._single_flight(key, self._fetch_rate_history, start_date, end_date, currencies)
+
+    async def fetch_rate_histories(self, ranges, currencies=None):
+        return await asyncio.gather(*(self.fetch_rate_history(start_date, end_date, currencies)
+                                      for start_date, end_date in ranges))
+
+    async def get_historical_rates(self, date, currencies=None):
+        date = mnbexchangerates.date_str(date)
+        if currencies is None:
+            currencies = (await self._on_disk(self.client.history.currencies, date) or
+                          await self._on_disk(self.client.history.currencies) or
+                          list((await self.get_table()).index))
+        rates = await self._on_disk(self.client.history.get, date, currencies)
+        if rates is None:
+            await self.fetch_rate_history(*mnbexchangerates.history_range_around(date), currencies)
+            rates = await self._on_disk(self.client.history.get, date, currencies)
+        if rates is None:
+            raise Exception(f'No exchange rates found for {date}')  # pylint: disable=W0719
+        return rates
+
+    async def get_historical_rate_for_currency(self, currency, date):
+        date = mnbexchangerates.date_str(date)
+        rate_dict = await self._on_disk(self.client.history.lookup_rate, date, currency)
+        if rate_dict is None:
+            await self.fetch_rate_history(*mnbexchangerates.history_range_around(date), [currency])
+            rate_dict = await self._on_disk(self.client.history.lookup_rate, date, currency)
+        if rate_dict is None:
+            raise Exception(f'Currency not found: {currency} ({date})')  # pylint: disable=W0719
+        return rate_dict
+
+    async def get_rates(self, date=None):
+        if mnbexchangerates.is_past(date):
+            return await self.get_historical_rates(date)
+        cached_rates = await self._on_disk(self.client.cache.load)
+        if cached_rates is None:
+            self.log.debug('Cache is empty, so fetching now...')
+            rates = await self.fetch_rates()
+        elif cached_rates['uptodate']:
+            rates = cached_rates
+        else:
+            self.log.debug('Cache is old, so fetching now...')
+            rates = await self.fetch_rates(cached_rates['date'])
+        return rates
+
+    async def get_table(self, date=None):
+        if mnbexchangerates.is_past(date):
+            date = mnbexchangerates.date_str(date)
+            table = self._tables.get(date)
+            if table is None:
+                rates = await self.get_historical_rates(date)
+                table = self._tables.get(rates['date']) or mnbexchangerates_table.MNBExchangeRateTable.from_rates(rates)
+                self._tables.put(date, table.date, table)
+            return table
+        if self._table is None or not self.client.cache.is_uptodate(self._table.date):
+            self._table = mnbexchangerates_table.MNBExchangeRateTable.from_rates(await self.get_rates())
+        return self._table
+
+    async def get_rate_for_currency(self, currency, date=None):
+        if mnbexchangerates.is_past(date):
+            return await self.get_historical_rate_for_currency(currency, date)
+        rate_dict = (await self.get_table()).rate_dict(currency)
+        if rate_dict:
+            return rate_dict
+        raise Exception(f'Currency not found: {currency}')  # pylint: disable=W0719
+
+    async def exchange(self, currency, amount, date=None):
+        return mnbexchangerates_table.exchange_record(await self.get_rate_for_currency(currency.upper(), date),
+                                                      amount)
+
+    async def cross_rate(self, source, target, date=None):
+        return (await self.get_table(date)).cross_rate(source.upper(), target.upper())
+
+    async def convert(self, amount, source, target, date=None):
+        return float(amount) * await self.cross_rate(source, target, date)
+
+    async def convert_many(self, items, date=None):
+        return (await self.get_table(date)).convert_many(items)
+
+    async def get_str_of_rate_for_currency(self, currency, date=None):
+        try:
+            answer = self.client.format_rate(await self.get_rate_for_currency(currency.upper(), date))
+        except Exception as exc:  # pylint: disable=W0703
+            answer = str(exc)
+            self.log.debug(answer)
+        return answer
+
+    async def get_exchange_of_amount(self, currency, amount, date=None):
+        try:
+            answer = self.client.format_exchange(await self.exchange(currency, amount, date), amount)
+        except Exception as exc:  # pylint: disable=W0703
+            answer = str(exc)
+            self.log.debug(answer)
+        return answer
@@ -0,0 +1,133 @@
+import contextlib
+import json
+import os
+import threading
+
+from mnbexchangerates import mnbexchangerates_cache
+from mnbexchangerates import mnbexchangerates_logger
+
+
+FILE = 'file'
+SQLITE = 'sqlite'
+MEMORY = 'memory'
+SQLITE_FILE = mnbexchangerates_cache.RATES_CACHE_DIR + '/exchange_rates.sqlite'
+BUSY_TIMEOUT = mnbexchangerates_cache.LOCK_TIMEOUT
+# Every reader of an SQLite database in WAL mode writes its -shm file, so the users sharing the database
+# (through the group of its directory) need the files group-writable whatever their umask.
+DATABASE_FILE_MODE = 0o664
+
+
+def _from_json(data):
+    rates = json.loads(data)
+    rates['rates'] = [tuple(rate) for rate in rates['rates']]
+    return rates
+
+
+class MNBExchangeRateMemoryBackend:
+    # Rates of every saved date in a dict, for tests and single-process use (path is not used).
+
+    def __init__(self, path=None, debug=False):  # pylint: disable=W0613
+        self.rates = {}
+
+    @classmethod
+    def lock_path(cls):
+        return None
+
+    def load(self):
+        if not self.rates:
+            return None
+        # A copy, as the cache adds its state to the loaded rates.
+        return dict(self.rates[max(self.rates)])
+
+    def save(self, rates):
+        self.rates[rates['date']] = dict(rates)
+
+    def load_range(self, start_date, end_date):
+        return [dict(self.rates[date]) for date in sorted(self.rates) if start_date <= date <= end_date]
+
+
+class MNBExchangeRateSQLiteBackend:
+    # Rates of every saved date in an SQLite database in WAL mode, so that many processes (of several
+    # users, given a shared writable directory) read it concurrently while one of them refreshes it.
+
+    def __init__(self, path=None, debug=False):
+        self.log = mnbexchangerates_logger.MNBExchangeRatesLogger(debug).get_logger()
+        self.path = os.path.expanduser(path or SQLITE_FILE)
+        # One connection per backend, shared by the threads of the process under the lock.
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def lock_path(self):
+        return self.path + '.lock'
+
+    def _connect(self):
+        import sqlite3  # pylint: disable=C0415
+        if self.connection is None:
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            with connection:
+                connection.execute('CREATE TABLE IF NOT EXISTS rates (date TEXT PRIMARY KEY, data TEXT NOT NULL)')
+            self.connection = connection
+            self._share_files()
+            self.log.debug('SQLite cache opened (%s)', self.path)
+        return self.connection
+
+    def _share_files(self):
+        # SQLite creates the -wal and -shm files with the mode of the database. Only the owner may change it.
+        for path in (self.path, self.path + '-wal', self.path + '-shm'):
+            with contextlib.suppress(OSError):
+                mode = os.stat(path).st_mode & 0o777
+                if mode | DATABASE_FILE_MODE != mode:
+                    os.chmod(path, mode | DATABASE_FILE_MODE)
+
+    def _query(self, sql, parameters=()):
+        import sqlite3  # pylint: disable=C0415
+        try:
+            with self.lock:
+                return self._connect().execute(sql, parameters).fetchall()
+        except sqlite3.Error as exc:
+            self.log.debug('Error when reading SQLite cache (%s)', str(exc))
+            return []
+
+    def load(self):
+        rows = self._query('SELECT data FROM rates ORDER BY date DESC LIMIT 1')
+        return _from_json(rows[0][0]) if rows else None
+
+    def save(self, rates):
+        import sqlite3  # pylint: disable=C0415
+        entry = {'date': rates['date'], 'rates': rates['rates']}
+        if 'recheck' in rates:
+            entry['recheck'] = rates['recheck']
+        data = json.dumps(entry)
+        try:
+            with self.lock:
+                connection = self._connect()
+                with connection:
+                    connection.execute('INSERT OR REPLACE INTO rates (date, data) VALUES (?, ?)',
+                                       (rates['date'], data))
+        except sqlite3.Error as exc:
+            raise IOError(str(exc)) from exc
+
+    def load_range(self, start_date, end_date):
+        rows = self._query('SELECT data FROM rates WHERE date BETWEEN ? AND ? ORDER BY date', (start_date, end_date))
+        return [_from_json(data) for data, in rows]
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+
+BACKENDS = {
+    FILE: mnbexchangerates_cache.MNBExchangeRateFileBackend,
+    MEMORY: MNBExchangeRateMemoryBackend,
+    SQLITE: MNBExchangeRateSQLiteBackend,
+}
+
+
+def create_backend(name, path=None, debug=False):
+    if name not in BACKENDS:
+        raise ValueError(f'Unknown cache backend: {name}')
+    return BACKENDS[name](path, debug=debug)
@@ -0,0 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
+from datetime import date as datetime_date
+from datetime import timedelta
+
+from mnbexchangerates import mnbexchangerates
+
+
+CHUNK_DAYS = 366
+# The transport keeps at most POOL_SIZE (4) connections alive, more workers would reconnect.
+WORKERS = 4
+CHECKPOINT_CHUNKS = 8
+
+
+def split_range(start_date, end_date, days):
+    # [start, end] chunks of at most the given number of days.
+    chunks = []
+    start = datetime_date.fromisoformat(start_date)
+    end = datetime_date.fromisoformat(end_date)
+    while start <= end:
+        chunk_end = min(start + timedelta(days - 1), end)
+        chunks.append((start.isoformat(), chunk_end.isoformat()))
+        start = chunk_end + timedelta(1)
+    return chunks
+
+
+class MNBExchangeRateBackfill:
+    # Downloads the missing parts of a date range with a pool of workers. Only the calling thread
+    # writes the history; the covered ranges stored with the rates are the checkpoint, so an
+    # interrupted or failed run is resumed by fetching the ranges that are still missing.
+
+    def __init__(self, mnb_exchange_rates, chunk_days=CHUNK_DAYS, workers=WORKERS,
+                 checkpoint_chunks=CHECKPOINT_CHUNKS):
+        if chunk_days < 1 or workers < 1 or checkpoint_chunks < 1:
+            raise ValueError('Chunk days, workers and checkpoint chunks must be positive')
+        self.mnb = mnb_exchange_rates
+        self.log = mnb_exchange_rates.log
+        self.config = {'chunk_days': chunk_days, 'workers': workers, 'checkpoint_chunks': checkpoint_chunks}
+
+    def plan(self, start_date, end_date, currencies):
+        end_date = min(end_date, mnbexchangerates.last_complete_date())
+        return [chunk
+                for start, end in self.mnb.history.missing_ranges(start_date, end_date, currencies)
+                for chunk in split_range(start, end, self.config['chunk_days'])]
+
+    def _checkpoint(self, completed):
+        if completed:
+            self.log.debug('Storing %s downloaded chunks', len(completed))
+            self.mnb.history.add_many(completed)
+            completed.clear()
+
+    def run(self, start_date, end_date, currencies=None):
+        start_date = mnbexchangerates.date_str(start_date)
+        end_date = mnbexchangerates.date_str(end_date)
+        if currencies is None:
+            currencies = list(self.mnb.get_table().index)
+        chunks = self.plan(start_date, end_date, currencies)
+        result = {'chunks': len(chunks), 'fetched': 0, 'days': 0, 'failed': []}
+        self.log.debug('Backfilling %s chunks from %s to %s', len(chunks), start_date, end_date)
+        if not chunks:
+            return result
+        # Created here, not concurrently by the first requests of the workers.
+        transport = self.mnb.transport
+        self.log.debug('Using %s', transport.url)
+        completed = []
+        with ThreadPoolExecutor(max_workers=self.config['workers']) as executor:
+            futures = {executor.submit(self.mnb.fetch_rate_history, start, end, currencies, store=False): (start, end)
+                       for start, end in chunks}
+            try:
+                for future in as_completed(futures):
+                    start, end = futures[future]
+                    try:
+                        days = future.result()
+                    except Exception as exc:  # pylint: disable=W0703
+                        self.log.debug('Chunk %s - %s failed: %s', start, end, str(exc))
+                        result['failed'].append((start, end, str(exc)))
+                        continue
+                    completed.append((days, start, end, currencies))
+                    result['fetched'] += 1
+                    result['days'] += len(days)
+                    if len(completed) >= self.config['checkpoint_chunks']:
+                        self._checkpoint(completed)
+            finally:
+                # On interruption the queued chunks are dropped and the finished ones are kept.
+                for future in futures:
+                    future.cancel()
+                self._checkpoint(completed)
+        # The journal of the checkpoints is merged into the history file once, at the end.
+        self.mnb.history.compact()
+        return result
@@ -0,0 +1,201 @@
+from array import array
+import bisect
+from datetime import date as datetime_date
+import mmap
+import struct
+import sys
+
+from mnbexchangerates import mnbexchangerates_cache
+from mnbexchangerates import mnbexchangerates_table
+
+
+MAGIC = b'MNBR'
+VERSION = 1
+# magic, version, reserved, currency count, day count, covered range count
+HEADER = struct.Struct('<4sHHIII')
+# currency code
+CURRENCY = struct.Struct('<4s')
+# currency index, first and last day (date ordinals)
+COVERED = struct.Struct('<III')
+DATE = struct.Struct('<I')
+RATE = struct.Struct('<q')
+UNIT = struct.Struct('<H')
+MISSING = 0
+
+
+def to_ordinal(date):
+    return datetime_date.fromisoformat(date).toordinal()
+
+
+def from_ordinal(ordinal):
+    return datetime_date.fromordinal(ordinal).isoformat()
+
+
+def _little_endian_bytes(typecode, values):
+    values = array(typecode, values)
+    if sys.byteorder != 'little':  # pragma: no cover
+        values.byteswap()
+    return values.tobytes()
+
+
+class MNBExchangeRateHistoryFile:
+    # Layout (little-endian, every section directly follows the previous one):
+    #   header | currency codes | covered ranges | sorted date ordinals (uint32)
+    #   | rates (int64 fixed-point, day-major) | units (uint16, 0 = no rate)
+    # Only the header, the currency codes and the covered ranges are parsed when opening;
+    # dates and rates are read from the memory map on demand.
+
+    def __init__(self, path):
+        with open(path, 'rb') as history:
+            self._map = mmap.mmap(history.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            self.close()
+            raise ValueError(f'Truncated history file: {path}')
+        magic, version, _, currency_count, day_count, covered_count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f'Unsupported history file: {path}')
+        offset = self._read_index(currency_count, covered_count)
+        self.day_count = day_count
+        rates_offset = offset + day_count * DATE.size
+        units_offset = rates_offset + day_count * currency_count * RATE.size
+        self._offsets = {'dates': offset, 'rates': rates_offset, 'units': units_offset}
+        expected_size = units_offset + day_count * currency_count * UNIT.size
+        if len(self._map) < expected_size:
+            self.close()
+            raise ValueError(f'Truncated history file: {path}')
+
+    def _read_index(self, currency_count, covered_count):
+        offset = HEADER.size
+        self.currencies = [CURRENCY.unpack_from(self._map, offset + index * CURRENCY.size)[0].rstrip(b'\0').decode()
+                           for index in range(currency_count)]
+        self.currency_index = {currency: index for index, currency in enumerate(self.currencies)}
+        offset += currency_count * CURRENCY.size
+        self.covered = {}
+        for index in range(covered_count):
+            currency, start, end = COVERED.unpack_from(self._map, offset + index * COVERED.size)
+            self.covered.setdefault(self.currencies[currency], []).append([from_ordinal(start), from_ordinal(end)])
+        return offset + covered_count * COVERED.size
+
+    def close(self):
+        self._map.close()
+
+    def date_at(self, index):
+        return DATE.unpack_from(self._map, self._offsets['dates'] + index * DATE.size)[0]
+
+    def find(self, ordinal):
+        # Index of the last day on or before the ordinal, -1 if there is none.
+        low, high = 0, self.day_count
+        while low < high:
+            middle = (low + high) // 2
+            if self.date_at(middle) <= ordinal:
+                low = middle + 1
+            else:
+                high = middle
+        return low - 1
+
+    def cell(self, index, currency_index):
+        cell = index * len(self.currencies) + currency_index
+        unit = UNIT.unpack_from(self._map, self._offsets['units'] + cell * UNIT.size)[0]
+        if unit == MISSING:
+            return None
+        return unit, RATE.unpack_from(self._map, self._offsets['rates'] + cell * RATE.size)[0]
+
+    def _section(self, typecode, name, count):
+        values = array(typecode)
+        values.frombytes(self._map[self._offsets[name]:self._offsets[name] + count * values.itemsize])
+        if sys.byteorder != 'little':  # pragma: no cover
+            values.byteswap()
+        return values
+
+    def arrays(self):
+        # The date ordinals, rates and units as arrays, without converting the cells one by one.
+        cells = self.day_count * len(self.currencies)
+        return (self._section('I', 'dates', self.day_count), self._section('q', 'rates', cells),
+                self._section('H', 'units', cells))
+
+    def read_days(self):
+        days = {}
+        for index in range(self.day_count):
+            rates = {}
+            for currency_index, currency in enumerate(self.currencies):
+                cell = self.cell(index, currency_index)
+                if cell is not None:
+                    rates[currency] = (str(cell[0]), mnbexchangerates_table.fixed_to_str(cell[1]))
+            days[from_ordinal(self.date_at(index))] = rates
+        return days
+
+    @classmethod
+    def _cells(cls, days, dates, currency_index):
+        rates = [0] * (len(dates) * len(currency_index))
+        units = [MISSING] * (len(dates) * len(currency_index))
+        for day_index, date in enumerate(dates):
+            for currency, (unit, rate) in days[date].items():
+                cell = day_index * len(currency_index) + currency_index[currency]
+                units[cell] = int(unit)
+                rates[cell] = mnbexchangerates_table.parse_fixed(rate)
+        return rates, units
+
+    @classmethod
+    def write(cls, path, days, covered):
+        currencies = sorted({currency for rates in days.values() for currency in rates} | set(covered))
+        currency_index = {currency: index for index, currency in enumerate(currencies)}
+        dates = sorted(days)
+        rates, units = cls._cells(days, dates, currency_index)
+        cls._dump(path, currencies, covered, ([to_ordinal(date) for date in dates], rates, units))
+
+    @classmethod
+    def _copy_rows(cls, merged, sections, rows, width):
+        # Appends the rows [start, end) of the dates, rates and units sections.
+        start, end = rows
+        merged[0].extend(sections[0][start:end])
+        for merged_cells, cells in zip(merged[1:], sections[1:]):
+            merged_cells.extend(cells[start * width:end * width])
+
+    @classmethod
+    def merge(cls, path, history, days, covered):
+        # Writes the days of an open file with days: {date: {currency: (unit, fixed-point rate)}} merged in,
+        # whose currencies must all be in the file. Rows of the file between the merged days are copied as
+        # blocks, so the cost does not depend on converting every stored cell.
+        sections = history.arrays()
+        width = len(history.currencies)
+        merged = (array('I'), array('q'), array('H'))
+        copied = 0
+        for date in sorted(days):
+            ordinal = to_ordinal(date)
+            index = bisect.bisect_left(sections[0], ordinal)
+            cls._copy_rows(merged, sections, (copied, index), width)
+            copied = index
+            if index < history.day_count and sections[0][index] == ordinal:
+                # The stored row is copied, then its cells are overwritten.
+                copied = index + 1
+                cls._copy_rows(merged, sections, (index, copied), width)
+            else:
+                merged[0].append(ordinal)
+                merged[1].extend([0] * width)
+                merged[2].extend([MISSING] * width)
+            for currency, cell_value in days[date].items():
+                cell = (len(merged[0]) - 1) * width + history.currency_index[currency]
+                merged[2][cell], merged[1][cell] = cell_value
+        cls._copy_rows(merged, sections, (copied, history.day_count), width)
+        cls._dump(path, history.currencies, covered, merged)
+
+    @classmethod
+    def _dump(cls, path, currencies, covered, sections):
+        # sections: date ordinals, rates and units
+        ordinals, rates, units = sections
+        currency_index = {currency: index for index, currency in enumerate(currencies)}
+        covered_ranges = [(currency_index[currency], to_ordinal(start), to_ordinal(end))
+                          for currency, intervals in sorted(covered.items()) for start, end in intervals]
+
+        def dump(history):
+            history.write(HEADER.pack(MAGIC, VERSION, 0, len(currencies), len(ordinals), len(covered_ranges)))
+            for currency in currencies:
+                history.write(CURRENCY.pack(currency.encode()))
+            for covered_range in covered_ranges:
+                history.write(COVERED.pack(*covered_range))
+            history.write(_little_endian_bytes('I', ordinals))
+            history.write(_little_endian_bytes('q', rates))
+            history.write(_little_endian_bytes('H', units))
+
+        mnbexchangerates_cache.write_atomically(path, dump)
@@ -0,0 +1,118 @@
+from datetime import datetime
+import gzip
+import hashlib
+import json
+
+from mnbexchangerates import mnbexchangerates
+from mnbexchangerates import mnbexchangerates_backends
+from mnbexchangerates import mnbexchangerates_cache
+
+
+FORMAT = 'mnbexchangerates-bundle'
+VERSION = 1
+
+
+def _line(record):
+    return (json.dumps(record, separators=(',', ':'), sort_keys=True) + '\n').encode()
+
+
+def write_bundle(path, rates, days, covered):
+    # A gzip compressed JSON Lines file: a manifest, the latest rates, one line per history day
+    # and the sha256 of all the previous lines, so that it can be written and verified as a stream.
+    # rates: {'date', 'rates'} or None, days: {date: {currency: (unit, rate)}}, covered: {currency: [[start, end]]}
+    def dump(bundle_file):
+        checksum = hashlib.sha256()
+        with gzip.GzipFile(fileobj=bundle_file, mode='wb', mtime=0) as bundle:
+            def write(record):
+                line = _line(record)
+                checksum.update(line)
+                bundle.write(line)
+            write({'type': 'manifest',
+                   'format': FORMAT,
+                   'version': VERSION,
+                   'created': datetime.now().isoformat(timespec='seconds'),
+                   'rates_date': rates['date'] if rates else None,
+                   'days': len(days),
+                   'covered': covered})
+            if rates:
+                write({'type': 'rates', 'date': rates['date'], 'rates': rates['rates']})
+            for date in sorted(days):
+                write({'type': 'day',
+                       'date': date,
+                       'rates': [(unit, currency, rate) for currency, (unit, rate) in sorted(days[date].items())]})
+            bundle.write(_line({'type': 'checksum', 'sha256': checksum.hexdigest()}))
+
+    mnbexchangerates_cache.write_atomically(path, dump)
+
+
+def _check_manifest(record):
+    if record.get('type') != 'manifest' or record.get('format') != FORMAT:
+        raise Exception('Not an exchange rate bundle')  # pylint: disable=W0719
+    if not isinstance(record.get('version'), int) or record['version'] > VERSION:
+        raise Exception(f"Unsupported bundle version: {record.get('version')}")  # pylint: disable=W0719
+
+
+def _add_record(contents, record):
+    if contents['manifest'] is None:
+        _check_manifest(record)
+        contents['manifest'] = record
+    elif record.get('type') == 'rates':
+        contents['rates'] = {'date': record['date'], 'rates': [tuple(rate) for rate in record['rates']]}
+    elif record.get('type') == 'day':
+        contents['days'].append({'date': record['date'], 'rates': [tuple(rate) for rate in record['rates']]})
+
+
+def read_bundle(path):
+    # Decompressed and parsed line by line; the contents are returned only if the checksum matches.
+    checksum = hashlib.sha256()
+    contents = {'manifest': None, 'rates': None, 'days': []}
+    try:
+        with gzip.open(path, 'rb') as bundle:
+            for line in bundle:
+                record = json.loads(line)
+                if record.get('type') == 'checksum' and contents['manifest'] is not None:
+                    if record.get('sha256') != checksum.hexdigest():
+                        raise Exception('Bundle checksum mismatch')  # pylint: disable=W0719
+                    return contents
+                checksum.update(line)
+                _add_record(contents, record)
+    except (OSError, EOFError, ValueError, KeyError, TypeError, AttributeError) as exc:
+        raise Exception(f'Invalid bundle: {exc}') from exc  # pylint: disable=W0719
+    raise Exception('Truncated bundle')  # pylint: disable=W0719
+
+
+def export_bundle(mnb_exchange_rates, path):
+    rates = mnb_exchange_rates.cache.load()
+    if rates is not None:
+        rates = {'date': rates['date'], 'rates': rates['rates']}
+    history = mnb_exchange_rates.history.load()
+    days = history.read_days()
+    write_bundle(path, rates, days, history.covered)
+    return {'rates_date': rates['date'] if rates else None, 'days': len(days)}
+
+
+def import_bundle(mnb_exchange_rates, path, history=True):
+    # The rates replace the cached ones unless those are newer; the days and covered ranges are
+    # merged into the history with one write.
+    contents = read_bundle(path)
+    rates = contents['rates']
+    if rates is not None:
+        cached_rates = mnb_exchange_rates.cache.load()
+        if cached_rates is None or cached_rates['date'] < rates['date']:
+            mnb_exchange_rates.cache.save(rates)
+            mnb_exchange_rates.use_rates(rates)
+    covered = contents['manifest'].get('covered') or {}
+    if history and (contents['days'] or covered):
+        mnb_exchange_rates.history.add_many(
+            [(contents['days'], None, None, ())] +
+            [([], start, end, [currency]) for currency, intervals in covered.items() for start, end in intervals])
+    return {'rates_date': rates['date'] if rates else None, 'days': len(contents['days']) if history else 0}
+
+
+def load_bundle(path, history=False, **config):
+    # A client that serves the rates of the bundle from memory, without reading or writing the cache file.
+    # config is passed to MNBExchangeRates, e.g. cache_only=True where the network is not reachable.
+    mnb_exchange_rates = mnbexchangerates.MNBExchangeRates(
+        cache_backend=mnbexchangerates_backends.MNBExchangeRateMemoryBackend(), **config)
+    import_bundle(mnb_exchange_rates, path, history)
+    return mnb_exchange_rates
@@ -1,74 +1,242 @@
+import contextlib
+from datetime import date as datetime_date
 from datetime import datetime
 from datetime import timedelta
 import os
 import pickle
+from pickle import UnpicklingError
+import threading
+import time
 
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from mnbexchangerates import mnbexchangerates_calendar
 from mnbexchangerates import mnbexchangerates_logger
+from mnbexchangerates import mnbexchangerates_metrics
 
 
 RATES_CACHE_DIR = '~/.config/mnbexchangerates'
 RATES_CACHE_FILE = RATES_CACHE_DIR + '/exchange_rates.cache'
-DATE_FORMAT = '%Y-%m-%d'
+LOCK_FILE = RATES_CACHE_DIR + '/exchange_rates.lock'
+LOCK_TIMEOUT = 30
+LOCK_POLL_INTERVAL = 0.05
+# Lock files may be shared by several users (see mnbexchangerates_backends); flock() needs only a
+# readable file, which they are with the usual umasks.
+LOCK_FILE_MODE = 0o644
 REFRESH_HOUR = 11
 
 
+def next_date(date):
+    return (datetime_date.fromisoformat(date) + timedelta(1)).isoformat()
+
+
+def previous_date(date):
+    return (datetime_date.fromisoformat(date) - timedelta(1)).isoformat()
+
+
+def write_atomically(path, dump):
+    # Readers either see the old or the new file, never a partially written one.
+    # The temporary file is private to the thread, and is created with the umask like the file itself.
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        with open(tmp_path, 'wb') as tmp_file:
+            dump(tmp_file)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, path)
+    except OSError:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+def open_lock_file(path):
+    # Opened read-only, so users who cannot write the lock file can lock it too.
+    return os.fdopen(os.open(path, os.O_RDONLY | os.O_CREAT, LOCK_FILE_MODE), 'rb')
+
+
+@contextlib.contextmanager
+def exclusive_lock(path):
+    # Blocks until no other process or thread holds the lock file. Without fcntl nothing is locked.
+    if fcntl is None:
+        yield
+        return
+    with open_lock_file(path) as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+class MNBExchangeRateFileBackend:
+    # The latest rates in one pickle file, by default under the per-user cache directory.
+    # Backends (see mnbexchangerates_backends) provide load(), save(rates), load_range(start_date, end_date)
+    # and lock_path(), the file that serialises refreshes between processes (None: no lock).
+
+    def __init__(self, path=None, debug=False):
+        self.log = mnbexchangerates_logger.MNBExchangeRatesLogger(debug).get_logger()
+        self.path = path
+
+    def _path(self):
+        return os.path.expanduser(self.path or RATES_CACHE_FILE)
+
+    def lock_path(self):
+        return os.path.expanduser(LOCK_FILE if self.path is None else self.path + '.lock')
+
+    def load(self):
+        try:
+            with open(self._path(), 'rb') as cache:
+                data = pickle.load(cache)
+                self.log.debug('Cache file found.')
+        except (IOError, EOFError, KeyError, UnpicklingError) as exc:
+            self.log.debug('Error when reading cache file. Invalidating read cache. (%s: %s)',
+                           type(exc).__name__,
+                           exc.args)
+            data = None
+        return data
+
+    def save(self, rates):
+        write_atomically(self._path(), lambda cache: pickle.dump(rates, cache, pickle.HIGHEST_PROTOCOL))
+
+    def load_range(self, start_date, end_date):
+        # Only the latest rates are kept in the file.
+        rates = self.load()
+        if isinstance(rates, dict) and start_date <= (rates.get('date') or '') <= end_date:
+            return [rates]
+        return []
+
+
 class MNBExchangeRateCache:
 
-    def __init__(self, debug=False, cache_only=False):
+    def __init__(self, debug=False, cache_only=False, backend=None):
         self.log = mnbexchangerates_logger.MNBExchangeRatesLogger(debug).get_logger()
-        self.log.debug('Cache file path: %s', RATES_CACHE_FILE)
+        self.backend = backend or MNBExchangeRateFileBackend(debug=debug)
+        self.log.debug('Cache backend: %s', type(self.backend).__name__)
         self._ensure_cache_dir()
         self.cache_only = cache_only
         self.time = None
-        self.today = None
-        self.yesterday = None
+        # {'date': cache date, 'time': when its rates expire}
+        self._expiry = {'date': None, 'time': None}
 
     def _ensure_cache_dir(self):
-        if not os.path.isdir(os.path.expanduser(RATES_CACHE_DIR)):
+        # The directory of the lock file, which is the per-user directory only for the default file backend.
+        lock_path = self.backend.lock_path()
+        if lock_path is None:
+            return
+        cache_dir = os.path.dirname(lock_path)
+        if not os.path.isdir(cache_dir):
             try:
-                os.makedirs(os.path.expanduser(RATES_CACHE_DIR))
-                self.log.debug('Cache directory created (%s)', RATES_CACHE_DIR)
+                os.makedirs(cache_dir)
+                self.log.debug('Cache directory created (%s)', cache_dir)
             except IOError:
-                self.log.debug('Could not create cache directory (%s)', RATES_CACHE_DIR)
+                self.log.debug('Could not create cache directory (%s)', cache_dir)
 
     def _read_cache(self):
-        try:
-            with open(os.path.expanduser(RATES_CACHE_FILE), 'rb') as cache:
-                data = pickle.load(cache)
-                self.log.debug('Cache file found. Read rates: %s', data)
-        except (IOError, EOFError, KeyError) as exc:
-            self.log.debug('Error when reading cache file. Invalidating read cache. (%s: %s)',
-                           type(exc).__name__,
-                           exc.args)
-            data = None
-        return data
+        return self.backend.load()
 
     def save(self, rates):
-        self.log.debug('Writing rates to cache file. (Rates: %s)', rates)
+        self.log.debug('Writing rates of %s to cache.', rates.get('date'))
+        metrics = mnbexchangerates_metrics.get_metrics()
         try:
-            with open(os.path.expanduser(RATES_CACHE_FILE), 'wb') as cache:
-                pickle.dump(rates, cache, pickle.HIGHEST_PROTOCOL)
-                self.log.debug('Cache file stored.')
+            with metrics.timer('cache_save_seconds'):
+                self.backend.save(rates)
+            self.log.debug('Cache stored.')
         except IOError as exc:
-            self.log.debug('Error while writing cache file (%s)', str(exc))
+            metrics.increment('cache_save_failures_total')
+            self.log.debug('Error while writing cache (%s)', str(exc))
+
+    def load_range(self, start_date, end_date):
+        # Stored rates published from start_date to end_date, ordered by date.
+        return self.backend.load_range(start_date, end_date)
+
+    @classmethod
+    def _acquire_lock(cls, lock_file, blocking, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if not blocking or time.monotonic() >= deadline:
+                    return False
+                time.sleep(LOCK_POLL_INTERVAL)
+
+    @contextlib.contextmanager
+    def refresh_lock(self, blocking=True, timeout=LOCK_TIMEOUT):
+        # Yields whether this process may refresh the cache. Only one process holds the lock at a time.
+        lock_path = self.backend.lock_path() if fcntl is not None else None
+        try:
+            lock_file = open_lock_file(lock_path) if lock_path else None
+        except IOError as exc:
+            self.log.debug('Could not open lock file, refreshing without lock (%s)', str(exc))
+            lock_file = None
+        if lock_file is None:
+            yield True
+            return
+        with lock_file:
+            acquired = self._acquire_lock(lock_file, blocking, timeout)
+            self.log.debug('Refresh lock %s.', 'acquired' if acquired else 'is held by another process')
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
 
     def _refresh_date(self):
         self.time = datetime.now()
-        self.today = self.time.strftime(DATE_FORMAT)
-        self.yesterday = (self.time - timedelta(1)).strftime(DATE_FORMAT)
-        self.log.debug('Date: %s - Hour: %s', self.today, self.time.hour)
-
-    def _check_not_weekend(self, cache_date):
-        cache_date = datetime.strptime(cache_date, DATE_FORMAT)
-        self.log.debug('Parsed cache date: %s', cache_date)
-        return not ((self.time.weekday() == 5 and
-                     (cache_date + timedelta(1)).strftime(DATE_FORMAT) == self.today) or
-                    (self.time.weekday() == 6 and
-                     (cache_date + timedelta(2)).strftime(DATE_FORMAT) == self.today) or
-                    (self.time.weekday() == 0 and self.time.hour < REFRESH_HOUR and
-                     (cache_date + timedelta(3)).strftime(DATE_FORMAT) == self.today))
+
+    def expiry(self, cache_date):
+        # Computed once per cache date: the refresh hour of the next publication day after it.
+        if self._expiry['date'] != cache_date:
+            self._expiry = {'date': cache_date, 'time': mnbexchangerates_calendar.expiry(cache_date, REFRESH_HOUR)}
+            self.log.debug('Rates of %s expire at %s', cache_date, self._expiry['time'])
+        return self._expiry['time']
+
+    def postpone(self, cache_date, seconds):
+        # Newer rates are not published yet, so the rates of cache_date are kept for a while.
+        expiry = max(self.expiry(cache_date), datetime.now() + timedelta(seconds=seconds))
+        self._expiry = {'date': cache_date, 'time': expiry}
+        self.log.debug('Rates of %s are kept until %s', cache_date, expiry)
+        # Stored with the rates, so that the other processes do not recheck them either. Callers hold the
+        # refresh lock, so newer rates are not saved in the meantime.
+        cached_rates = self._read_cache()
+        if isinstance(cached_rates, dict) and cached_rates.get('date') == cache_date:
+            self.save(dict(cached_rates, recheck=expiry.isoformat()))
+
+    def _recheck(self, cached_rates):
+        # The expiry postponed by any process.
+        recheck = cached_rates.get('recheck')
+        cache_date = cached_rates['date']
+        if recheck and recheck > self.expiry(cache_date).isoformat():
+            self._expiry = {'date': cache_date, 'time': datetime.fromisoformat(recheck)}
+
+    def is_uptodate(self, cache_date, refresh_date=True):
+        if refresh_date:
+            self._refresh_date()
+        if self.cache_only:
+            self.log.debug('Forced use of cache.')
+            return True
+        if self.time >= self.expiry(cache_date):
+            self.log.debug('Cache is not up-to-date.')
+            return False
+        self.log.debug('Cache is up-to-date.')
+        return True
 
     def load(self):
+        metrics = mnbexchangerates_metrics.get_metrics()
+        with metrics.timer('cache_load_seconds'):
+            cached_rates = self._load()
+        if cached_rates is None:
+            metrics.increment('cache_misses_total')
+        elif cached_rates['uptodate']:
+            metrics.increment('cache_hits_total')
+        else:
+            metrics.increment('cache_stale_total')
+        return cached_rates
+
+    def _load(self):
         self._refresh_date()
         cached_rates = self._read_cache()
         if cached_rates is not None:
@@ -77,15 +245,7 @@ class MNBExchangeRateCache:
                     cached_rates.get('rates') is None):
                 self.log.debug('Cache seem to be invalid, emptying it.')
                 cached_rates = None
-            elif self.cache_only:
-                cached_rates.update({'uptodate': True})
-                self.log.debug('Forced use of cache.')
-            elif (cached_rates['date'] != self.today and
-                  not (cached_rates['date'] == self.yesterday and self.time.hour < REFRESH_HOUR) and
-                  self._check_not_weekend(cached_rates['date'])):
-                cached_rates.update({'uptodate': False})
-                self.log.debug('Cache is not up-to-date.')
             else:
-                cached_rates.update({'uptodate': True})
-                self.log.debug('Cache is up-to-date.')
+                self._recheck(cached_rates)
+                cached_rates.update({'uptodate': self.is_uptodate(cached_rates['date'], refresh_date=False)})
         return cached_rates
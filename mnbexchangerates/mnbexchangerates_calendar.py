@@ -0,0 +1,57 @@
+from datetime import date as datetime_date
+from datetime import datetime
+from datetime import timedelta
+import functools
+
+
+# Hungarian public holidays, when MNB does not publish exchange rates (month, day)
+FIXED_HOLIDAYS = ((1, 1), (3, 15), (5, 1), (8, 20), (10, 23), (11, 1), (12, 25), (12, 26))
+# Days relative to Easter Sunday: Good Friday (since 2017), Easter Monday, Whit Monday
+EASTER_HOLIDAYS = (-2, 1, 50)
+GOOD_FRIDAY_SINCE = 2017
+# Further non-publication days (e.g. bridge days) as ISO dates, and working Saturdays with publication
+EXTRA_HOLIDAYS = set()
+EXTRA_PUBLICATION_DAYS = set()
+
+
+def easter(year):
+    # Anonymous Gregorian algorithm
+    golden = year % 19
+    century, year_of_century = divmod(year, 100)
+    leap_centuries, century_remainder = divmod(century, 4)
+    correction = (century + 8) // 25
+    epact = (19 * golden + century - leap_centuries - (century - correction + 1) // 3 + 15) % 30
+    leap_years, year_remainder = divmod(year_of_century, 4)
+    weekday = (32 + 2 * century_remainder + 2 * leap_years - epact - year_remainder) % 7
+    offset = (golden + 11 * epact + 22 * weekday) // 451
+    month, day = divmod(epact + weekday - 7 * offset + 114, 31)
+    return datetime_date(year, month, day + 1)
+
+
+@functools.lru_cache(maxsize=None)
+def holidays(year):
+    easter_sunday = easter(year)
+    days = {datetime_date(year, month, day) for month, day in FIXED_HOLIDAYS}
+    days.update(easter_sunday + timedelta(offset) for offset in EASTER_HOLIDAYS
+                if offset != -2 or year >= GOOD_FRIDAY_SINCE)
+    return frozenset(days)
+
+
+def is_publication_day(date):
+    if date.isoformat() in EXTRA_PUBLICATION_DAYS:
+        return True
+    return date.weekday() < 5 and date not in holidays(date.year) and date.isoformat() not in EXTRA_HOLIDAYS
+
+
+def next_publication_day(date):
+    date += timedelta(1)
+    while not is_publication_day(date):
+        date += timedelta(1)
+    return date
+
+
+def expiry(rates_date, refresh_hour):
+    # Time when rates published on rates_date (ISO string) are superseded: the refresh hour of the
+    # next publication day.
+    next_day = next_publication_day(datetime_date.fromisoformat(rates_date))
+    return datetime(next_day.year, next_day.month, next_day.day, refresh_hour)
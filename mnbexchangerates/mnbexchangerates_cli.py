@@ -1,8 +1,19 @@
 from __future__ import print_function
 import argparse
+import contextlib
+from datetime import datetime
+import os
 import sys
 
 from mnbexchangerates import mnbexchangerates
+from mnbexchangerates import mnbexchangerates_format
+# The subcommands and the server client import their modules on demand: the CLI is started
+# very often, and a plain query from the cache should load as little as possible.
+
+
+SERVER_ENV = 'MNB_EXCHANGE_RATE_SERVER'
+BACKEND_ENV = 'MNB_EXCHANGE_RATE_BACKEND'
+CACHE_PATH_ENV = 'MNB_EXCHANGE_RATE_CACHE_PATH'
 
 
 def supported_float(number):
@@ -14,25 +25,381 @@ def supported_float(number):
     return number
 
 
-def parse_arguments():
+def currency_with_amount(value):
+    currency, _, amount = value.partition(':')
+    return currency, supported_float(amount) if amount else None
+
+
+def supported_date(date):
+    try:
+        date = datetime.strptime(date, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError as value_error:
+        raise argparse.ArgumentTypeError(f"{date} is not a valid date (YYYY-MM-DD)") from value_error
+    return date
+
+
+def supported_date_or_today(date):
+    if date == 'today':
+        return datetime.now().strftime('%Y-%m-%d')
+    return supported_date(date)
+
+
+def currency_list(value):
+    return [currency.strip().upper() for currency in value.split(',') if currency.strip()]
+
+
+def add_cache_arguments(parser):
+    from mnbexchangerates import mnbexchangerates_backends  # pylint: disable=C0415
+    parser.add_argument('--backend', choices=sorted(mnbexchangerates_backends.BACKENDS),
+                        default=os.environ.get(BACKEND_ENV),
+                        help=f'cache backend (default: ${BACKEND_ENV}, otherwise file)')
+    parser.add_argument('--cache-path', default=os.environ.get(CACHE_PATH_ENV),
+                        help=f'path of the cache file or database (default: ${CACHE_PATH_ENV}, '
+                             'otherwise under ~/.config/mnbexchangerates)')
+
+
+def create_mnb_exchange_rates(args, cache_only=False):
+    backend = None
+    if args.backend or args.cache_path:
+        from mnbexchangerates import mnbexchangerates_backends  # pylint: disable=C0415
+        backend = mnbexchangerates_backends.create_backend(args.backend or mnbexchangerates_backends.FILE,
+                                                           args.cache_path, debug=args.debug)
+    return mnbexchangerates.MNBExchangeRates(args.debug, cache_only, cache_backend=backend)
+
+
+def parse_arguments(argv=None):
     parser = argparse.ArgumentParser(description='Fetch MNB Exchange Rates')
-    parser.add_argument('currency', help='Fetch Exchange rate from <currency> to HUF')
+    parser.add_argument('currency', nargs='+', type=currency_with_amount,
+                        help='Fetch Exchange rate from <currency> to HUF '
+                             '(several currencies, or CURRENCY:AMOUNT pairs, can be given)')
     parser.add_argument('-d', '--debug', action='store_true',
                         help='show debug logs')
     parser.add_argument('-c', '--cache-only', action='store_true',
                         help='force use of cache (ignore cache age)')
     parser.add_argument('-a', '--amount', type=supported_float,
                         help='fetch exchange rate of the given AMOUNT')
-    return parser.parse_args()
+    parser.add_argument('--date', type=supported_date,
+                        help='use the exchange rate published on (or last before) DATE (YYYY-MM-DD)')
+    parser.add_argument('-s', '--server', default=os.environ.get(SERVER_ENV),
+                        help=f'ask a running "mnb-exchange-rate serve" at SERVER URL (default: ${SERVER_ENV})')
+    parser.add_argument('-f', '--format', choices=mnbexchangerates_format.FORMATS, default=mnbexchangerates_format.TEXT,
+                        help='output format: text sentences, JSON Lines, csv or tsv with numeric fields '
+                             '(default: %(default)s)')
+    add_cache_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def parse_convert_arguments(argv):
+    from mnbexchangerates import mnbexchangerates_convert  # pylint: disable=C0415
+    parser = argparse.ArgumentParser(prog='mnb-exchange-rate convert',
+                                     description='Add HUF values to CSV or JSON Lines records')
+    parser.add_argument('input', nargs='?', help='input file (default: stdin)')
+    parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    parser.add_argument('-d', '--debug', action='store_true',
+                        help='show debug logs')
+    parser.add_argument('-c', '--cache-only', action='store_true',
+                        help='force use of cache (ignore cache age)')
+    parser.add_argument('--input-format', choices=mnbexchangerates_convert.FORMATS,
+                        help='format of the input (default: guessed from file name, otherwise csv)')
+    parser.add_argument('--output-format', choices=mnbexchangerates_convert.FORMATS,
+                        help='format of the output (default: same as input)')
+    parser.add_argument('--currency', help='convert every record from CURRENCY instead of a currency field')
+    parser.add_argument('--currency-field', default='currency',
+                        help='name of the currency field (default: %(default)s)')
+    parser.add_argument('--amount-field', default='amount',
+                        help='name of the amount field (default: %(default)s)')
+    parser.add_argument('--date-field',
+                        help='name of the field holding the date of the rate to use (default: current rates)')
+    parser.add_argument('--value-field', default='huf',
+                        help='name of the added HUF value field (default: %(default)s)')
+    parser.add_argument('--rate-date-field', default='rate_date',
+                        help='name of the added rate date field (default: %(default)s)')
+    parser.add_argument('--skip-errors', action='store_true',
+                        help='leave the added fields empty for records that cannot be converted')
+    parser.add_argument('--validate', action='store_true',
+                        help='reject unknown currency codes by the locally stored currency list of MNB')
+    add_cache_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def _open_or_default(path, mode, default):
+    if path:
+        return open(path, mode, newline='', encoding='utf-8')
+    return contextlib.nullcontext(default)
+
+
+def convert(argv):
+    from mnbexchangerates import mnbexchangerates_convert  # pylint: disable=C0415
+    from mnbexchangerates import mnbexchangerates_currencies  # pylint: disable=C0415
+    args = parse_convert_arguments(argv)
+    mnb_exchange_rates = create_mnb_exchange_rates(args, args.cache_only)
+    converter = mnbexchangerates_convert.MNBExchangeRateConverter(
+        mnb_exchange_rates,
+        fields={'currency': args.currency_field,
+                'amount': args.amount_field,
+                'date': args.date_field,
+                'value': args.value_field,
+                'rate_date': args.rate_date_field},
+        currency=args.currency,
+        skip_errors=args.skip_errors,
+        currencies=mnbexchangerates_currencies.MNBExchangeRateCurrencies(mnb_exchange_rates) if args.validate else None)
+    input_format = args.input_format or mnbexchangerates_convert.guess_format(args.input)
+    output_format = args.output_format or input_format
+    with _open_or_default(args.input, 'r', sys.stdin) as input_stream, \
+            _open_or_default(args.output, 'w', sys.stdout) as output_stream:
+        try:
+            converter.convert_stream(input_stream, output_stream, input_format, output_format)
+        except Exception as exc:  # pylint: disable=W0703
+            print(str(exc), file=sys.stderr)
+            return 1
+    return None
+
+
+def parse_serve_arguments(argv):
+    from mnbexchangerates import mnbexchangerates_scheduler  # pylint: disable=C0415
+    from mnbexchangerates import mnbexchangerates_server  # pylint: disable=C0415
+    parser = argparse.ArgumentParser(prog='mnb-exchange-rate serve',
+                                     description='Serve MNB exchange rates over local HTTP')
+    parser.add_argument('--host', default=mnbexchangerates_server.HOST,
+                        help='address to listen on (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=mnbexchangerates_server.PORT,
+                        help='port to listen on (default: %(default)s)')
+    parser.add_argument('--retry-interval', type=float, default=mnbexchangerates_scheduler.RETRY_INTERVAL,
+                        help='first delay in seconds between checks for not yet published rates '
+                             '(default: %(default)s)')
+    parser.add_argument('-d', '--debug', action='store_true',
+                        help='show debug logs')
+    parser.add_argument('-c', '--cache-only', action='store_true',
+                        help='force use of cache (ignore cache age)')
+    add_cache_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def serve(argv):
+    from mnbexchangerates import mnbexchangerates_metrics  # pylint: disable=C0415
+    from mnbexchangerates import mnbexchangerates_server  # pylint: disable=C0415
+    args = parse_serve_arguments(argv)
+    mnbexchangerates_metrics.enable()
+    server = mnbexchangerates_server.MNBExchangeRateServer(
+        create_mnb_exchange_rates(args, args.cache_only),
+        host=args.host, port=args.port, retry_interval=args.retry_interval)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+def parse_backfill_arguments(argv):
+    from mnbexchangerates import mnbexchangerates_backfill  # pylint: disable=C0415
+    parser = argparse.ArgumentParser(prog='mnb-exchange-rate backfill',
+                                     description='Download the missing exchange rate history of a date range')
+    parser.add_argument('--from', dest='start', required=True, type=supported_date,
+                        help='first date of the range (YYYY-MM-DD)')
+    parser.add_argument('--to', dest='end', default='today', type=supported_date_or_today,
+                        help='last date of the range (YYYY-MM-DD or today, default: %(default)s)')
+    parser.add_argument('--currencies', type=currency_list,
+                        help='comma separated currencies (default: every currency of the current rates)')
+    parser.add_argument('--chunk-days', type=int, default=mnbexchangerates_backfill.CHUNK_DAYS,
+                        help='number of days fetched in one request (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=mnbexchangerates_backfill.WORKERS,
+                        help='number of concurrent requests (default: %(default)s)')
+    parser.add_argument('-d', '--debug', action='store_true',
+                        help='show debug logs')
+    add_cache_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def backfill(argv):
+    from mnbexchangerates import mnbexchangerates_backfill  # pylint: disable=C0415
+    args = parse_backfill_arguments(argv)
+    try:
+        result = mnbexchangerates_backfill.MNBExchangeRateBackfill(
+            create_mnb_exchange_rates(args),
+            chunk_days=args.chunk_days, workers=args.workers).run(args.start, args.end, args.currencies)
+    except KeyboardInterrupt:
+        print('Interrupted, the downloaded chunks are stored. Run again to continue.', file=sys.stderr)
+        return 130
+    except Exception as exc:  # pylint: disable=W0703
+        print(str(exc), file=sys.stderr)
+        return 1
+    print(f"Fetched {result['fetched']} of {result['chunks']} missing chunks ({result['days']} days)")
+    for start, end, error in result['failed']:
+        print(f'Failed {start} - {end}: {error}', file=sys.stderr)
+    return 1 if result['failed'] else None
+
+
+def parse_stats_arguments(argv):
+    parser = argparse.ArgumentParser(prog='mnb-exchange-rate stats',
+                                     description='Show statistics of an exchange rate over a date range')
+    parser.add_argument('currency', help='currency of the rates')
+    parser.add_argument('--from', dest='start', required=True, type=supported_date,
+                        help='first date of the range (YYYY-MM-DD)')
+    parser.add_argument('--to', dest='end', default='today', type=supported_date_or_today,
+                        help='last date of the range (YYYY-MM-DD or today, default: %(default)s)')
+    parser.add_argument('-w', '--window', type=int,
+                        help='show rolling statistics of WINDOW publication days for every day of the range')
+    parser.add_argument('-d', '--debug', action='store_true',
+                        help='show debug logs')
+    parser.add_argument('-c', '--cache-only', action='store_true',
+                        help='use the stored history only (do not fetch missing dates)')
+    add_cache_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def _format_stats(summary):
+    volatility = '-' if summary['volatility'] is None else f"{summary['volatility'] * 100:.4f}%"
+    return (f"{summary['unit']} {summary['currency']} in HUF, "
+            f"{summary['start']} - {summary['end']} ({summary['days']} days)\n"
+            f"average     {summary['average']:.4f}\n"
+            f"min         {summary['min']:.4f}\n"
+            f"max         {summary['max']:.4f}\n"
+            f"first       {summary['first']:.4f}\n"
+            f"last        {summary['last']:.4f}\n"
+            f"volatility  {volatility} (standard deviation of daily log returns)")
+
+
+def stats(argv):
+    from mnbexchangerates import mnbexchangerates_stats  # pylint: disable=C0415
+    args = parse_stats_arguments(argv)
+    rate_stats = mnbexchangerates_stats.MNBExchangeRateStats(
+        create_mnb_exchange_rates(args), fetch=not args.cache_only)
+    try:
+        if args.window:
+            for window in rate_stats.rolling(args.currency, args.start, args.end, args.window):
+                print(f"{window['end']}  average {window['average']:.4f}  min {window['min']:.4f}  "
+                      f"max {window['max']:.4f}")
+        else:
+            print(_format_stats(rate_stats.summary(args.currency, args.start, args.end)))
+    except Exception as exc:  # pylint: disable=W0703
+        print(str(exc), file=sys.stderr)
+        return 1
+    return None
+
+
+def parse_bundle_arguments(argv, command, description):
+    parser = argparse.ArgumentParser(prog=f'mnb-exchange-rate {command}', description=description)
+    parser.add_argument('bundle', help='path of the bundle file')
+    parser.add_argument('-d', '--debug', action='store_true',
+                        help='show debug logs')
+    add_cache_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def export_bundle(argv):
+    from mnbexchangerates import mnbexchangerates_bundle  # pylint: disable=C0415
+    args = parse_bundle_arguments(argv, 'export', 'Write the cached rates and the rate history into a bundle')
+    try:
+        result = mnbexchangerates_bundle.export_bundle(create_mnb_exchange_rates(args), args.bundle)
+    except Exception as exc:  # pylint: disable=W0703
+        print(str(exc), file=sys.stderr)
+        return 1
+    print(f"Exported the rates of {result['rates_date'] or '-'} and {result['days']} history days to {args.bundle}")
+    return None
+
+
+def import_bundle(argv):
+    from mnbexchangerates import mnbexchangerates_bundle  # pylint: disable=C0415
+    args = parse_bundle_arguments(argv, 'import', 'Load the rates and the rate history of a bundle into the cache')
+    try:
+        result = mnbexchangerates_bundle.import_bundle(create_mnb_exchange_rates(args), args.bundle)
+    except Exception as exc:  # pylint: disable=W0703
+        print(str(exc), file=sys.stderr)
+        return 1
+    print(f"Imported the rates of {result['rates_date'] or '-'} and {result['days']} history days from {args.bundle}")
+    return None
+
+
+def parse_validate_arguments(argv):
+    from mnbexchangerates import mnbexchangerates_convert  # pylint: disable=C0415
+    parser = argparse.ArgumentParser(prog='mnb-exchange-rate validate',
+                                     description='Check currency codes against the currency list of MNB')
+    parser.add_argument('input', nargs='?', help='CSV or JSON Lines file of records (default: stdin)')
+    parser.add_argument('--codes', type=currency_list,
+                        help='comma separated currency codes to check instead of records')
+    parser.add_argument('--input-format', choices=mnbexchangerates_convert.FORMATS,
+                        help='format of the input (default: guessed from file name, otherwise csv)')
+    parser.add_argument('--currency-field', default='currency',
+                        help='name of the currency field (default: %(default)s)')
+    parser.add_argument('--refresh', action='store_true',
+                        help='fetch the currency list even if the stored one is recent')
+    parser.add_argument('-d', '--debug', action='store_true',
+                        help='show debug logs')
+    parser.add_argument('-c', '--cache-only', action='store_true',
+                        help='use the stored currency list, whatever its age')
+    add_cache_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def _find_unknown_currencies(currencies, args):
+    if args.codes is not None:
+        return {code: [] for code in currencies.unknown(args.codes)}
+    from mnbexchangerates import mnbexchangerates_convert  # pylint: disable=C0415
+    input_format = args.input_format or mnbexchangerates_convert.guess_format(args.input)
+    with _open_or_default(args.input, 'r', sys.stdin) as input_stream:
+        return currencies.validate_records(
+            mnbexchangerates_convert.MNBExchangeRateConverter.read_records(input_stream, input_format),
+            args.currency_field)
+
+
+def validate(argv):
+    from mnbexchangerates import mnbexchangerates_currencies  # pylint: disable=C0415
+    args = parse_validate_arguments(argv)
+    currencies = mnbexchangerates_currencies.MNBExchangeRateCurrencies(create_mnb_exchange_rates(args, args.cache_only))
+    try:
+        unknown = _find_unknown_currencies(currencies.load(refresh=args.refresh), args)
+    except Exception as exc:  # pylint: disable=W0703
+        print(str(exc), file=sys.stderr)
+        return 1
+    for code, lines in unknown.items():
+        records = f" (records {', '.join(str(line) for line in lines[:10])}{', ...' if len(lines) > 10 else ''})"
+        print(f"Unknown currency: {code or '(missing)'}{records if lines else ''}")
+    return 1 if unknown else None
+
+
+COMMANDS = {
+    'backfill': backfill,
+    'convert': convert,
+    'export': export_bundle,
+    'import': import_bundle,
+    'serve': serve,
+    'stats': stats,
+    'validate': validate,
+}
+
+
+def lookup_records(mnb_exchange_rate, args):
+    # The rate or exchange record of every requested currency; a failed lookup gives an error record.
+    for currency, amount in args.currency:
+        amount = args.amount if amount is None else amount
+        try:
+            if amount:
+                yield mnb_exchange_rate.exchange(currency, amount, args.date)
+            else:
+                yield mnb_exchange_rate.get_rate_for_currency(currency.upper(), args.date)
+        except Exception as exc:  # pylint: disable=W0703
+            yield {'currency': currency.upper(), 'error': str(exc)}
 
 
-def main():
-    args = parse_arguments()
-    mnb_exchange_rate = mnbexchangerates.MNBExchangeRates(args.debug, args.cache_only)
-    if args.amount:
-        print(mnb_exchange_rate.get_exchange_of_amount(args.currency, args.amount))
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+    args = parse_arguments(argv)
+    if args.server:
+        from mnbexchangerates import mnbexchangerates_client  # pylint: disable=C0415
+        mnb_exchange_rate = mnbexchangerates_client.MNBExchangeRateClient(args.server)
     else:
-        print(mnb_exchange_rate.get_str_of_rate_for_currency(args.currency))
+        mnb_exchange_rate = create_mnb_exchange_rates(args, args.cache_only)
+    if args.format != mnbexchangerates_format.TEXT:
+        mnbexchangerates_format.write_records(lookup_records(mnb_exchange_rate, args), args.format, sys.stdout)
+        return None
+    for currency, amount in args.currency:
+        amount = args.amount if amount is None else amount
+        if amount:
+            print(mnb_exchange_rate.get_exchange_of_amount(currency, amount, args.date))
+        else:
+            print(mnb_exchange_rate.get_str_of_rate_for_currency(currency, args.date))
+    return None
 
 
 if __name__ == '__main__':  # pragma: no cover
@@ -0,0 +1,55 @@
+import json
+from urllib.error import HTTPError
+from urllib.error import URLError
+from urllib.parse import quote
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+
+TIMEOUT = 5
+
+
+class MNBExchangeRateClient:
+
+    def __init__(self, url, timeout=TIMEOUT):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _get(self, path, params, output_format):
+        params = {key: value for key, value in params.items() if value is not None}
+        params['format'] = output_format
+        try:
+            with urlopen(f'{self.url}{path}?{urlencode(params)}', timeout=self.timeout) as response:
+                return response.read().decode()
+        except HTTPError as exc:
+            return exc.read().decode()
+        except (URLError, OSError) as exc:
+            message = f'Server not available: {self.url} ({getattr(exc, "reason", exc)})'
+            raise Exception(message) from exc  # pylint: disable=W0719
+
+    def _get_text(self, path, params):
+        try:
+            return self._get(path, params, 'text')
+        except Exception as exc:  # pylint: disable=W0703
+            return str(exc)
+
+    def _get_json(self, path, params):
+        try:
+            data = json.loads(self._get(path, params, 'json'))
+        except ValueError as exc:
+            raise Exception(f'Invalid response from server: {self.url}') from exc  # pylint: disable=W0719
+        if 'error' in data:
+            raise Exception(data['error'])  # pylint: disable=W0719
+        return data
+
+    def get_rate_for_currency(self, currency, date=None):
+        return self._get_json(f'/rate/{quote(currency.upper())}', {'date': date})
+
+    def exchange(self, currency, amount, date=None):
+        return self._get_json('/convert', {'currency': currency.upper(), 'amount': amount, 'date': date})
+
+    def get_str_of_rate_for_currency(self, currency, date=None):
+        return self._get_text(f'/rate/{quote(currency.upper())}', {'date': date})
+
+    def get_exchange_of_amount(self, currency, amount, date=None):
+        return self._get_text('/convert', {'currency': currency.upper(), 'amount': amount, 'date': date})
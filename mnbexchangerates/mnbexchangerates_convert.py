@@ -0,0 +1,102 @@
+import csv
+import json
+
+
+CSV = 'csv'
+JSONL = 'jsonl'
+FORMATS = (CSV, JSONL)
+
+
+def guess_format(path, default=CSV):
+    if path and path.lower().endswith(('.jsonl', '.json', '.ndjson')):
+        return JSONL
+    return default
+
+
+def parse_amount(amount):
+    if isinstance(amount, (int, float)):
+        return float(amount)
+    return float(str(amount).strip().replace(',', '.'))
+
+
+DEFAULT_FIELDS = {
+    'currency': 'currency',
+    'amount': 'amount',
+    'date': None,
+    'value': 'huf',
+    'rate_date': 'rate_date',
+}
+
+
+class MNBExchangeRateConverter:
+
+    def __init__(self, mnb_exchange_rates, fields=None, currency=None, skip_errors=False, currencies=None):
+        self.log = mnb_exchange_rates.log
+        self.mnb = mnb_exchange_rates
+        self.fields = dict(DEFAULT_FIELDS, **(fields or {}))
+        self.currency = currency
+        self.skip_errors = skip_errors
+        # Optional MNBExchangeRateCurrencies, to reject unknown codes before looking up their rates
+        self.currencies = currencies
+        # (date, currency) -> (rate date, unit, rate) or the error message of the lookup
+        self._rates = {}
+
+    def _get_rate(self, currency, date):
+        key = (date, currency)
+        rate = self._rates.get(key)
+        if rate is None:
+            try:
+                rate_dict = self.mnb.get_rate_for_currency(currency, date)
+                rate = (rate_dict['date'], rate_dict['unit'], rate_dict['rate'])
+            except Exception as exc:  # pylint: disable=W0703
+                rate = str(exc)
+            self._rates[key] = rate
+            self.log.debug('Rate resolved for %s: %s', key, rate)
+        if isinstance(rate, str):
+            raise Exception(rate)  # pylint: disable=W0719
+        return rate
+
+    def convert_record(self, record):
+        currency = (self.currency or record[self.fields['currency']]).strip().upper()
+        date = (record.get(self.fields['date']) or None) if self.fields['date'] else None
+        if self.currencies is not None and not self.currencies.is_known(currency):
+            raise Exception(f'Unknown currency: {currency}')  # pylint: disable=W0719
+        rate_date, unit, rate = self._get_rate(currency, date)
+        record[self.fields['value']] = round(parse_amount(record[self.fields['amount']]) * rate / unit, 2)
+        record[self.fields['rate_date']] = rate_date
+        return record
+
+    def convert_records(self, records):
+        for line, record in enumerate(records, 1):
+            try:
+                yield self.convert_record(record)
+            except Exception as exc:  # pylint: disable=W0703
+                if not self.skip_errors:
+                    raise Exception(f'Record {line}: {exc}') from exc  # pylint: disable=W0719
+                self.log.debug('Record %s skipped: %s', line, exc)
+                record[self.fields['value']] = None
+                record[self.fields['rate_date']] = None
+                yield record
+
+    @classmethod
+    def read_records(cls, stream, input_format=CSV):
+        if input_format == JSONL:
+            return (json.loads(line) for line in stream if line.strip())
+        return csv.DictReader(stream)
+
+    def convert_stream(self, input_stream, output_stream, input_format=CSV, output_format=None):
+        output_format = output_format or input_format
+        records = self.read_records(input_stream, input_format)
+        if output_format == JSONL:
+            for record in self.convert_records(records):
+                output_stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+            return
+        writer = None
+        for record in self.convert_records(records):
+            if writer is None:
+                fieldnames = list(record)
+                writer = csv.DictWriter(output_stream, fieldnames, extrasaction='ignore', lineterminator='\n')
+                writer.writeheader()
+            if record[self.fields['value']] is not None:
+                record[self.fields['value']] = f"{record[self.fields['value']]:.2f}"
+            writer.writerow(record)
@@ -0,0 +1,156 @@
+from datetime import datetime
+from datetime import timedelta
+import json
+import os
+import xml.etree.ElementTree as ET
+
+from mnbexchangerates import mnbexchangerates
+from mnbexchangerates import mnbexchangerates_cache
+from mnbexchangerates import mnbexchangerates_scheduler
+
+
+CURRENCIES_FILE = mnbexchangerates_cache.RATES_CACHE_DIR + '/currencies.json'
+# The list of currencies rarely changes, so it is refreshed weekly.
+MAX_AGE = 7 * 24 * 3600
+ERROR_INTERVAL = mnbexchangerates_scheduler.ERROR_INTERVAL
+CURRENCIES_BODY = mnbexchangerates.SOAP_BODY.format(operation='<ns0:GetCurrencies/>')
+INFO_BODY = mnbexchangerates.SOAP_BODY.format(operation='<ns0:GetInfo/>')
+UNITS_BODY = mnbexchangerates.SOAP_BODY.replace(
+    '{operation}', '<ns0:GetCurrencyUnits><ns0:currencyNames>{currencies}</ns0:currencyNames></ns0:GetCurrencyUnits>')
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def parse_result(content):
+    # The XML document that MNB sends escaped in the *Result element of the SOAP response.
+    try:
+        for element in ET.fromstring(content).iter():
+            if _local_name(element.tag).endswith('Result'):
+                return ET.fromstring(element.text or '')
+    except ET.ParseError as exc:
+        raise Exception(f'Malformed content received from server ({exc})') from exc  # pylint: disable=W0719
+    raise Exception('Malformed content received from server')  # pylint: disable=W0719
+
+
+def parse_currencies(content):
+    return [element.text.strip() for element in parse_result(content).iter()
+            if _local_name(element.tag) == 'Curr' and element.text]
+
+
+def parse_units(content):
+    return {element.get('curr'): int(element.text) for element in parse_result(content).iter()
+            if _local_name(element.tag) == 'Unit' and element.get('curr') and element.text}
+
+
+def parse_info(content):
+    info = {'first_date': None, 'last_date': None}
+    for element in parse_result(content).iter():
+        if _local_name(element.tag) == 'FirstDate':
+            info['first_date'] = element.text
+        elif _local_name(element.tag) == 'LastDate':
+            info['last_date'] = element.text
+    return info
+
+
+class MNBExchangeRateCurrencies:
+    # MNB's currency list (GetCurrencies), their units (GetCurrencyUnits) and the date range of the
+    # stored rates (GetInfo), kept in a JSON file and refreshed after max_age seconds. Currency codes
+    # are checked against an in-memory set, so unknown codes are rejected without any rate lookup.
+
+    def __init__(self, mnb_exchange_rates, max_age=MAX_AGE, path=None):
+        self.mnb = mnb_exchange_rates
+        self.log = mnb_exchange_rates.log
+        self.config = {'max_age': max_age, 'path': path}
+        self.metadata = None
+        self.known = frozenset()
+        self.expires = None
+
+    def _path(self):
+        return os.path.expanduser(self.config['path'] or CURRENCIES_FILE)
+
+    def _read(self):
+        try:
+            with open(self._path(), 'r', encoding='utf-8') as metadata_file:
+                metadata = json.load(metadata_file)
+            datetime.fromisoformat(metadata['fetched'])
+            if not isinstance(metadata['currencies'], list) or not isinstance(metadata['units'], dict):
+                raise ValueError('Invalid currency list')
+        except (IOError, ValueError, KeyError, TypeError) as exc:
+            self.log.debug('Error when reading currency file (%s: %s)', type(exc).__name__, exc.args)
+            return None
+        return metadata
+
+    def _post(self, body):
+        response = self.mnb.transport.post(body)
+        if response.status_code != 200:
+            raise Exception(f'Server response: {response.status_code}')  # pylint: disable=W0719
+        return response.content
+
+    def fetch(self):
+        currencies = parse_currencies(self._post(CURRENCIES_BODY))
+        if not currencies:
+            raise Exception('Malformed content received from server')  # pylint: disable=W0719
+        metadata = {'fetched': datetime.now().isoformat(timespec='seconds'),
+                    'currencies': currencies,
+                    'units': parse_units(self._post(UNITS_BODY.format(currencies=','.join(currencies))))}
+        metadata.update(parse_info(self._post(INFO_BODY)))
+        self.log.debug('Fetched %s currencies', len(currencies))
+        try:
+            mnbexchangerates_cache.write_atomically(
+                self._path(), lambda metadata_file: metadata_file.write(json.dumps(metadata).encode()))
+        except IOError as exc:
+            self.log.debug('Error while writing currency file (%s)', str(exc))
+        return metadata
+
+    def _use(self, metadata):
+        self.metadata = metadata
+        self.known = frozenset(metadata['currencies'])
+        if self.mnb.cache.cache_only:
+            self.expires = datetime.max
+        else:
+            self.expires = datetime.fromisoformat(metadata['fetched']) + timedelta(seconds=self.config['max_age'])
+
+    def load(self, refresh=False):
+        if not refresh and self.metadata is not None and datetime.now() < self.expires:
+            return self
+        metadata = None if refresh else self._read()
+        if metadata is not None:
+            self._use(metadata)
+        if metadata is None or datetime.now() >= self.expires:
+            try:
+                metadata = self.fetch()
+            except Exception as exc:  # pylint: disable=W0703
+                if metadata is None:
+                    raise
+                # An outdated list is still better than none. The refresh is retried after ERROR_INTERVAL,
+                # not on every lookup.
+                self.log.debug('Refreshing currencies failed, using the stored list (%s)', str(exc))
+                self._use(metadata)
+                self.expires = max(self.expires, datetime.now() + timedelta(seconds=ERROR_INTERVAL))
+                return self
+            self._use(metadata)
+        return self
+
+    def is_known(self, currency):
+        return currency.strip().upper() in self.load().known
+
+    def unknown(self, currencies):
+        # The unknown codes among the given ones, each once, in order of appearance.
+        known = self.load().known
+        return list(dict.fromkeys(code for code in (currency.strip().upper() for currency in currencies)
+                                  if code not in known))
+
+    def unit(self, currency):
+        return self.load().metadata['units'].get(currency.strip().upper())
+
+    def validate_records(self, records, field='currency'):
+        # {unknown code: [record numbers]} of the records (dicts) whose currency field is unknown or missing.
+        known = self.load().known
+        unknown = {}
+        for line, record in enumerate(records, 1):
+            code = str(record.get(field) or '').strip().upper()
+            if code not in known:
+                unknown.setdefault(code, []).append(line)
+        return unknown
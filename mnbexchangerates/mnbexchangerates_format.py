@@ -0,0 +1,108 @@
+TEXT = 'text'
+JSON = 'json'
+CSV = 'csv'
+TSV = 'tsv'
+FORMATS = (TEXT, JSON, CSV, TSV)
+# Columns of the csv and tsv output; rate lookups leave amount and value empty,
+# failed lookups fill only currency and error.
+FIELDS = ('date', 'currency', 'unit', 'rate', 'amount', 'value', 'error')
+# From here on the shortest representation of floats is in exponent notation; they have no fraction anyway.
+LARGE_FLOAT = 1e16
+
+
+def _number(value):
+    # Amounts may come as strings, with a decimal point or a decimal comma. Anything but an int
+    # becomes a float, whose shortest representation has no trailing zeros besides '.0'.
+    if isinstance(value, int):
+        return value
+    return float(value.replace(',', '.') if isinstance(value, str) else value)
+
+
+class MNBExchangeRateNumberFormatter:
+    # Numbers with grouped digits and a chosen decimal separator, e.g. 1'234'567,5.
+    # Every number of a batch is formatted by format() with a ',' grouping spec, then the joined
+    # text is converted to the separators by one translate, instead of slicing each number.
+
+    def __init__(self, decimal_separator=',', group_separator="'", decimals=None, strip_zeros=True):
+        # decimals=None keeps the shortest representation of floats (393.95, not 393.950000).
+        self.config = {'spec': ',' if decimals is None else f',.{decimals}f',
+                       'plain_spec': '' if decimals is None else f'.{decimals}f',
+                       'large_spec': ',.0f' if decimals is None else f',.{decimals}f',
+                       'fixed': decimals is not None,
+                       'strip_zeros': strip_zeros}
+        self.separators = (decimal_separator, group_separator)
+        self.translation = str.maketrans({',': group_separator, '.': decimal_separator})
+
+    def _strip(self, text):
+        # The trailing zeros of the fraction, and the point if nothing else is left, are dropped.
+        if not self.config['strip_zeros']:
+            return text
+        if not self.config['fixed']:
+            return text[:-2] if text.endswith('.0') else text
+        return text.rstrip('0').rstrip('.') if '.' in text else text
+
+    def _spec(self, number):
+        if -1000 < number < 1000:
+            return self.config['plain_spec']
+        if isinstance(number, float) and not -LARGE_FLOAT < number < LARGE_FLOAT:
+            return self.config['large_spec']
+        return self.config['spec']
+
+    def _large(self, text):
+        number = float(text.replace(',', ''))
+        return format(number, self._spec(number))
+
+    def format_many(self, numbers):
+        spec = self.config['spec']
+        texts = [format(_number(number), spec) for number in numbers]
+        if not texts:
+            return []
+        if not self.config['fixed'] and 'e' in ''.join(texts):
+            texts = [self._large(text) if 'e' in text else text for text in texts]
+        if not self.config['strip_zeros']:
+            text = '\n'.join(texts)
+        elif self.config['fixed']:
+            text = '\n'.join([self._strip(text) for text in texts])
+        else:
+            text = ('\n'.join(texts) + '\n').replace('.0\n', '\n')[:-1]
+        return text.translate(self.translation).split('\n')
+
+    def format(self, number):
+        # A single number skips the fixed cost of translate(). Numbers below 1000 need no grouping,
+        # and amounts given as text are not converted to float and back.
+        if isinstance(number, str) and not self.config['fixed']:
+            text = number.replace(',', '.')
+            if self.config['strip_zeros'] and '.' in text:
+                text = text.rstrip('0').rstrip('.')
+            integer, point, fraction = text.partition('.')
+            if len(integer) > 3 and integer.lstrip('-').isdigit():
+                integer = format(int(integer), ',')
+        else:
+            if not isinstance(number, float):
+                number = _number(number)
+            integer, point, fraction = self._strip(format(number, self._spec(number))).partition('.')
+        integer = integer.replace(',', self.separators[1])
+        return integer + self.separators[0] + fraction if point else integer
+
+
+NUMBER_FORMATTER = MNBExchangeRateNumberFormatter()
+# Totals in forint, rounded to the fillér.
+TOTAL_FORMATTER = MNBExchangeRateNumberFormatter(decimals=2)
+
+
+def write_records(records, output_format, stream, fields=FIELDS):
+    # Rate and exchange records (see MNBExchangeRates.get_rate_for_currency and exchange) with
+    # numeric fields, as JSON Lines or as csv/tsv with a header row.
+    if output_format == JSON:
+        import json  # pylint: disable=C0415
+        for record in records:
+            stream.write(json.dumps(record, separators=(',', ':')) + '\n')
+    elif output_format in (CSV, TSV):
+        import csv  # pylint: disable=C0415
+        writer = csv.DictWriter(stream, fields, extrasaction='ignore', lineterminator='\n',
+                                delimiter='\t' if output_format == TSV else ',')
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+    else:
+        raise Exception(f'Unsupported output format: {output_format}')  # pylint: disable=W0719
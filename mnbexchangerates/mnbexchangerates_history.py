@@ -0,0 +1,315 @@
+import bisect
+import json
+import os
+
+from mnbexchangerates import mnbexchangerates_binary
+from mnbexchangerates import mnbexchangerates_cache
+from mnbexchangerates import mnbexchangerates_logger
+from mnbexchangerates import mnbexchangerates_table
+
+
+RATES_HISTORY_FILE = mnbexchangerates_cache.RATES_CACHE_DIR + '/exchange_rates_history.bin'
+# Days added since the last compaction are appended to the journal, one JSON line per add_many().
+JOURNAL_SUFFIX = '.journal'
+# Serialises appends and compactions between processes and threads.
+LOCK_SUFFIX = '.lock'
+# The journal is merged into the binary file once it is larger than this, so that it stays quick to
+# parse when the history is opened. Merging copies the rows of the binary file in blocks.
+JOURNAL_MAX_BYTES = 16 * 1024
+
+
+def _history_path():
+    return os.path.expanduser(RATES_HISTORY_FILE)
+
+
+def _journal_record(batches):
+    # {date: {currency: (unit, rate)}} and [[currency, start, end], ...] of the batches
+    days, covered = {}, []
+    for batch_days, start_date, end_date, currencies in batches:
+        for day in batch_days:
+            rates = days.setdefault(day['date'], {})
+            for unit, currency, rate in day['rates']:
+                rates[currency] = (unit, rate)
+        if start_date is not None and start_date <= end_date:
+            covered.extend([currency, start_date, end_date] for currency in currencies)
+    return days, covered
+
+
+class MNBExchangeRateHistory:
+
+    def __init__(self, debug=False):
+        self.log = mnbexchangerates_logger.MNBExchangeRatesLogger(debug).get_logger()
+        # The rates are read from the memory mapped history file on demand, the days of the journal
+        # are kept in memory: journal: {date: {currency: (unit, fixed-point rate)}}, journal_dates: sorted dates.
+        # covered: {currency: [[start, end], ...]}, the ranges that have been fetched for the currency.
+        # They make dates without publication (weekends, holidays) answerable locally.
+        self.file = None
+        self.journal = None
+        self.journal_dates = None
+        self.covered = None
+
+    def _open_history(self, path):
+        try:
+            return mnbexchangerates_binary.MNBExchangeRateHistoryFile(path)
+        except (IOError, ValueError) as exc:
+            self.log.debug('Error when reading history file. Starting with empty history. (%s: %s)',
+                           type(exc).__name__,
+                           exc.args)
+            return None
+
+    def _read_journal(self, path):
+        # A torn line (e.g. from a crash while appending) is skipped.
+        days, covered = {}, []
+        try:
+            with open(path + JOURNAL_SUFFIX, 'rb') as journal:
+                lines = journal.read().split(b'\n')
+        except IOError:
+            return days, covered
+        for line in lines:
+            try:
+                record = json.loads(line)
+                for date, rates in record['days'].items():
+                    days.setdefault(date, {}).update(
+                        {currency: (int(unit), mnbexchangerates_table.parse_fixed(rate))
+                         for currency, (unit, rate) in rates.items()})
+                covered.extend(record['covered'])
+            except (ValueError, KeyError, TypeError, ArithmeticError):
+                continue
+        return days, covered
+
+    def load(self):
+        if self.covered is None:
+            path = _history_path()
+            # The journal is read before the binary file: a compaction in between only moves its days
+            # into the binary file, so nothing is missed.
+            self.journal, covered = self._read_journal(path)
+            self.journal_dates = sorted(self.journal)
+            self.file = self._open_history(path)
+            self.covered = self.file.covered if self.file is not None else {}
+            for currency, start_date, end_date in covered:
+                self._mark_covered(currency, start_date, end_date)
+            self.log.debug('History loaded (%s days, %s in journal)',
+                           self.file.day_count if self.file is not None else 0, len(self.journal))
+        return self
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+        self.file = None
+        self.journal = None
+        self.journal_dates = None
+        self.covered = None
+
+    def _mark_covered(self, currency, start_date, end_date):
+        intervals = self.covered.setdefault(currency, [])
+        intervals.append([start_date, end_date])
+        intervals.sort()
+        merged = [intervals[0]]
+        for start, end in intervals[1:]:
+            if start <= mnbexchangerates_cache.next_date(merged[-1][1]):
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        self.covered[currency] = merged
+
+    def add(self, days, start_date=None, end_date=None, currencies=()):
+        self.add_many([(days, start_date, end_date, currencies)])
+
+    def add_many(self, batches):
+        # batches: [(days, start_date, end_date, currencies), ...], appended to the journal as one record.
+        # Each record only adds days and covered ranges, so concurrent writers never drop each other's.
+        days, covered = _journal_record(batches)
+        if not days and not covered:
+            return
+        path = _history_path()
+        self.close()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with mnbexchangerates_cache.exclusive_lock(path + LOCK_SUFFIX):
+                journal_size = self._append(path, json.dumps({'days': days, 'covered': covered},
+                                                             separators=(',', ':')))
+                self.log.debug('History journal appended. (%s days)', len(days))
+                if journal_size > JOURNAL_MAX_BYTES:
+                    self._compact(path)
+        except IOError as exc:
+            self.log.debug('Error while writing history (%s)', str(exc))
+        self.load()
+
+    @classmethod
+    def _append(cls, path, record):
+        with open(path + JOURNAL_SUFFIX, 'a+b') as journal:
+            size = journal.seek(0, os.SEEK_END)
+            # A torn last line is terminated, so that it does not swallow the new record.
+            torn = False
+            if size:
+                journal.seek(size - 1)
+                torn = journal.read(1) != b'\n'
+            journal.write((b'\n' if torn else b'') + record.encode() + b'\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+            return os.fstat(journal.fileno()).st_size
+
+    def compact(self):
+        # Merges the journal into the binary file now, e.g. after a backfill.
+        path = _history_path()
+        if not os.path.exists(path + JOURNAL_SUFFIX):
+            return
+        self.close()
+        try:
+            with mnbexchangerates_cache.exclusive_lock(path + LOCK_SUFFIX):
+                if os.path.getsize(path + JOURNAL_SUFFIX):
+                    self._compact(path)
+        except IOError as exc:
+            self.log.debug('Error while compacting history (%s)', str(exc))
+
+    def _compact(self, path):
+        # Called with the history lock held: the journal is merged into a new binary file, then emptied.
+        # A crash in between leaves the journal to be merged again, which changes nothing.
+        self.load()
+        self.log.debug('Compacting history file. (%s days in journal)', len(self.journal))
+        currencies = {currency for rates in self.journal.values() for currency in rates} | set(self.covered)
+        if self.file is not None and currencies <= set(self.file.currency_index):
+            mnbexchangerates_binary.MNBExchangeRateHistoryFile.merge(path, self.file, self.journal, self.covered)
+        else:
+            mnbexchangerates_binary.MNBExchangeRateHistoryFile.write(path, self.read_days(), self.covered)
+        self.close()
+        os.truncate(path + JOURNAL_SUFFIX, 0)
+        self.log.debug('History file stored.')
+
+    def read_days(self):
+        # Every stored day as {date: {currency: (unit, rate)}}, with the rates as strings.
+        self.load()
+        days = self.file.read_days() if self.file is not None else {}
+        for date, rates in self.journal.items():
+            days.setdefault(date, {}).update({currency: (str(unit), mnbexchangerates_table.fixed_to_str(fixed))
+                                              for currency, (unit, fixed) in rates.items()})
+        return days
+
+    def _covering_interval(self, date, currency):
+        intervals = self.covered.get(currency, [])
+        index = bisect.bisect_right(intervals, [date, '9999-12-31']) - 1
+        if index >= 0 and intervals[index][0] <= date <= intervals[index][1]:
+            return intervals[index]
+        return None
+
+    def currencies(self, date=None):
+        # The currencies fetched for the date, or for any date without one.
+        self.load()
+        return sorted(currency for currency in self.covered
+                      if date is None or self._covering_interval(date, currency) is not None)
+
+    def is_covered(self, date, currencies):
+        self.load()
+        return bool(currencies) and all(self._covering_interval(date, c) is not None for c in currencies)
+
+    def missing_ranges(self, start_date, end_date, currencies):
+        # The [start, end] ranges within start_date..end_date that are not covered for every currency.
+        self.load()
+        missing = []
+        for currency in currencies:
+            start = start_date
+            for covered_start, covered_end in self.covered.get(currency, []):
+                if covered_end < start:
+                    continue
+                if covered_start > end_date:
+                    break
+                if covered_start > start:
+                    missing.append([start, mnbexchangerates_cache.previous_date(covered_start)])
+                start = mnbexchangerates_cache.next_date(covered_end)
+            if start <= end_date:
+                missing.append([start, end_date])
+        missing.sort()
+        merged = missing[:1]
+        for start, end in missing[1:]:
+            if start <= mnbexchangerates_cache.next_date(merged[-1][1]):
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return merged
+
+    def _lookup_file(self, date, first_date, currency):
+        if self.file is None or currency not in self.file.currency_index:
+            return None
+        currency_index = self.file.currency_index[currency]
+        first = mnbexchangerates_binary.to_ordinal(first_date)
+        index = self.file.find(mnbexchangerates_binary.to_ordinal(date))
+        while index >= 0 and self.file.date_at(index) >= first:
+            cell = self.file.cell(index, currency_index)
+            if cell is not None:
+                return (mnbexchangerates_binary.from_ordinal(self.file.date_at(index)),) + cell
+            index -= 1
+        return None
+
+    def _lookup_journal(self, date, first_date, currency):
+        index = bisect.bisect_right(self.journal_dates, date) - 1
+        while index >= 0 and self.journal_dates[index] >= first_date:
+            cell = self.journal[self.journal_dates[index]].get(currency)
+            if cell is not None:
+                return (self.journal_dates[index],) + cell
+            index -= 1
+        return None
+
+    def lookup(self, date, currency):
+        # None means that the date has not been fetched yet for the currency.
+        self.load()
+        interval = self._covering_interval(date, currency)
+        if interval is None:
+            return None
+        found = [rate for rate in (self._lookup_journal(date, interval[0], currency),
+                                   self._lookup_file(date, interval[0], currency)) if rate is not None]
+        if not found:
+            return None
+        # The journal is newer than the binary file, so it wins for the same day (max() keeps the first).
+        rate_date, unit, fixed = max(found, key=lambda rate: rate[0])
+        return rate_date, str(unit), mnbexchangerates_table.fixed_to_str(fixed)
+
+    def lookup_rate(self, date, currency):
+        rate = self.lookup(date, currency)
+        if rate is None:
+            return None
+        return {'date': rate[0],
+                'unit': int(rate[1]),
+                'currency': currency,
+                'rate': mnbexchangerates_table.parse_rate(rate[2])}
+
+    def series(self, currency):
+        # Every stored day of the currency as sorted [(date ordinal, unit, fixed-point rate), ...]
+        self.load()
+        cells = {}
+        if self.file is not None and currency in self.file.currency_index:
+            currency_index = self.file.currency_index[currency]
+            for index in range(self.file.day_count):
+                cell = self.file.cell(index, currency_index)
+                if cell is not None:
+                    cells[self.file.date_at(index)] = cell
+        for date, rates in self.journal.items():
+            if currency in rates:
+                cells[mnbexchangerates_binary.to_ordinal(date)] = rates[currency]
+        return [(ordinal,) + cell for ordinal, cell in sorted(cells.items())]
+
+    def _day(self, date):
+        # The last stored day on or before the date with its {currency: (unit, fixed-point rate)}.
+        day, rates = None, {}
+        if self.file is not None:
+            index = self.file.find(mnbexchangerates_binary.to_ordinal(date))
+            if index >= 0:
+                day = mnbexchangerates_binary.from_ordinal(self.file.date_at(index))
+                rates = {currency: cell for currency_index, currency in enumerate(self.file.currencies)
+                         for cell in [self.file.cell(index, currency_index)] if cell is not None}
+        index = bisect.bisect_right(self.journal_dates, date) - 1
+        if index >= 0 and (day is None or self.journal_dates[index] >= day):
+            if self.journal_dates[index] != day:
+                day, rates = self.journal_dates[index], {}
+            rates.update(self.journal[day])
+        return day, rates
+
+    def get(self, date, currencies):
+        self.load()
+        if not self.is_covered(date, currencies):
+            return None
+        day, rates = self._day(date)
+        if day is None:
+            return None
+        return {'date': day,
+                'rates': [(str(unit), currency, mnbexchangerates_table.fixed_to_str(fixed))
+                          for currency, (unit, fixed) in sorted(rates.items())]}
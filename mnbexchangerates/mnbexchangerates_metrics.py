@@ -0,0 +1,125 @@
+import bisect
+import contextlib
+import threading
+import time
+
+
+PREFIX = 'mnbexchangerates_'
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+COUNTER = 'counter'
+HISTOGRAM = 'histogram'
+
+
+class MNBExchangeRateNullMetrics:
+    # Default metrics: every call is a no-op, so instrumentation costs one function call when disabled.
+
+    enabled = False
+    _timer = contextlib.nullcontext()
+
+    def increment(self, name, value=1):
+        pass
+
+    def observe(self, name, seconds):
+        pass
+
+    def timer(self, name):  # pylint: disable=W0613
+        return self._timer
+
+    @classmethod
+    def to_prometheus(cls):
+        return ''
+
+
+class MNBExchangeRateMetrics:
+    # Counters and latency histograms of fetch, parse and cache events.
+    # Sinks are called with (kind, name, value) for every event, kind being COUNTER or HISTOGRAM.
+
+    enabled = True
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counters = {}
+        # name -> {'buckets': [count per bucket, +Inf last], 'sum': seconds, 'count': observations}
+        self.histograms = {}
+        self.sinks = []
+        self._lock = threading.Lock()
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def remove_sink(self, sink):
+        self.sinks.remove(sink)
+
+    def _emit(self, kind, name, value):
+        for sink in self.sinks:
+            sink(kind, name, value)
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        self._emit(COUNTER, name, value)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = {'buckets': [0] * (len(self.buckets) + 1), 'sum': 0, 'count': 0}
+            histogram['buckets'][bisect.bisect_left(self.buckets, seconds)] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+        self._emit(HISTOGRAM, name, seconds)
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            return {'counters': dict(self.counters),
+                    'histograms': {name: {'buckets': list(histogram['buckets']),
+                                          'sum': histogram['sum'],
+                                          'count': histogram['count']}
+                                   for name, histogram in self.histograms.items()}}
+
+    def to_prometheus(self):
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot['counters'].items()):
+            lines += [f'# TYPE {PREFIX}{name} counter', f'{PREFIX}{name} {value}']
+        for name, histogram in sorted(snapshot['histograms'].items()):
+            lines.append(f'# TYPE {PREFIX}{name} histogram')
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), histogram['buckets']):
+                cumulative += count
+                lines.append(f'{PREFIX}{name}_bucket{{le="{bound}"}} {cumulative}')
+            lines += [f"{PREFIX}{name}_sum {histogram['sum']}", f"{PREFIX}{name}_count {histogram['count']}"]
+        return '\n'.join(lines) + '\n'
+
+
+NULL_METRICS = MNBExchangeRateNullMetrics()
+_metrics = NULL_METRICS
+
+
+def get_metrics():
+    return _metrics
+
+
+def enable(metrics=None):
+    # Like the logger, the metrics are shared by every client in the process.
+    global _metrics  # pylint: disable=W0603
+    if metrics is None:
+        metrics = _metrics if _metrics.enabled else MNBExchangeRateMetrics()
+    _metrics = metrics
+    return metrics
+
+
+def disable():
+    global _metrics  # pylint: disable=W0603
+    _metrics = NULL_METRICS
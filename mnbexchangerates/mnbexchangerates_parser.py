@@ -0,0 +1,116 @@
+import itertools
+from xml.parsers import expat
+import xml.etree.ElementTree as ET
+
+
+CHUNK_SIZE = 64 * 1024
+ParseError = ET.ParseError
+
+
+def _local_name(name):
+    return name.rsplit('}', 1)[-1].rsplit(' ', 1)[-1]
+
+
+def _chunks(content):
+    if isinstance(content, (bytes, bytearray, str)):
+        return (content[index:index + CHUNK_SIZE] for index in range(0, len(content), CHUNK_SIZE))
+    return content
+
+
+class MNBExchangeRateParser:
+    # The SOAP response carries the rates as an escaped XML document inside a *Result element.
+    # The envelope is parsed with expat, which unescapes the text of that element piece by piece;
+    # the pieces are fed into a pull parser that emits (date, unit, currency, rate) records and
+    # drops every Day element once it is processed.
+
+    def __init__(self):
+        self._outer = expat.ParserCreate(namespace_separator=' ')
+        self._outer.StartElementHandler = self._outer_start
+        self._outer.EndElementHandler = self._outer_end
+        self._outer.CharacterDataHandler = self._outer_data
+        self._inner = None
+        self._inner_stack = []
+        self._date = None
+        self._rate = None
+        self._records = []
+
+    def _start(self, name, attrib):
+        name = _local_name(name)
+        if name == 'Day':
+            self._date = attrib.get('date')
+        elif name == 'Rate':
+            self._rate = [attrib.get('unit'), attrib.get('curr'), '']
+
+    def _end(self, name, text=None):
+        name = _local_name(name)
+        if name == 'Rate' and self._rate is not None:
+            unit, currency, rate = self._rate
+            self._records.append((self._date, unit, currency, rate if text is None else text))
+            self._rate = None
+        elif name == 'Day':
+            self._date = None
+
+    def _outer_start(self, name, attrib):
+        if _local_name(name).endswith('Result'):
+            self._inner = ET.XMLPullParser(events=('start', 'end'))
+            self._inner_stack = []
+        else:
+            # The rates are sent as real elements, not as escaped text.
+            self._inner = None
+            self._start(name, attrib)
+
+    def _outer_end(self, name):
+        if _local_name(name).endswith('Result') and self._inner is not None:
+            self._inner.close()
+            self._read_inner_events()
+            self._inner = None
+        else:
+            self._end(name)
+
+    def _outer_data(self, data):
+        if self._inner is not None:
+            self._inner.feed(data)
+            self._read_inner_events()
+        elif self._rate is not None:
+            self._rate[2] += data
+
+    def _read_inner_events(self):
+        for event, element in self._inner.read_events():
+            if event == 'start':
+                self._inner_stack.append(element)
+                self._start(element.tag, element.attrib)
+                continue
+            self._inner_stack.pop()
+            self._end(element.tag, element.text or '')
+            if _local_name(element.tag) == 'Day' and self._inner_stack:
+                self._inner_stack[-1].remove(element)
+
+    def _take_records(self):
+        records, self._records = self._records, []
+        return records
+
+    def feed(self, data):
+        try:
+            self._outer.Parse(data, False)
+        except expat.ExpatError as exc:
+            raise ET.ParseError(str(exc)) from exc
+        return self._take_records()
+
+    def close(self):
+        try:
+            self._outer.Parse(b'', True)
+        except expat.ExpatError as exc:
+            raise ET.ParseError(str(exc)) from exc
+        return self._take_records()
+
+
+def iter_rates(content):
+    parser = MNBExchangeRateParser()
+    for chunk in _chunks(content):
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+def iter_days(content):
+    for date, records in itertools.groupby(iter_rates(content), key=lambda record: record[0]):
+        yield {'date': date, 'rates': [(unit, currency, rate) for _, unit, currency, rate in records]}
@@ -0,0 +1,92 @@
+from datetime import datetime
+import threading
+
+from mnbexchangerates import mnbexchangerates_metrics
+
+
+RETRY_INTERVAL = 60
+MAX_RETRY_INTERVAL = 900
+ERROR_INTERVAL = 60
+# Longest sleep, so that clock changes and suspends are noticed
+MAX_WAIT = 3600
+
+
+class MNBExchangeRatePrefetchScheduler:
+    # Fetches new rates in the background as soon as MNB publishes them, so that callers of a long-lived
+    # MNBExchangeRates find them in memory. It sleeps until the expiry of the current rates (the refresh
+    # hour of the next publication day in the holiday calendar), then fetches until a new date appears,
+    # backing off between attempts. Meanwhile the cached rates are kept up-to-date for the callers.
+
+    def __init__(self, mnb_exchange_rates, on_update=None, lock=None, **config):
+        self.mnb = mnb_exchange_rates
+        self.on_update = on_update
+        # Serialises the calls to the client when it is used by other threads too.
+        self.lock = lock or threading.Lock()
+        self.config = {'retry_interval': RETRY_INTERVAL,
+                       'max_retry_interval': MAX_RETRY_INTERVAL,
+                       'error_interval': ERROR_INTERVAL}
+        self.config.update(config)
+        self.state = {'table': None, 'retries': 0}
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def _retry_delay(self):
+        delay = min(self.config['max_retry_interval'], self.config['retry_interval'] * 2 ** self.state['retries'])
+        self.state['retries'] += 1
+        return delay
+
+    def _fetch(self, table):
+        with self.lock:
+            rates = self.mnb.fetch_rates(table.date)
+            if rates['date'] == table.date:
+                delay = self._retry_delay()
+                self.mnb.log.debug('Rates after %s are not published yet, retrying in %s s.', table.date, delay)
+                # The callers keep using the current rates instead of fetching themselves.
+                with self.mnb.cache.refresh_lock():
+                    self.mnb.cache.postpone(table.date, delay)
+                return 0
+            table = self.mnb.use_rates(rates)
+        self.mnb.log.debug('Prefetched rates of %s.', table.date)
+        mnbexchangerates_metrics.get_metrics().increment('prefetches_total')
+        self.state = {'table': table, 'retries': 0}
+        if self.on_update is not None:
+            self.on_update(table)
+        return 0
+
+    def run_once(self):
+        # One step of the schedule; returns the number of seconds to wait before the next one.
+        if self.mnb.cache.cache_only:
+            # Only the cached rates may be used, so nothing is fetched.
+            return MAX_WAIT
+        table = self.state['table']
+        if table is None:
+            with self.lock:
+                table = self.state['table'] = self.mnb.get_table()
+        # The expiry is postponed while the new rates are not published yet.
+        expiry = self.mnb.cache.expiry(table.date)
+        wait = (expiry - datetime.now()).total_seconds()
+        if wait > 0:
+            self.mnb.log.debug('Next prefetch at %s.', expiry)
+            return min(wait, MAX_WAIT)
+        return self._fetch(table)
+
+    def _run(self):
+        wait = 0
+        while not self.stopped.wait(wait):
+            try:
+                wait = self.run_once()
+            except Exception as exc:  # pylint: disable=W0703
+                self.mnb.log.debug('Prefetch failed: %s', str(exc))
+                wait = self.config['error_interval']
+
+    def start(self):
+        thread = threading.Thread(target=self._run, name='mnb-prefetch', daemon=True)
+        thread.start()
+        self.thread = thread
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
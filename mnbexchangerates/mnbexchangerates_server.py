@@ -0,0 +1,141 @@
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+import json
+import threading
+from urllib.parse import parse_qs
+from urllib.parse import urlsplit
+
+from mnbexchangerates import mnbexchangerates
+from mnbexchangerates import mnbexchangerates_metrics
+from mnbexchangerates import mnbexchangerates_scheduler
+from mnbexchangerates import mnbexchangerates_table
+
+
+HOST = '127.0.0.1'
+PORT = 8642
+JSON = 'application/json'
+TEXT = 'text/plain; charset=utf-8'
+
+
+def _json(data):
+    return json.dumps(data, separators=(',', ':')).encode()
+
+
+class MNBExchangeRateRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'mnbexchangerates'
+
+    def do_GET(self):  # pylint: disable=C0103
+        url = urlsplit(self.path)
+        status, body, content_type = self.server.rates_server.handle(
+            url.path, {key: values[-1] for key, values in parse_qs(url.query).items()})
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=W0622
+        self.server.rates_server.log.debug('%s - %s', self.address_string(), format % args)
+
+
+class MNBExchangeRateServer:
+
+    def __init__(self, mnb_exchange_rates, host=HOST, port=PORT, **scheduler_config):
+        self.mnb = mnb_exchange_rates
+        self.log = mnb_exchange_rates.log
+        # MNBExchangeRates is not shared between threads; the lock serialises every call to it.
+        self.lock = threading.Lock()
+        # {'table': rate table, 'responses': {(path, format): body}} of the current rates and of past dates
+        self.current = None
+        self.rendered = mnbexchangerates_table.MNBExchangeRateTableCache()
+        # New rates are prefetched when they are published and rendered before they are asked for.
+        self.scheduler = mnbexchangerates_scheduler.MNBExchangeRatePrefetchScheduler(
+            mnb_exchange_rates, on_update=self._update, lock=self.lock, **scheduler_config)
+        self.httpd = ThreadingHTTPServer((host, port), MNBExchangeRateRequestHandler)
+        self.httpd.rates_server = self
+
+    def _render(self, table):
+        rates = {currency: {'unit': unit, 'rate': rate} for currency, (unit, rate) in table.index.items()}
+        responses = {('/rates', 'json'): _json({'date': table.date, 'rates': rates})}
+        for currency in table.index:
+            rate_dict = table.rate_dict(currency)
+            responses[(f'/rate/{currency}', 'json')] = _json(rate_dict)
+            responses[(f'/rate/{currency}', 'text')] = self.mnb.format_rate(rate_dict).encode()
+        return {'table': table, 'responses': responses}
+
+    def _update(self, table):
+        self.log.debug('Rendering responses for %s', table.date)
+        self.current = self._render(table)
+
+    def refresh(self):
+        with self.lock:
+            table = self.mnb.get_table()
+            if self.current is None or self.current['table'] is not table:
+                self._update(table)
+        return self.current
+
+    def _get_rendered(self, date):
+        if date is None or not mnbexchangerates.is_past(date):
+            return self.current or self.refresh()
+        rendered = self.rendered.get(date)
+        if rendered is None:
+            with self.lock:
+                # The days without publication are rendered once, with the rates of the day before.
+                table = self.mnb.get_table(date)
+                rendered = self.rendered.get(table.date) or self._render(table)
+                self.rendered.put(date, table.date, rendered)
+        return rendered
+
+    def _convert(self, table, params, output_format):
+        currency = params.get('currency', '').upper()
+        amount = params.get('amount', '').replace(',', '.')
+        rate_dict = table.rate_dict(currency)
+        if rate_dict is None:
+            raise KeyError(f'Currency not found: {currency}')
+        exchange = mnbexchangerates_table.exchange_record(rate_dict, amount)
+        if output_format == 'text':
+            return 200, self.mnb.format_exchange(exchange, amount).encode(), TEXT
+        return 200, _json(exchange), JSON
+
+    def handle(self, path, params):
+        output_format = params.get('format', 'json')
+        if path == '/metrics':
+            return 200, mnbexchangerates_metrics.get_metrics().to_prometheus().encode(), \
+                mnbexchangerates_metrics.PROMETHEUS_CONTENT_TYPE
+        try:
+            rendered = self._get_rendered(params.get('date'))
+            if path == '/convert':
+                return self._convert(rendered['table'], params, output_format)
+            if path.startswith('/rate/'):
+                currency = path[len('/rate/'):].upper()
+                path = f'/rate/{currency}'
+                if currency not in rendered['table']:
+                    raise KeyError(f'Currency not found: {currency}')
+            body = rendered['responses'].get((path, output_format))
+            if body is None:
+                raise KeyError(f'Not found: {path}')
+            return 200, body, TEXT if output_format == 'text' else JSON
+        except KeyError as exc:
+            return self._error(404, exc.args[0], output_format)
+        except Exception as exc:  # pylint: disable=W0703
+            return self._error(400 if isinstance(exc, ValueError) else 503, str(exc), output_format)
+
+    @classmethod
+    def _error(cls, status, message, output_format):
+        if output_format == 'text':
+            return status, message.encode(), TEXT
+        return status, _json({'error': message}), JSON
+
+    def serve_forever(self):
+        try:
+            self.refresh()
+        except Exception as exc:  # pylint: disable=W0703
+            self.log.debug('Initial refresh failed: %s', str(exc))
+        self.scheduler.start()
+        self.log.info('Serving MNB exchange rates on http://%s:%s', *self.httpd.server_address[:2])
+        self.httpd.serve_forever()
+
+    def shutdown(self):
+        self.scheduler.stop()
+        self.httpd.shutdown()
+        self.httpd.server_close()
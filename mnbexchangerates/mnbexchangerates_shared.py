@@ -0,0 +1,104 @@
+from datetime import datetime
+from datetime import timedelta
+import threading
+
+from mnbexchangerates import mnbexchangerates
+from mnbexchangerates import mnbexchangerates_scheduler
+from mnbexchangerates import mnbexchangerates_table
+
+
+class MNBExchangeRateSharedClient:
+    # One client for every thread of a process. Readers take the current rate table without locking:
+    # self.current holds (table, expiry) and is replaced in one assignment. Only the thread holding
+    # self.lock uses the wrapped MNBExchangeRates, which is not thread-safe; while it refreshes the
+    # rates, the other threads keep reading the old table. Rate tables are not changed once built.
+
+    def __init__(self, mnb_exchange_rates=None, **config):
+        self.mnb = mnb_exchange_rates or mnbexchangerates.MNBExchangeRates(**config)
+        self.lock = threading.Lock()
+        self.current = None
+        # Tables of past dates, added under the lock
+        self.tables = mnbexchangerates_table.MNBExchangeRateTableCache()
+        self.scheduler = None
+
+    def _expiry(self, table):
+        if self.mnb.cache.cache_only:
+            return datetime.max
+        return self.mnb.cache.expiry(table.date)
+
+    def _swap(self, table):
+        self.current = (table, self._expiry(table))
+        return table
+
+    def _update(self, table):
+        with self.lock:
+            self._swap(table)
+
+    def refresh(self, blocking=True):
+        # The up-to-date table, or None when another thread is refreshing and blocking is False.
+        if not self.lock.acquire(blocking):  # pylint: disable=R1732
+            return None
+        try:
+            current = self.current
+            if current is not None and datetime.now() < current[1]:
+                # Refreshed by another thread meanwhile
+                return current[0]
+            try:
+                return self._swap(self.mnb.get_table())
+            except Exception:
+                if current is not None:
+                    # The old rates are served for a while instead of every caller retrying.
+                    self.current = (current[0],
+                                    datetime.now() + timedelta(seconds=mnbexchangerates_scheduler.ERROR_INTERVAL))
+                raise
+        finally:
+            self.lock.release()
+
+    def _get_past_table(self, date):
+        table = self.tables.get(date)
+        if table is None:
+            with self.lock:
+                table = self.tables.get(date)
+                if table is None:
+                    table = self.mnb.get_table(date)
+                    self.tables.put(date, table.date, table)
+        return table
+
+    def get_table(self, date=None):
+        if mnbexchangerates.is_past(date):
+            return self._get_past_table(mnbexchangerates.date_str(date))
+        current = self.current
+        if current is not None and datetime.now() < current[1]:
+            return current[0]
+        # Only the first caller waits; the others use the old table while it is refreshed.
+        return self.refresh(blocking=current is None) or current[0]
+
+    def get_rate_for_currency(self, currency, date=None):
+        rate_dict = self.get_table(date).rate_dict(currency.upper())
+        if rate_dict is None:
+            raise Exception(f'Currency not found: {currency.upper()}')  # pylint: disable=W0719
+        return rate_dict
+
+    def exchange(self, currency, amount, date=None):
+        return mnbexchangerates_table.exchange_record(self.get_rate_for_currency(currency, date), amount)
+
+    def cross_rate(self, source, target, date=None):
+        return self.get_table(date).cross_rate(source.upper(), target.upper())
+
+    def convert(self, amount, source, target, date=None):
+        return float(amount) * self.cross_rate(source, target, date)
+
+    def convert_many(self, items, date=None):
+        return self.get_table(date).convert_many(items)
+
+    def start_prefetch(self, **scheduler_config):
+        # New rates are fetched in the background when they are published, so no caller waits for them.
+        if self.scheduler is None:
+            self.scheduler = mnbexchangerates_scheduler.MNBExchangeRatePrefetchScheduler(
+                self.mnb, on_update=self._update, lock=self.lock, **scheduler_config).start()
+        return self
+
+    def close(self):
+        if self.scheduler is not None:
+            self.scheduler.stop()
+            self.scheduler = None
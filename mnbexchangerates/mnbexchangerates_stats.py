@@ -0,0 +1,129 @@
+import bisect
+from itertools import accumulate
+import math
+
+from mnbexchangerates import mnbexchangerates
+from mnbexchangerates import mnbexchangerates_backfill
+from mnbexchangerates import mnbexchangerates_binary
+from mnbexchangerates import mnbexchangerates_table
+
+
+def sparse_table(values, pick):
+    # table[level][index] = pick of values[index:index + 2 ** level]
+    table = [list(values)]
+    width = 1
+    while width * 2 <= len(values):
+        previous = table[-1]
+        table.append([pick(previous[index], previous[index + width]) for index in range(len(previous) - width)])
+        width *= 2
+    return table
+
+
+def range_query(table, pick, first, last):
+    # pick of values[first:last] from two overlapping power of two ranges
+    level = (last - first).bit_length() - 1
+    return pick(table[level][first], table[level][last - (1 << level)])
+
+
+def _prefix_sums(values):
+    return [0.0] + list(accumulate(values))
+
+
+class MNBExchangeRateSeries:
+    # The stored rates of one currency with prefix sums (rates, daily log returns and their squares)
+    # and min/max sparse tables, so that the aggregates of any range are computed in O(1) after
+    # a binary search for the range. Rates are HUF prices of `unit` currency units (the unit of
+    # the latest day, older rates are rescaled if the unit changed).
+
+    def __init__(self, currency, series):
+        self.currency = currency
+        self.unit = series[-1][1] if series else 1
+        self.dates = [ordinal for ordinal, _, _ in series]
+        self.rates = [rate * self.unit / unit / mnbexchangerates_table.RATE_SCALE for _, unit, rate in series]
+        # returns[index] is the log return from day index to day index + 1
+        returns = [math.log(current / previous) for previous, current in zip(self.rates, self.rates[1:])]
+        self.prefix = {'rates': _prefix_sums(self.rates),
+                       'returns': _prefix_sums(returns),
+                       'squares': _prefix_sums(value * value for value in returns)}
+        self.tables = {'min': sparse_table(self.rates, min), 'max': sparse_table(self.rates, max)}
+
+    def span(self, start_date, end_date):
+        # Index range [first, last) of the days from start_date to end_date
+        return (bisect.bisect_left(self.dates, mnbexchangerates_binary.to_ordinal(start_date)),
+                bisect.bisect_right(self.dates, mnbexchangerates_binary.to_ordinal(end_date)))
+
+    def _sum(self, name, first, last):
+        return self.prefix[name][last] - self.prefix[name][first]
+
+    def volatility(self, first, last):
+        # Sample standard deviation of the daily log returns, None for less than 2 returns.
+        count = last - first - 1
+        if count < 2:
+            return None
+        total = self._sum('returns', first, last - 1)
+        variance = (self._sum('squares', first, last - 1) - total * total / count) / (count - 1)
+        return math.sqrt(max(variance, 0.0))
+
+    def aggregate(self, first, last):
+        if first >= last:
+            return None
+        return {'currency': self.currency,
+                'unit': self.unit,
+                'start': mnbexchangerates_binary.from_ordinal(self.dates[first]),
+                'end': mnbexchangerates_binary.from_ordinal(self.dates[last - 1]),
+                'days': last - first,
+                'first': self.rates[first],
+                'last': self.rates[last - 1],
+                'average': self._sum('rates', first, last) / (last - first),
+                'min': range_query(self.tables['min'], min, first, last),
+                'max': range_query(self.tables['max'], max, first, last),
+                'volatility': self.volatility(first, last)}
+
+    def rolling(self, first, last, window):
+        # Aggregates of the `window` days ending on each day of the range; days with fewer
+        # stored days before them are left out.
+        return [self.aggregate(index + 1 - window, index + 1) for index in range(max(first, window - 1), last)]
+
+
+class MNBExchangeRateStats:
+    # Range analytics over the rate history. Missing parts of a range are backfilled first
+    # (unless fetch=False); the series of a currency is built once per loaded history.
+
+    def __init__(self, mnb_exchange_rates, fetch=True):
+        self.mnb = mnb_exchange_rates
+        self.fetch = fetch
+        # currency -> (journal of the loaded history the series was built from, series)
+        self._series = {}
+
+    def series(self, currency):
+        history = self.mnb.history.load()
+        cached = self._series.get(currency)
+        if cached is None or cached[0] is not history.journal:
+            cached = self._series[currency] = (history.journal,
+                                               MNBExchangeRateSeries(currency, history.series(currency)))
+        return cached[1]
+
+    def _prepare(self, currency, start_date, end_date):
+        currency = currency.upper()
+        start_date = mnbexchangerates.date_str(start_date)
+        end_date = mnbexchangerates.date_str(end_date)
+        if self.fetch:
+            result = mnbexchangerates_backfill.MNBExchangeRateBackfill(self.mnb).run(start_date, end_date, [currency])
+            if result['failed']:
+                raise Exception(result['failed'][0][2])  # pylint: disable=W0719
+        series = self.series(currency)
+        first, last = series.span(start_date, end_date)
+        if first >= last:
+            message = f'No exchange rates found for {currency} ({start_date} - {end_date})'
+            raise Exception(message)  # pylint: disable=W0719
+        return series, first, last
+
+    def summary(self, currency, start_date, end_date):
+        series, first, last = self._prepare(currency, start_date, end_date)
+        return series.aggregate(first, last)
+
+    def rolling(self, currency, start_date, end_date, window):
+        if window < 1:
+            raise ValueError('The window must be at least 1 day')
+        series, first, last = self._prepare(currency, start_date, end_date)
+        return series.rolling(first, last, window)
@@ -0,0 +1,138 @@
+from collections import OrderedDict
+from decimal import Decimal
+
+
+RATE_DECIMALS = 6
+RATE_SCALE = 10 ** RATE_DECIMALS
+HUF = 'HUF'
+# Past dates whose tables are kept in memory
+TABLE_CACHE_SIZE = 64
+
+
+def parse_rate(rate):
+    return float(rate.replace(',', '.'))
+
+
+def parse_fixed(rate):
+    # Rate as an integer number of 1/RATE_SCALE HUF, e.g. '393,95' -> 393950000
+    return int((Decimal(rate.replace(',', '.')) * RATE_SCALE).to_integral_value())
+
+
+def fixed_to_str(fixed):
+    integer, fraction = divmod(abs(fixed), RATE_SCALE)
+    fraction = f'{fraction:0{RATE_DECIMALS}d}'.rstrip('0').ljust(2, '0')
+    return f"{'-' if fixed < 0 else ''}{integer},{fraction}"
+
+
+def exchange_record(rate_dict, amount):
+    amount = float(amount)
+    return dict(rate_dict, amount=amount, value=amount * rate_dict['rate'] / rate_dict['unit'])
+
+
+class MNBExchangeRateTable:
+
+    def __init__(self, date, rates):
+        self.date = date
+        self.rates = rates
+        self.index = {currency: (int(unit), parse_rate(rate)) for unit, currency, rate in rates}
+        self._fixed_index = None
+        self._cross_rates = None
+
+    @classmethod
+    def from_rates(cls, rates_dict):
+        return cls(rates_dict['date'], rates_dict['rates'])
+
+    def __contains__(self, currency):
+        return currency in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def fixed_index(self):
+        # {currency: (unit, fixed-point rate)}, parsed on first use from the published rate strings
+        if self._fixed_index is None:
+            self._fixed_index = {currency: (int(unit), parse_fixed(rate)) for unit, currency, rate in self.rates}
+        return self._fixed_index
+
+    def cross_rates(self):
+        # All currencies (HUF included) and the N x N matrix of their cross rates through HUF, built on
+        # first use: matrix[i][j] is the price of 1 currencies[i] in currencies[j], units normalised.
+        if self._cross_rates is None:
+            per_unit = {HUF: 1.0}
+            per_unit.update((currency, rate / unit) for currency, (unit, rate) in self.index.items())
+            currencies = sorted(per_unit)
+            self._cross_rates = {
+                'currencies': currencies,
+                'index': {currency: index for index, currency in enumerate(currencies)},
+                'matrix': [[per_unit[source] / per_unit[target] for target in currencies] for source in currencies]}
+        return self._cross_rates
+
+    def cross_rate(self, source, target):
+        cross_rates = self.cross_rates()
+        try:
+            return cross_rates['matrix'][cross_rates['index'][source]][cross_rates['index'][target]]
+        except KeyError as exc:
+            raise Exception(f'Currency not found: {exc.args[0]}') from exc  # pylint: disable=W0719
+
+    def get(self, currency):
+        return self.index.get(currency)
+
+    def exchange(self, currency, amount):
+        unit, rate = self.index[currency]
+        return float(amount) * rate / unit
+
+    def rate_dict(self, currency):
+        rate = self.index.get(currency)
+        if rate is None:
+            return None
+        return {'date': self.date,
+                'unit': rate[0],
+                'currency': currency,
+                'rate': rate[1]}
+
+    def convert_many(self, items):
+        records = []
+        for currency, amount in items:
+            currency = currency.upper()
+            rate_dict = self.rate_dict(currency)
+            if rate_dict is None:
+                raise Exception(f'Currency not found: {currency}')  # pylint: disable=W0719
+            records.append(exchange_record(rate_dict, amount))
+        return records
+
+
+class MNBExchangeRateTableCache:
+    # The tables (or what is rendered from them) of the most recently used past dates. Each is stored once
+    # under its rate date, which the days without publication share with the day before them; both the
+    # values and the dates asked for are bounded by maxsize. get() may run concurrently with put().
+
+    def __init__(self, maxsize=TABLE_CACHE_SIZE):
+        self.maxsize = maxsize
+        # date asked for -> rate date
+        self.dates = OrderedDict()
+        # rate date -> value
+        self.values = OrderedDict()
+
+    def get(self, date):
+        try:
+            rate_date = self.dates[date]
+            value = self.values[rate_date]
+            self.dates.move_to_end(date)
+            self.values.move_to_end(rate_date)
+        except KeyError:
+            return None
+        return value
+
+    def _add(self, entries, key, item):
+        entries[key] = item
+        entries.move_to_end(key)
+        while len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+    def put(self, date, rate_date, value):
+        self._add(self.values, rate_date, value)
+        self._add(self.dates, rate_date, rate_date)
+        self._add(self.dates, date, rate_date)
+
+    def __len__(self):
+        return len(self.values)
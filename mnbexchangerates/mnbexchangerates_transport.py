@@ -0,0 +1,98 @@
+from collections import deque
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from mnbexchangerates import mnbexchangerates_logger
+from mnbexchangerates import mnbexchangerates_metrics
+
+
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10
+RETRIES = 3
+BACKOFF = 0.5
+MAX_BACKOFF = 8
+POOL_SIZE = 4
+ATTEMPT_HISTORY = 100
+
+
+class MNBExchangeRateTransport:
+
+    def __init__(self, url, headers, debug=False, **config):
+        self.log = mnbexchangerates_logger.MNBExchangeRatesLogger(debug).get_logger()
+        self.url = url
+        self.headers = headers
+        self.config = {'connect_timeout': CONNECT_TIMEOUT,
+                       'read_timeout': READ_TIMEOUT,
+                       'retries': RETRIES,
+                       'backoff': BACKOFF,
+                       'max_backoff': MAX_BACKOFF,
+                       'pool_size': POOL_SIZE}
+        self.config.update(config)
+        self.session = None
+        self.counters = {'requests': 0, 'attempts': 0}
+        # Latest attempts as {'attempt': n, 'status': status code or error name, 'latency': seconds}
+        self.attempts = deque(maxlen=ATTEMPT_HISTORY)
+
+    def _get_session(self):
+        if self.session is None:
+            self.session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.config['pool_size'])
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
+            self.session.headers.update(self.headers)
+        return self.session
+
+    def _record_attempt(self, attempt, status, start):
+        latency = time.perf_counter() - start
+        mnbexchangerates_metrics.get_metrics().observe('soap_request_seconds', latency)
+        self.counters['attempts'] += 1
+        self.attempts.append({'attempt': attempt, 'status': status, 'latency': latency})
+        self.log.debug('Attempt %s to %s: %s (%.3f s)', attempt, self.url, status, latency)
+
+    def _backoff(self, attempt):
+        # Exponential backoff with jitter, so that retrying clients do not hit the server in sync.
+        delay = min(self.config['max_backoff'], self.config['backoff'] * 2 ** attempt)
+        time.sleep(random.uniform(delay / 2, delay))
+
+    def post(self, body, stream=False):
+        self.counters['requests'] += 1
+        metrics = mnbexchangerates_metrics.get_metrics()
+        metrics.increment('soap_requests_total')
+        session = self._get_session()
+        timeout = (self.config['connect_timeout'], self.config['read_timeout'])
+        for attempt in range(self.config['retries'] + 1):
+            start = time.perf_counter()
+            last_attempt = attempt == self.config['retries']
+            try:
+                response = session.post(self.url, data=body, timeout=timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                self._record_attempt(attempt, type(exc).__name__, start)
+                if last_attempt:
+                    metrics.increment('soap_request_errors_total')
+                    raise
+            else:
+                self._record_attempt(attempt, response.status_code, start)
+                if response.status_code < 500:
+                    return response
+                if last_attempt:
+                    metrics.increment('soap_request_errors_total')
+                    return response
+                response.close()
+            metrics.increment('soap_retries_total')
+            self._backoff(attempt)
+        return None  # pragma: no cover
+
+    def stats(self):
+        latencies = [attempt['latency'] for attempt in self.attempts]
+        return {'requests': self.counters['requests'],
+                'attempts': self.counters['attempts'],
+                'last_latency': latencies[-1] if latencies else None,
+                'max_latency': max(latencies) if latencies else None}
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
@@ -0,0 +1,168 @@
+from decimal import Decimal
+from decimal import ROUND_CEILING
+from decimal import ROUND_DOWN
+from decimal import ROUND_FLOOR
+from decimal import ROUND_HALF_DOWN
+from decimal import ROUND_HALF_EVEN
+from decimal import ROUND_HALF_UP
+from decimal import ROUND_UP
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from mnbexchangerates import mnbexchangerates_table
+
+
+ROUNDING_MODES = (ROUND_HALF_EVEN, ROUND_HALF_UP, ROUND_HALF_DOWN, ROUND_DOWN, ROUND_UP, ROUND_FLOOR, ROUND_CEILING)
+# Amounts are split into SPLIT_SCALE sized parts so that no intermediate product overflows int64.
+SPLIT_DECIMALS = 6
+SPLIT_SCALE = 10 ** SPLIT_DECIMALS
+# Bound of the intermediate products, checked in float64 with a margin for its rounding.
+PRODUCT_LIMIT = 2.0 ** 62
+
+
+def to_fixed(amounts, decimals, scaled=False):
+    # Amounts as int64 numbers of 10^-decimals units. Numbers are amounts of the currency: integers
+    # are scaled exactly, floats are rounded to the nearest unit, anything else (str, Decimal) is
+    # converted exactly. With scaled=True the amounts are integers already in 10^-decimals units.
+    amounts = np.asarray(amounts)
+    if amounts.dtype.kind in 'iu':
+        amounts = amounts.astype(np.int64)
+        if scaled:
+            return amounts
+        if np.any(np.abs(amounts) > np.iinfo(np.int64).max // 10 ** decimals):
+            raise ValueError('Amounts are too large for exact conversion')
+        return amounts * 10 ** decimals
+    if scaled:
+        raise ValueError('Scaled amounts must be integers')
+    if amounts.dtype.kind == 'f':
+        if np.any(np.abs(amounts) * 10 ** decimals >= PRODUCT_LIMIT):
+            raise ValueError('Amounts are too large for exact conversion')
+        return np.rint(amounts * 10 ** decimals).astype(np.int64)
+    scale = Decimal(10) ** decimals
+    try:
+        fixed = np.fromiter((int((Decimal(str(amount).replace(',', '.')) * scale).to_integral_value(ROUND_HALF_EVEN))
+                             for amount in amounts.ravel()), dtype=np.int64, count=amounts.size)
+    except OverflowError as exc:
+        raise ValueError('Amounts are too large for exact conversion') from exc
+    return fixed.reshape(amounts.shape)
+
+
+def factorize(codes):
+    # Distinct codes and the index of every code among them. Codes of up to 3 characters (currency
+    # codes) are packed into one int64 each (21 bits per code point), which sorts much faster than strings.
+    codes = np.asarray(codes, dtype=str)
+    if codes.dtype.itemsize > 12 or codes.size == 0:
+        unique, inverse = np.unique(codes, return_inverse=True)
+        return unique, inverse.reshape(codes.shape)
+    code_points = np.ascontiguousarray(codes.astype('<U3')).view(np.uint32).reshape(codes.shape + (3,))
+    packed = (code_points[..., 0].astype(np.int64) << 42) | (code_points[..., 1].astype(np.int64) << 21) | \
+        code_points[..., 2]
+    packed, inverse = np.unique(packed, return_inverse=True)
+    first = np.zeros(len(packed), dtype=np.intp)
+    first[inverse.ravel()] = np.arange(codes.size)
+    return codes.ravel()[first], inverse.reshape(codes.shape)
+
+
+def _round(quotient, remainder, divisor, rounding):
+    # quotient is floor(value), 0 <= remainder / divisor < 1 is the dropped fraction.
+    negative = quotient < 0
+    if rounding in (ROUND_FLOOR, ROUND_CEILING, ROUND_DOWN, ROUND_UP):
+        if rounding == ROUND_FLOOR:
+            away_from_floor = False
+        elif rounding == ROUND_CEILING:
+            away_from_floor = True
+        else:
+            away_from_floor = negative if rounding == ROUND_DOWN else ~negative
+        return quotient + ((remainder > 0) & away_from_floor)
+    # Half-way cases: ties go up from the floor for HALF_UP on positive and HALF_DOWN on negative values,
+    # and for HALF_EVEN when the floor is odd.
+    if rounding == ROUND_HALF_UP:
+        tie_up = ~negative
+    elif rounding == ROUND_HALF_DOWN:
+        tie_up = negative
+    else:
+        tie_up = quotient % 2 == 1
+    twice = remainder * 2
+    return quotient + ((twice > divisor) | ((twice == divisor) & tie_up))
+
+
+def multiply_divide(amounts, rates, divisors, rounding=ROUND_HALF_EVEN):
+    # round(amounts * rates / divisors) on int64 arrays. With a = ah * S + al and r = rh * S + rl
+    # (S = SPLIT_SCALE, 0 <= al, rl < S):
+    #   a * r = (a * rh + ah * rl) * S + al * rl
+    # a * rh + ah * rl is at most |a| * (rh + 1), the remainders are below divisors * S and the result
+    # is about a * r / divisors. These must fit in int64, otherwise ValueError is raised. For rates below
+    # 10^4 HUF (r < 10^10) this allows |a| up to about 4.6 * 10^14, i.e. 4.6 * 10^12 units at 2 decimals.
+    amount_high, amount_low = np.divmod(amounts, SPLIT_SCALE)
+    rate_high, rate_low = np.divmod(rates, SPLIT_SCALE)
+    magnitude = np.abs(amounts.astype(np.float64))
+    if np.any(magnitude * np.maximum(np.abs(rate_high) + 1, np.abs(rates) / divisors) >= PRODUCT_LIMIT) or \
+            np.any(np.abs(divisors) >= PRODUCT_LIMIT / SPLIT_SCALE):
+        raise ValueError('Amounts are too large for exact conversion')
+    quotient, remainder = np.divmod(amounts * rate_high + amount_high * rate_low, divisors)
+    low_quotient, remainder = np.divmod(remainder * SPLIT_SCALE + amount_low * rate_low, divisors)
+    return _round(quotient * SPLIT_SCALE + low_quotient, remainder, divisors, rounding)
+
+
+class MNBExchangeRateVectorEngine:
+    # Converts arrays of amounts in one pass against the rates as int64 fixed-point numbers
+    # (1/RATE_SCALE HUF), so the results are exact: the HUF values are returned as int64 numbers
+    # of 10^-decimals HUF (fillér by default), rounded with the given decimal rounding mode.
+    # Amounts are in units of the currency; with amounts_scaled=True they are integers in
+    # 10^-amount_decimals units of the currency (cents by default).
+
+    def __init__(self, mnb_exchange_rates, amount_decimals=2, decimals=2, rounding=ROUND_HALF_EVEN):
+        if np is None:
+            raise Exception('NumPy is required for vectorized conversion')  # pylint: disable=W0719
+        if rounding not in ROUNDING_MODES:
+            raise ValueError(f'Unsupported rounding mode: {rounding}')
+        if decimals > amount_decimals + mnbexchangerates_table.RATE_DECIMALS:
+            raise ValueError(f'At most {amount_decimals + mnbexchangerates_table.RATE_DECIMALS} decimals are exact')
+        self.mnb = mnb_exchange_rates
+        self.config = {'amount_decimals': amount_decimals, 'decimals': decimals, 'rounding': rounding}
+
+    def rate_arrays(self, currencies, date=None):
+        # Units and fixed-point rates of the given currencies.
+        fixed_index = self.mnb.get_table(date).fixed_index()
+        currencies, inverse = factorize(currencies)
+        units = np.empty(len(currencies), dtype=np.int64)
+        rates = np.empty(len(currencies), dtype=np.int64)
+        for index, currency in enumerate(currencies):
+            rate = fixed_index.get(str(currency).upper())
+            if rate is None:
+                raise Exception(f'Currency not found: {str(currency).upper()}')  # pylint: disable=W0719
+            units[index], rates[index] = rate
+        return units[inverse], rates[inverse]
+
+    def _dated_rate_arrays(self, currencies, dates):
+        units = np.empty(len(currencies), dtype=np.int64)
+        rates = np.empty(len(currencies), dtype=np.int64)
+        unique_dates, date_index = np.unique(dates, return_inverse=True)
+        for index, date in enumerate(unique_dates):
+            selected = date_index == index
+            units[selected], rates[selected] = self.rate_arrays(currencies[selected], str(date) or None)
+        return units, rates
+
+    def convert(self, amounts, currencies, dates=None, amounts_scaled=False):
+        # dates: optional rate dates (ISO strings, '' for the current rates)
+        amount_decimals = self.config['amount_decimals']
+        amounts = to_fixed(amounts, amount_decimals, amounts_scaled)
+        currencies = np.asarray(currencies, dtype=str)
+        if amounts.shape != currencies.shape:
+            raise ValueError('Amounts and currencies must have the same shape')
+        if dates is None:
+            units, rates = self.rate_arrays(currencies)
+        else:
+            units, rates = self._dated_rate_arrays(currencies.ravel(), np.asarray(dates, dtype=str).ravel())
+            units, rates = units.reshape(currencies.shape), rates.reshape(currencies.shape)
+        scale = 10 ** (amount_decimals + mnbexchangerates_table.RATE_DECIMALS - self.config['decimals'])
+        return multiply_divide(amounts, rates, units * scale, self.config['rounding'])
+
+    def to_decimal(self, values):
+        # The int64 results as Decimal objects, for output.
+        decimals = self.config['decimals']
+        exponent = Decimal(1).scaleb(-decimals)
+        return [Decimal(int(value)).scaleb(-decimals).quantize(exponent) for value in np.asarray(values).ravel()]
@@ -6,6 +6,7 @@ setup(
     name='mnbexchangerates',
     version=0.3,
     install_requires=['requests'],
+    extras_require={'numpy': ['numpy']},
     entry_points={
         'console_scripts': [
             'mnb-exc-rate = mnbexchangerates.mnbexchangerates_cli:main',
@@ -2,6 +2,7 @@ import mock
 import unittest
 
 from mnbexchangerates import mnbexchangerates
+from mnbexchangerates import mnbexchangerates_metrics
 
 
 RESPONSE_VALID = b"""<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
@@ -19,12 +20,31 @@ RESPONSE_VALID = b"""<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelo
 </GetCurrentExchangeRatesResponse>
 </s:Body>
 </s:Envelope>"""
+RESPONSE_HISTORY_VALID = b"""<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
+<s:Body>
+<GetExchangeRatesResponse
+    xmlns="http://www.mnb.hu/webservices/"
+    xmlns:i="http://www.w3.org/2001/XMLSchema-instance">
+<GetExchangeRatesResult>
+&lt;MNBExchangeRates&gt;
+&lt;Day date="2024-03-14"&gt;
+&lt;Rate unit="1" curr="EUR"&gt;393,95&lt;/Rate&gt;
+&lt;/Day&gt;
+&lt;Day date="2024-03-13"&gt;
+&lt;Rate unit="1" curr="EUR"&gt;394,10&lt;/Rate&gt;
+&lt;/Day&gt;
+&lt;/MNBExchangeRates&gt;
+</GetExchangeRatesResult>
+</GetExchangeRatesResponse>
+</s:Body>
+</s:Envelope>"""
 RESPONSE_INVALID = b"""some invalid response"""
 RESPONSE_EMPTY_VALID = b"""<validxml><sometag>aaa</sometag></validxml>"""
 
 CACHE = {'date': '2018-01-03', 'rates': [('1', 'EUR', '600,000')], 'uptodate': True}
 CACHE_OLD = {'date': '2018-01-03', 'rates': [('1', 'EUR', '600,000')], 'uptodate': False}
 EMPTY_CACHE = None
+HISTORICAL_RATE = {'date': '2024-03-14', 'unit': 1, 'currency': 'EUR', 'rate': 393.95}
 
 RESULT_FROM_RESPONSE_VALID = 'MNB exchange rate of  1 EUR = 500 HUF  (2018-01-03)'
 RESULT_FROM_CACHE = 'MNB exchange rate of  1 EUR = 600 HUF  (2018-01-03)'
@@ -37,16 +57,24 @@ DEBUG_OFF = False
 class MNBExchangeRatesTest(unittest.TestCase):
 
     def setUp(self):
-        self.patch_requests = mock.patch('mnbexchangerates.mnbexchangerates.requests')
+        self.patch_requests = mock.patch('mnbexchangerates.mnbexchangerates_transport.requests')
         self.mock_requests = self.patch_requests.start()
+        self.mock_post = self.mock_requests.Session.return_value.post
+        self.patch_sleep = mock.patch('mnbexchangerates.mnbexchangerates_transport.time.sleep')
+        self.patch_sleep.start()
         self.patch_cache = mock.patch('mnbexchangerates.mnbexchangerates.mnbexchangerates_cache')
         self.mock_cache = self.patch_cache.start()
+        self.patch_history = mock.patch('mnbexchangerates.mnbexchangerates.mnbexchangerates_history')
+        self.mock_history = self.patch_history.start()
+        self.mock_history.MNBExchangeRateHistory.return_value.currencies.return_value = []
         self.mnb = mnbexchangerates.MNBExchangeRates(DEBUG_ON)
         self.mock_cache.MNBExchangeRateCache.return_value.load.return_value = EMPTY_CACHE
 
     def tearDown(self):
         self.patch_requests.stop()
+        self.patch_sleep.stop()
         self.patch_cache.stop()
+        self.patch_history.stop()
         self.mnb = None
 
     def _assert_result(self, currency='EUR', expected_result=RESULT_FROM_RESPONSE_VALID):
@@ -57,13 +85,30 @@ class MNBExchangeRatesTest(unittest.TestCase):
         mock_response = mock.MagicMock()
         mock_response.status_code = code
         mock_response.content = content
-        self.mock_requests.post.return_value = mock_response
+        mock_response.iter_content.return_value = [content[:100], content[100:]]
+        self.mock_post.return_value = mock_response
 
     def test_get_eur(self):
         self._set_request_post_return_value()
         self._assert_result(currency='EUR', expected_result=RESULT_FROM_RESPONSE_VALID)
         self.mock_cache.MNBExchangeRateCache.return_value.save.assert_called()
 
+    def test_metrics(self):
+        metrics = mnbexchangerates_metrics.enable(mnbexchangerates_metrics.MNBExchangeRateMetrics())
+        self.addCleanup(mnbexchangerates_metrics.disable)
+        self._set_request_post_return_value()
+        self._assert_result()
+        self._set_request_post_return_value(content=RESPONSE_HISTORY_VALID)
+        self.mnb.fetch_rate_history('2024-03-13', '2024-03-14', ['EUR'])
+        self._set_request_post_return_value(content=RESPONSE_INVALID)
+        self.mnb = mnbexchangerates.MNBExchangeRates(DEBUG_ON)
+        self._assert_result(expected_result='Malformed content received from server')
+        snapshot = metrics.snapshot()
+        self.assertEqual(len(RESPONSE_VALID) + len(RESPONSE_HISTORY_VALID) + len(RESPONSE_INVALID),
+                         snapshot['counters']['bytes_received_total'])
+        self.assertEqual(1, snapshot['counters']['parse_errors_total'])
+        self.assertEqual(3, snapshot['histograms']['parse_seconds']['count'])
+
     def test_without_debug(self):
         self.mnb = mnbexchangerates.MNBExchangeRates(DEBUG_OFF)
         self._set_request_post_return_value()
@@ -91,6 +136,8 @@ class MNBExchangeRatesTest(unittest.TestCase):
         self._set_request_post_return_value()
         self._assert_result(expected_result=RESULT_FROM_RESPONSE_VALID)
         self.mock_cache.MNBExchangeRateCache.return_value.save.assert_not_called()
+        self.mock_cache.MNBExchangeRateCache.return_value.postpone.assert_called_once_with(
+            '2018-01-03', mnbexchangerates.RECHECK_INTERVAL)
 
     def test_invalid_currency(self):
         self._set_request_post_return_value()
@@ -116,7 +163,166 @@ class MNBExchangeRatesTest(unittest.TestCase):
         result = self.mnb.get_exchange_of_amount('EUR', '2.0')
         self.assertEqual(RESULT_2_EUR_RESPONSE_VALID, result)
 
+    def test_large_total_is_not_in_exponent_notation(self):
+        exchange = {'date': '2024-03-14', 'currency': 'EUR', 'value': 39395000000000000.0}
+        self.assertEqual("MNB exchange rate of  100'000'000'000'000 EUR = 39'395'000'000'000'000 HUF  (2024-03-14)",
+                         mnbexchangerates.MNBExchangeRates.format_exchange(exchange, 1e14))
+
     def test_get_exchange_of_amount_with_error(self):
         self._set_request_post_return_value(code=404, content='dummy')
         result = self.mnb.get_exchange_of_amount('EUR', '2')
         self.assertEqual('Server response: 404', result)
+
+    def test_fetched_rates_are_not_added_to_history(self):
+        self._set_request_post_return_value()
+        self._assert_result()
+        self.mock_history.MNBExchangeRateHistory.return_value.add.assert_not_called()
+
+    def test_fetch_rate_history(self):
+        self._set_request_post_return_value(content=RESPONSE_HISTORY_VALID)
+        days = self.mnb.fetch_rate_history('2024-03-13', '2024-03-14', ['EUR'])
+        self.assertEqual([{'date': '2024-03-14', 'rates': [('1', 'EUR', '393,95')]},
+                          {'date': '2024-03-13', 'rates': [('1', 'EUR', '394,10')]}], days)
+        self.mock_history.MNBExchangeRateHistory.return_value.add.assert_called_with(
+            days, '2024-03-13', '2024-03-14', ['EUR'])
+        self.assertIn('<ns0:currencyNames>EUR</ns0:currencyNames>',
+                      self.mock_post.call_args[1]['data'])
+
+    def test_fetch_rate_history_without_storing(self):
+        self._set_request_post_return_value(content=RESPONSE_HISTORY_VALID)
+        days = self.mnb.fetch_rate_history('2024-03-13', '2024-03-14', ['EUR'], store=False)
+        self.assertEqual(2, len(days))
+        self.mock_history.MNBExchangeRateHistory.return_value.add.assert_not_called()
+
+    def test_fetch_rate_history_with_error(self):
+        self._set_request_post_return_value(code=500, content='dummy')
+        with self.assertRaises(Exception):
+            self.mnb.fetch_rate_history('2024-03-13', '2024-03-14', ['EUR'])
+        self.assertEqual(4, self.mock_post.call_count)
+
+    def test_historical_rate_from_history(self):
+        self.mock_history.MNBExchangeRateHistory.return_value.lookup_rate.return_value = HISTORICAL_RATE
+        result = self.mnb.get_str_of_rate_for_currency('EUR', '2024-03-16')
+        self.assertEqual('MNB exchange rate of  1 EUR = 393,95 HUF  (2024-03-14)', result)
+        self.mock_post.assert_not_called()
+
+    def test_historical_rate_fetched_when_missing(self):
+        self.mock_history.MNBExchangeRateHistory.return_value.lookup_rate.side_effect = [None, HISTORICAL_RATE]
+        self._set_request_post_return_value(content=RESPONSE_HISTORY_VALID)
+        result = self.mnb.get_exchange_of_amount('EUR', 2, '2024-03-14')
+        self.assertEqual('MNB exchange rate of  2 EUR = 787,9 HUF  (2024-03-14)', result)
+        self.mock_post.assert_called_once()
+
+    def test_historical_rate_not_found(self):
+        self.mock_history.MNBExchangeRateHistory.return_value.lookup_rate.return_value = None
+        self._set_request_post_return_value(content=RESPONSE_HISTORY_VALID)
+        result = self.mnb.get_str_of_rate_for_currency('BITCOIN', '2024-03-14')
+        self.assertEqual('Currency not found: BITCOIN (2024-03-14)', result)
+
+    def test_historical_rates(self):
+        self.mock_cache.MNBExchangeRateCache.return_value.load.return_value = CACHE
+        self.mock_history.MNBExchangeRateHistory.return_value.get.side_effect = [
+            None, {'date': '2024-03-14', 'rates': [('1', 'EUR', '393,95')]}]
+        self._set_request_post_return_value(content=RESPONSE_HISTORY_VALID)
+        rates = self.mnb.get_rates('2024-03-14')
+        self.assertEqual('2024-03-14', rates['date'])
+        self.mock_history.MNBExchangeRateHistory.return_value.get.assert_called_with('2024-03-14', ['EUR'])
+
+    def test_historical_rates_of_stored_currencies(self):
+        history = self.mock_history.MNBExchangeRateHistory.return_value
+        history.currencies.side_effect = lambda date=None: ['EUR', 'USD'] if date == '2024-03-14' else []
+        history.get.return_value = {'date': '2024-03-14', 'rates': [('1', 'EUR', '393,95')]}
+        self.assertEqual('2024-03-14', self.mnb.get_rates('2024-03-14')['date'])
+        history.get.assert_called_once_with('2024-03-14', ['EUR', 'USD'])
+        # Past dates are answered offline, without today's rates.
+        self.mock_cache.MNBExchangeRateCache.return_value.load.assert_not_called()
+        self.mock_post.assert_not_called()
+
+    def test_historical_rates_of_given_currencies(self):
+        history = self.mock_history.MNBExchangeRateHistory.return_value
+        history.get.return_value = {'date': '2024-03-14', 'rates': [('1', 'EUR', '393,95')]}
+        self.mnb.get_historical_rates('2024-03-14', ['EUR'])
+        history.get.assert_called_once_with('2024-03-14', ['EUR'])
+        history.currencies.assert_not_called()
+
+    def test_historical_rates_not_found(self):
+        self.mock_cache.MNBExchangeRateCache.return_value.load.return_value = CACHE
+        self.mock_history.MNBExchangeRateHistory.return_value.get.return_value = None
+        self._set_request_post_return_value(content=RESPONSE_HISTORY_VALID)
+        with self.assertRaises(Exception):
+            self.mnb.get_rates('2024-03-14')
+
+    def test_rate_table_is_reused(self):
+        self.mock_cache.MNBExchangeRateCache.return_value.load.return_value = CACHE
+        self.mock_cache.MNBExchangeRateCache.return_value.is_uptodate.return_value = True
+        self._assert_result(expected_result=RESULT_FROM_CACHE)
+        self.mnb.get_exchange_of_amount('EUR', 2)
+        self.mock_cache.MNBExchangeRateCache.return_value.load.assert_called_once()
+
+    def test_rate_table_is_reloaded_when_out_of_date(self):
+        self.mock_cache.MNBExchangeRateCache.return_value.load.return_value = CACHE
+        self.mock_cache.MNBExchangeRateCache.return_value.is_uptodate.return_value = False
+        self._assert_result(expected_result=RESULT_FROM_CACHE)
+        self._assert_result(expected_result=RESULT_FROM_CACHE)
+        self.assertEqual(2, self.mock_cache.MNBExchangeRateCache.return_value.load.call_count)
+
+    def test_rate_value_is_not_matched_as_currency(self):
+        self.mock_cache.MNBExchangeRateCache.return_value.load.return_value = CACHE
+        self._assert_result(currency='600,000', expected_result='Currency not found: 600,000')
+
+    def test_historical_rate_table(self):
+        self.mock_cache.MNBExchangeRateCache.return_value.load.return_value = CACHE
+        self.mock_history.MNBExchangeRateHistory.return_value.get.return_value = {
+            'date': '2024-03-14', 'rates': [('1', 'EUR', '393,95')]}
+        table = self.mnb.get_table('2024-03-16')
+        self.assertEqual((1, 393.95), table.get('EUR'))
+        self.assertIs(table, self.mnb.get_table('2024-03-16'))
+        self.mock_history.MNBExchangeRateHistory.return_value.get.assert_called_once()
+        # Sunday has the same rates, which are not parsed again.
+        self.assertIs(table, self.mnb.get_table('2024-03-17'))
+        self.assertEqual(1, len(self.mnb._tables))
+
+    def test_convert_many(self):
+        self.mock_cache.MNBExchangeRateCache.return_value.load.return_value = {
+            'date': '2018-01-03', 'rates': [('1', 'EUR', '600,000'), ('100', 'JPY', '250,00')], 'uptodate': True}
+        records = self.mnb.convert_many([('eur', 2), ('JPY', '1000'), ('EUR', 0.5)])
+        self.assertEqual([1200.0, 2500.0, 300.0], [record['value'] for record in records])
+        self.assertEqual(['EUR', 'JPY', 'EUR'], [record['currency'] for record in records])
+        self.assertEqual({'date': '2018-01-03', 'unit': 100, 'currency': 'JPY', 'rate': 250.0,
+                          'amount': 1000.0, 'value': 2500.0}, records[1])
+        self.mock_cache.MNBExchangeRateCache.return_value.load.assert_called_once()
+
+    def test_cross_rate_and_convert(self):
+        self.mock_cache.MNBExchangeRateCache.return_value.load.return_value = {
+            'date': '2018-01-03', 'rates': [('1', 'EUR', '600,000'), ('100', 'JPY', '250,00')], 'uptodate': True}
+        self.assertEqual(240.0, self.mnb.cross_rate('eur', 'jpy'))
+        self.assertAlmostEqual(2500 / 600, self.mnb.convert('1000', 'JPY', 'EUR'))
+        self.assertEqual(1200.0, self.mnb.convert(2, 'EUR', 'HUF'))
+        self.mock_cache.MNBExchangeRateCache.return_value.load.assert_called_once()
+
+    def test_convert_many_unknown_currency(self):
+        self.mock_cache.MNBExchangeRateCache.return_value.load.return_value = CACHE
+        with self.assertRaises(Exception):
+            self.mnb.convert_many([('EUR', 1), ('BITCOIN', 1)])
+
+    def test_exchange(self):
+        self.mock_cache.MNBExchangeRateCache.return_value.load.return_value = CACHE
+        self.assertEqual(1500.0, self.mnb.exchange('eur', '2.5')['value'])
+
+    def test_old_cache_served_while_another_process_refreshes(self):
+        self.mock_cache.MNBExchangeRateCache.return_value.load.return_value = CACHE_OLD
+        self.mock_cache.MNBExchangeRateCache.return_value.refresh_lock.return_value.__enter__.return_value = False
+        self._assert_result(expected_result=RESULT_FROM_CACHE)
+        self.mock_post.assert_not_called()
+
+    def test_cache_refreshed_by_another_process(self):
+        self.mock_cache.MNBExchangeRateCache.return_value.load.side_effect = [CACHE_OLD, CACHE]
+        self._assert_result(expected_result=RESULT_FROM_CACHE)
+        self.mock_post.assert_not_called()
+
+    def test_wait_for_refresh(self):
+        self.mnb = mnbexchangerates.MNBExchangeRates(DEBUG_ON, wait_for_refresh=True)
+        self.mock_cache.MNBExchangeRateCache.return_value.load.return_value = CACHE_OLD
+        self._set_request_post_return_value()
+        self._assert_result()
+        self.mock_cache.MNBExchangeRateCache.return_value.refresh_lock.assert_called_with(blocking=True)
@@ -0,0 +1,120 @@
+import asyncio
+import threading
+
+import mock
+import unittest
+
+from mnbexchangerates import mnbexchangerates_async
+
+from test.test_mnbexchangerates import RESPONSE_HISTORY_VALID
+from test.test_mnbexchangerates import RESPONSE_VALID
+
+
+class AsyncMNBExchangeRatesTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.requests = []
+        self.status = b'200 OK'
+        self.server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        port = self.server.sockets[0].getsockname()[1]
+        self.patch_url = mock.patch('mnbexchangerates.mnbexchangerates.URL',
+                                    f'http://127.0.0.1:{port}/arfolyamok.asmx?wsdl')
+        self.patch_url.start()
+        self.patch_cache = mock.patch('mnbexchangerates.mnbexchangerates.mnbexchangerates_cache')
+        self.mock_cache = self.patch_cache.start()
+        self.mock_cache.MNBExchangeRateCache.return_value.load.return_value = None
+        self.patch_history = mock.patch('mnbexchangerates.mnbexchangerates.mnbexchangerates_history')
+        self.mock_history = self.patch_history.start()
+        self.mock_history.MNBExchangeRateHistory.return_value.currencies.return_value = []
+        self.mnb = mnbexchangerates_async.AsyncMNBExchangeRates(debug=True)
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.patch_url.stop()
+        self.patch_cache.stop()
+        self.patch_history.stop()
+
+    async def _handle(self, reader, writer):
+        head = await reader.readuntil(b'\r\n\r\n')
+        length = int([line for line in head.split(b'\r\n') if line.lower().startswith(b'content-length')][0]
+                     .split(b':')[1])
+        body = await reader.readexactly(length)
+        self.requests.append(body)
+        await asyncio.sleep(0.05)
+        content = RESPONSE_HISTORY_VALID if b'GetExchangeRates>' in body else RESPONSE_VALID
+        writer.write(b'HTTP/1.1 ' + self.status + b'\r\nContent-Type: text/xml\r\n\r\n' + content)
+        await writer.drain()
+        writer.close()
+
+    async def test_get_str_of_rate_for_currency(self):
+        result = await self.mnb.get_str_of_rate_for_currency('eur')
+        self.assertEqual('MNB exchange rate of  1 EUR = 500 HUF  (2018-01-03)', result)
+        self.mock_cache.MNBExchangeRateCache.return_value.save.assert_called()
+
+    async def test_get_exchange_of_amount(self):
+        result = await self.mnb.get_exchange_of_amount('EUR', 2)
+        self.assertEqual('MNB exchange rate of  2 EUR = 1\'000 HUF  (2018-01-03)', result)
+
+    async def test_server_error(self):
+        self.status = b'503 Service Unavailable'
+        result = await self.mnb.get_str_of_rate_for_currency('EUR')
+        self.assertEqual('Server response: 503', result)
+
+    async def test_timeout(self):
+        self.mnb.timeout = 0.01
+        result = await self.mnb.get_str_of_rate_for_currency('EUR')
+        self.assertEqual('No response from server in 0.01 seconds', result)
+
+    async def test_disk_work_is_off_the_event_loop(self):
+        threads = []
+        cache = self.mock_cache.MNBExchangeRateCache.return_value
+        cache.load.side_effect = lambda: threads.append(threading.get_ident())
+        cache.save.side_effect = lambda rates: threads.append(threading.get_ident())
+        await self.mnb.get_rate_for_currency('EUR')
+        self.assertEqual(2, len(threads))
+        self.assertNotIn(threading.get_ident(), threads)
+
+    async def test_concurrent_callers_share_one_request(self):
+        results = await asyncio.gather(*(self.mnb.get_rate_for_currency('EUR') for _ in range(10)))
+        self.assertEqual(1, len(self.requests))
+        self.assertEqual([500.0] * 10, [result['rate'] for result in results])
+
+    async def test_convert_many(self):
+        records = await self.mnb.convert_many([('EUR', 2), ('eur', 3)])
+        self.assertEqual([1000.0, 1500.0], [record['value'] for record in records])
+
+    async def test_cross_rate_and_convert(self):
+        self.assertEqual(500.0, await self.mnb.cross_rate('eur', 'huf'))
+        self.assertEqual(0.01, await self.mnb.convert(5, 'HUF', 'EUR'))
+
+    async def test_fetch_rate_histories_concurrently(self):
+        days = await self.mnb.fetch_rate_histories([('2024-03-01', '2024-03-14'), ('2024-02-01', '2024-02-29')],
+                                                   ['EUR'])
+        self.assertEqual(2, len(self.requests))
+        self.assertEqual('2024-03-14', days[0][0]['date'])
+        self.assertEqual(2, self.mock_history.MNBExchangeRateHistory.return_value.add.call_count)
+
+    async def test_historical_rate(self):
+        history = self.mock_history.MNBExchangeRateHistory.return_value
+        history.lookup_rate.side_effect = [None, {'date': '2024-03-14', 'unit': 1, 'currency': 'EUR', 'rate': 393.95}]
+        result = await self.mnb.get_str_of_rate_for_currency('EUR', '2024-03-14')
+        self.assertEqual('MNB exchange rate of  1 EUR = 393,95 HUF  (2024-03-14)', result)
+        self.assertEqual(1, len(self.requests))
+
+    async def test_historical_rates(self):
+        self.mock_history.MNBExchangeRateHistory.return_value.get.side_effect = [
+            None, {'date': '2024-03-14', 'rates': [('1', 'EUR', '393,95')]}]
+        table = await self.mnb.get_table('2024-03-14')
+        self.assertEqual((1, 393.95), table.get('EUR'))
+        self.assertEqual(2, len(self.requests))
+
+    async def test_historical_rates_of_stored_currencies(self):
+        history = self.mock_history.MNBExchangeRateHistory.return_value
+        history.currencies.side_effect = [[], ['EUR', 'USD']]
+        history.get.side_effect = [None, {'date': '2024-03-14', 'rates': [('1', 'EUR', '393,95')]}]
+        table = await self.mnb.get_table('2024-03-14')
+        self.assertEqual((1, 393.95), table.get('EUR'))
+        # Only the history is fetched, not today's currencies.
+        self.assertEqual(1, len(self.requests))
+        history.get.assert_called_with('2024-03-14', ['EUR', 'USD'])
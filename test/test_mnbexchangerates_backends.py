@@ -0,0 +1,206 @@
+from datetime import datetime
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+
+import mock
+import unittest
+
+from mnbexchangerates import mnbexchangerates_backends as backends
+from mnbexchangerates import mnbexchangerates_cache
+
+
+RATES = [{'date': '2024-03-12', 'rates': [('1', 'EUR', '392,00'), ('100', 'JPY', '242,00')]},
+         {'date': '2024-03-14', 'rates': [('1', 'EUR', '393,95'), ('100', 'JPY', '243,50')]},
+         {'date': '2024-03-13', 'rates': [('1', 'EUR', '394,10')]}]
+
+
+def _save_from_other_process(path, rates):
+    backends.MNBExchangeRateSQLiteBackend(path).save(rates)
+
+
+class BackendTestMixin:
+
+    def test_empty(self):
+        self.assertIsNone(self.backend.load())
+        self.assertEqual([], self.backend.load_range('2024-01-01', '2024-12-31'))
+
+    def test_load_latest(self):
+        for rates in RATES:
+            self.backend.save(rates)
+        self.assertEqual(RATES[1], self.backend.load())
+
+    def test_load_range(self):
+        for rates in RATES:
+            self.backend.save(rates)
+        self.assertEqual([RATES[0], RATES[2]], self.backend.load_range('2024-03-01', '2024-03-13'))
+
+    def test_loaded_rates_are_copies(self):
+        self.backend.save(RATES[0])
+        self.backend.load()['uptodate'] = True
+        self.assertNotIn('uptodate', self.backend.load())
+
+    def test_cache(self):
+        cache = mnbexchangerates_cache.MNBExchangeRateCache(backend=self.backend)
+        self.assertIsNone(cache.load())
+        cache.save(RATES[1])
+        loaded = cache.load()
+        self.assertEqual('2024-03-14', loaded['date'])
+        self.assertIn('uptodate', loaded)
+        with cache.refresh_lock() as acquired:
+            self.assertTrue(acquired)
+
+    def test_postpone_is_shared(self):
+        with mock.patch('mnbexchangerates.mnbexchangerates_cache.datetime') as mock_datetime:
+            mock_datetime.now.return_value = datetime(2024, 3, 13, 11, 30)
+            mock_datetime.fromisoformat = datetime.fromisoformat
+            self.backend.save(RATES[0])
+            cache = mnbexchangerates_cache.MNBExchangeRateCache(backend=self.backend)
+            self.assertFalse(cache.load()['uptodate'])
+            cache.postpone('2024-03-12', 300)
+            other_cache = mnbexchangerates_cache.MNBExchangeRateCache(backend=self.backend)
+            self.assertTrue(other_cache.load()['uptodate'])
+            self.assertEqual(datetime(2024, 3, 13, 11, 35), other_cache.expiry('2024-03-12'))
+            mock_datetime.now.return_value = datetime(2024, 3, 13, 11, 35)
+            self.assertFalse(other_cache.load()['uptodate'])
+
+
+class MNBExchangeRateMemoryBackendTest(BackendTestMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.backend = backends.MNBExchangeRateMemoryBackend()
+
+
+class MNBExchangeRateSQLiteBackendTest(BackendTestMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'rates.sqlite')
+        self.backend = backends.MNBExchangeRateSQLiteBackend(self.path)
+
+    def tearDown(self):
+        self.backend.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_wal_mode(self):
+        self.backend.save(RATES[0])
+        self.assertEqual('wal', self.backend.connection.execute('PRAGMA journal_mode').fetchone()[0])
+        self.assertEqual(self.path + '.lock', self.backend.lock_path())
+
+    def test_shared_between_processes(self):
+        self.backend.save(RATES[0])
+        process = multiprocessing.Process(target=_save_from_other_process, args=(self.path, RATES[1]))
+        process.start()
+        process.join()
+        self.assertEqual(RATES[1], self.backend.load())
+
+    def test_save_error(self):
+        self.backend.save(RATES[0])
+        with mock.patch.object(self.backend, 'connection') as connection:
+            connection.execute.side_effect = sqlite3.OperationalError('database is locked')
+            with self.assertRaises(IOError):
+                self.backend.save(RATES[1])
+            self.assertIsNone(self.backend.load())
+
+    def test_lock_file_is_shared_between_users(self):
+        umask = os.umask(0o022)
+        try:
+            cache = mnbexchangerates_cache.MNBExchangeRateCache(backend=self.backend)
+            with cache.refresh_lock() as acquired:
+                self.assertTrue(acquired)
+        finally:
+            os.umask(umask)
+        self.assertEqual(0o644, os.stat(self.path + '.lock').st_mode & 0o777)
+        # Users who cannot write the lock file only need to read it.
+        os.chmod(self.path + '.lock', 0o444)
+        with cache.refresh_lock() as acquired:
+            self.assertTrue(acquired)
+
+    def _modes(self):
+        return [os.stat(self.path + suffix).st_mode & 0o777 for suffix in ('', '-wal', '-shm')]
+
+    def test_database_is_shared_between_users(self):
+        umask = os.umask(0o077)
+        try:
+            self.backend.save(RATES[0])
+            self.assertEqual([0o664] * 3, self._modes())
+            # The files of the next connection get the mode of the database.
+            self.backend.close()
+            other_backend = backends.MNBExchangeRateSQLiteBackend(self.path)
+            self.assertEqual(RATES[0], other_backend.load())
+            self.assertEqual([0o664] * 3, self._modes())
+            other_backend.close()
+        finally:
+            os.umask(umask)
+
+    def test_database_mode_is_not_narrowed(self):
+        self.backend.save(RATES[0])
+        self.backend.close()
+        os.chmod(self.path, 0o666)
+        self.backend.load()
+        self.assertEqual(0o666, os.stat(self.path).st_mode & 0o777)
+
+    def test_per_user_directory_is_not_created(self):
+        with mock.patch('mnbexchangerates.mnbexchangerates_cache.os.makedirs') as makedirs:
+            mnbexchangerates_cache.MNBExchangeRateCache(backend=self.backend)
+            mnbexchangerates_cache.MNBExchangeRateCache(backend=backends.MNBExchangeRateMemoryBackend())
+        makedirs.assert_not_called()
+
+    def test_unreadable_database(self):
+        self.backend.close()
+        with open(self.path, 'wb') as database:
+            database.write(b'invalid' * 1000)
+        self.assertIsNone(self.backend.load())
+
+
+class MNBExchangeRateFileBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.backend = mnbexchangerates_cache.MNBExchangeRateFileBackend(os.path.join(self.tmp_dir, 'rates.cache'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_load_range_of_latest_rates(self):
+        self.backend.save(RATES[1])
+        self.assertEqual(RATES[1], self.backend.load())
+        self.assertEqual([RATES[1]], self.backend.load_range('2024-03-14', '2024-03-14'))
+        self.assertEqual([], self.backend.load_range('2024-03-01', '2024-03-13'))
+        self.assertEqual(os.path.join(self.tmp_dir, 'rates.cache.lock'), self.backend.lock_path())
+
+    def test_threads_save_concurrently(self):
+        errors = []
+
+        def save_and_load(rates):
+            try:
+                for _ in range(50):
+                    self.backend.save(rates)
+                    self.assertIn(self.backend.load(), RATES)
+            except Exception as exc:  # pylint: disable=W0703
+                errors.append(exc)
+
+        threads = [threading.Thread(target=save_and_load, args=(rates,)) for rates in RATES]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], errors)
+        self.assertEqual(['rates.cache'], os.listdir(self.tmp_dir))
+
+
+class CreateBackendTest(unittest.TestCase):
+
+    def test_create_backend(self):
+        self.assertIsInstance(backends.create_backend('memory'), backends.MNBExchangeRateMemoryBackend)
+        self.assertEqual('/tmp/rates.sqlite', backends.create_backend('sqlite', '/tmp/rates.sqlite').path)
+        self.assertIsNone(backends.create_backend('file').path)
+        with self.assertRaises(ValueError):
+            backends.create_backend('redis')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+
+import mock
+import unittest
+
+from mnbexchangerates import mnbexchangerates_backfill as backfill
+from mnbexchangerates import mnbexchangerates_history
+
+
+def download(start_date, end_date, currencies, store=True):
+    return [{'date': date, 'rates': [('1', currency, '350,00') for currency in currencies]}
+            for date in (start_date, end_date)]
+
+
+class MNBExchangeRateBackfillTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.patch_file = mock.patch('mnbexchangerates.mnbexchangerates_history.RATES_HISTORY_FILE',
+                                     os.path.join(self.tmp_dir, 'history.cache'))
+        self.patch_file.start()
+        self.mnb = mock.MagicMock()
+        self.mnb.history = mnbexchangerates_history.MNBExchangeRateHistory()
+        self.mnb.get_table.return_value.index = {'EUR': (1, 390.0), 'USD': (1, 360.0)}
+        self.mnb.fetch_rate_history.side_effect = download
+        self.backfill = backfill.MNBExchangeRateBackfill(self.mnb, chunk_days=10, workers=3, checkpoint_chunks=2)
+
+    def tearDown(self):
+        self.patch_file.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_split_range(self):
+        self.assertEqual([('2020-01-01', '2020-01-10'), ('2020-01-11', '2020-01-20'), ('2020-01-21', '2020-01-25')],
+                         backfill.split_range('2020-01-01', '2020-01-25', 10))
+        self.assertEqual([('2020-01-01', '2020-01-01')], backfill.split_range('2020-01-01', '2020-01-01', 10))
+        self.assertEqual([], backfill.split_range('2020-01-02', '2020-01-01', 10))
+
+    def test_invalid_config(self):
+        with self.assertRaises(ValueError):
+            backfill.MNBExchangeRateBackfill(self.mnb, workers=0)
+
+    def test_run(self):
+        result = self.backfill.run('2020-01-01', '2020-01-25')
+        self.assertEqual({'chunks': 3, 'fetched': 3, 'days': 6, 'failed': []}, result)
+        self.assertEqual(3, self.mnb.fetch_rate_history.call_count)
+        self.mnb.fetch_rate_history.assert_any_call('2020-01-11', '2020-01-20', ['EUR', 'USD'], store=False)
+        self.assertEqual({'EUR': [['2020-01-01', '2020-01-25']], 'USD': [['2020-01-01', '2020-01-25']]},
+                         mnbexchangerates_history.MNBExchangeRateHistory().load().covered)
+        self.assertEqual(('2020-01-21', '1', '350,00'), self.mnb.history.lookup('2020-01-24', 'USD'))
+
+    def test_journal_stays_bounded(self):
+        journal = os.path.join(self.tmp_dir, 'history.cache.journal')
+        # Journal size after every checkpoint
+        sizes = []
+        checkpoint = self.backfill._checkpoint
+
+        def checkpoint_and_measure(completed):
+            checkpoint(completed)
+            sizes.append(os.path.getsize(journal) if os.path.exists(journal) else 0)
+
+        with mock.patch('mnbexchangerates.mnbexchangerates_history.JOURNAL_MAX_BYTES', 1024), \
+                mock.patch.object(self.backfill, '_checkpoint', checkpoint_and_measure):
+            result = self.backfill.run('2010-01-01', '2019-12-31', ['EUR', 'USD'])
+        self.assertEqual(366, result['fetched'])
+        self.assertTrue(sizes)
+        self.assertLess(max(sizes), 1024 + 512)
+        self.assertEqual(0, os.path.getsize(journal))
+        self.assertEqual(732, mnbexchangerates_history.MNBExchangeRateHistory().load().file.day_count)
+
+    def test_only_missing_dates_are_fetched(self):
+        self.mnb.history.add([], '2020-01-05', '2020-01-20', ['EUR', 'USD'])
+        result = self.backfill.run('2020-01-01', '2020-01-25', ['EUR'])
+        self.assertEqual(2, result['chunks'])
+        self.assertEqual(sorted([mock.call('2020-01-01', '2020-01-04', ['EUR'], store=False),
+                                 mock.call('2020-01-21', '2020-01-25', ['EUR'], store=False)]),
+                         sorted(self.mnb.fetch_rate_history.call_args_list))
+        self.mnb.get_table.assert_not_called()
+        self.mnb.fetch_rate_history.reset_mock()
+        self.assertEqual({'chunks': 0, 'fetched': 0, 'days': 0, 'failed': []},
+                         self.backfill.run('2020-01-01', '2020-01-25', ['EUR']))
+        self.mnb.fetch_rate_history.assert_not_called()
+
+    def test_failed_chunk_is_fetched_again(self):
+        self.mnb.fetch_rate_history.side_effect = \
+            lambda start, end, currencies, store: download(start, end, currencies) if start != '2020-01-11' else 1 / 0
+        result = self.backfill.run('2020-01-01', '2020-01-25', ['EUR'])
+        self.assertEqual(2, result['fetched'])
+        self.assertEqual([('2020-01-11', '2020-01-20', 'division by zero')], result['failed'])
+        self.mnb.fetch_rate_history.side_effect = download
+        self.mnb.fetch_rate_history.reset_mock()
+        self.assertEqual(1, self.backfill.run('2020-01-01', '2020-01-25', ['EUR'])['fetched'])
+        self.mnb.fetch_rate_history.assert_called_once_with('2020-01-11', '2020-01-20', ['EUR'], store=False)
+
+    def test_interrupted_run_keeps_finished_chunks(self):
+        def interrupt(start, end, currencies, store):
+            if start == '2020-01-11':
+                raise KeyboardInterrupt()
+            return download(start, end, currencies)
+        self.backfill.config['workers'] = 1
+        self.mnb.fetch_rate_history.side_effect = interrupt
+        with self.assertRaises(KeyboardInterrupt):
+            self.backfill.run('2020-01-01', '2020-01-25', ['EUR'])
+        self.assertEqual([['2020-01-11', '2020-01-25']],
+                         self.mnb.history.missing_ranges('2020-01-01', '2020-01-25', ['EUR']))
+
+    def test_today_is_not_fetched(self):
+        with mock.patch('mnbexchangerates.mnbexchangerates.last_complete_date', return_value='2020-01-15'):
+            self.assertEqual([('2020-01-01', '2020-01-10'), ('2020-01-11', '2020-01-15')],
+                             self.backfill.plan('2020-01-01', '2020-01-25', ['EUR']))
+
+
+if __name__ == '__main__':
+    unittest.main()
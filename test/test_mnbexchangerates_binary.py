@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+
+import unittest
+
+from mnbexchangerates import mnbexchangerates_binary as binary
+
+
+DAYS = {
+    '2024-03-14': {'EUR': ('1', '393,95'), 'JPY': ('100', '243,50')},
+    '2024-03-13': {'EUR': ('1', '394,10')},
+    '2000-01-03': {'EUR': ('1', '254,7500')},
+}
+COVERED = {'EUR': [['2000-01-01', '2000-01-31'], ['2024-03-01', '2024-03-17']], 'USD': [['2024-03-01', '2024-03-17']]}
+
+
+class MNBExchangeRateHistoryFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'history.bin')
+        binary.MNBExchangeRateHistoryFile.write(self.path, DAYS, COVERED)
+        self.history = binary.MNBExchangeRateHistoryFile(self.path)
+
+    def tearDown(self):
+        self.history.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_index(self):
+        self.assertEqual(['EUR', 'JPY', 'USD'], self.history.currencies)
+        self.assertEqual(COVERED, self.history.covered)
+        self.assertEqual(3, self.history.day_count)
+
+    def test_find(self):
+        self.assertEqual(-1, self.history.find(binary.to_ordinal('1999-12-31')))
+        self.assertEqual(0, self.history.find(binary.to_ordinal('2000-01-03')))
+        self.assertEqual(0, self.history.find(binary.to_ordinal('2024-03-12')))
+        self.assertEqual(1, self.history.find(binary.to_ordinal('2024-03-13')))
+        self.assertEqual(2, self.history.find(binary.to_ordinal('2030-01-01')))
+        self.assertEqual('2024-03-13', binary.from_ordinal(self.history.date_at(1)))
+
+    def test_cell(self):
+        self.assertEqual((100, 243500000), self.history.cell(2, self.history.currency_index['JPY']))
+        self.assertEqual((1, 254750000), self.history.cell(0, self.history.currency_index['EUR']))
+        self.assertIsNone(self.history.cell(1, self.history.currency_index['JPY']))
+
+    def test_read_days(self):
+        self.assertEqual({'2024-03-14': {'EUR': ('1', '393,95'), 'JPY': ('100', '243,50')},
+                          '2024-03-13': {'EUR': ('1', '394,10')},
+                          '2000-01-03': {'EUR': ('1', '254,75')}}, self.history.read_days())
+
+    def test_merge(self):
+        days = {'1999-12-31': {'USD': (1, 250000000)}, '2024-03-13': {'JPY': (100, 243000000)},
+                '2024-03-15': {'EUR': (1, 395000000)}}
+        binary.MNBExchangeRateHistoryFile.merge(self.path, self.history, days, {'EUR': [['2024-03-01', '2024-03-31']]})
+        merged = binary.MNBExchangeRateHistoryFile(self.path)
+        self.assertEqual({'1999-12-31': {'USD': ('1', '250,00')},
+                          '2000-01-03': {'EUR': ('1', '254,75')},
+                          '2024-03-13': {'EUR': ('1', '394,10'), 'JPY': ('100', '243,00')},
+                          '2024-03-14': {'EUR': ('1', '393,95'), 'JPY': ('100', '243,50')},
+                          '2024-03-15': {'EUR': ('1', '395,00')}}, merged.read_days())
+        self.assertEqual({'EUR': [['2024-03-01', '2024-03-31']]}, merged.covered)
+        self.assertEqual(['EUR', 'JPY', 'USD'], merged.currencies)
+        merged.close()
+
+    def test_empty_history(self):
+        binary.MNBExchangeRateHistoryFile.write(self.path, {}, {})
+        empty = binary.MNBExchangeRateHistoryFile(self.path)
+        self.assertEqual(-1, empty.find(binary.to_ordinal('2024-03-14')))
+        self.assertEqual({}, empty.read_days())
+        empty.close()
+
+    def test_truncated_file(self):
+        with open(self.path, 'rb') as history_file:
+            data = history_file.read()
+        for size in (10, len(data) - 1):
+            with open(self.path, 'wb') as history_file:
+                history_file.write(data[:size])
+            with self.assertRaises(ValueError):
+                binary.MNBExchangeRateHistoryFile(self.path)
+
+    def test_unsupported_file(self):
+        with open(self.path, 'wb') as history_file:
+            history_file.write(b'\x80\x04invalid pickle instead of history')
+        with self.assertRaises(ValueError):
+            binary.MNBExchangeRateHistoryFile(self.path)
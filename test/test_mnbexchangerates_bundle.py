@@ -0,0 +1,114 @@
+import gzip
+import os
+import shutil
+import tempfile
+
+import mock
+import unittest
+
+from mnbexchangerates import mnbexchangerates
+from mnbexchangerates import mnbexchangerates_bundle as bundle
+
+
+RATES = {'date': '2024-03-14', 'rates': [('1', 'EUR', '393,95'), ('100', 'JPY', '243,50')]}
+DAYS = [{'date': '2024-03-12', 'rates': [('1', 'EUR', '392,00')]},
+        {'date': '2024-03-13', 'rates': [('1', 'EUR', '394,10'), ('100', 'JPY', '242,00')]}]
+
+
+class MNBExchangeRateBundleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.bundle_path = os.path.join(self.tmp_dir, 'rates.bundle.gz')
+        self.patches = []
+        self._use_home('source')
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def _use_home(self, name):
+        # A separate cache and history file, like on another node.
+        for patch in self.patches:
+            patch.stop()
+        home = os.path.join(self.tmp_dir, name)
+        os.makedirs(home, exist_ok=True)
+        self.patches = [
+            mock.patch('mnbexchangerates.mnbexchangerates_cache.RATES_CACHE_FILE', os.path.join(home, 'cache')),
+            mock.patch('mnbexchangerates.mnbexchangerates_cache.LOCK_FILE', os.path.join(home, 'lock')),
+            mock.patch('mnbexchangerates.mnbexchangerates_history.RATES_HISTORY_FILE', os.path.join(home, 'history'))]
+        for patch in self.patches:
+            patch.start()
+        return mnbexchangerates.MNBExchangeRates(cache_only=True)
+
+    def _export(self):
+        mnb = mnbexchangerates.MNBExchangeRates(cache_only=True)
+        mnb.cache.save(RATES)
+        mnb.history.add(DAYS, '2024-03-11', '2024-03-13', ['EUR'])
+        return bundle.export_bundle(mnb, self.bundle_path)
+
+    def _rewrite(self, change):
+        with gzip.open(self.bundle_path, 'rb') as bundle_file:
+            lines = bundle_file.readlines()
+        with gzip.open(self.bundle_path, 'wb') as bundle_file:
+            bundle_file.writelines(change(lines))
+
+    def test_export_and_import(self):
+        self.assertEqual({'rates_date': '2024-03-14', 'days': 2}, self._export())
+        mnb = self._use_home('target')
+        self.assertIsNone(mnb.cache.load())
+        self.assertEqual({'rates_date': '2024-03-14', 'days': 2}, bundle.import_bundle(mnb, self.bundle_path))
+        self.assertEqual(RATES['rates'], mnb.cache.load()['rates'])
+        self.assertEqual({'EUR': [['2024-03-11', '2024-03-13']]}, mnb.history.covered)
+        self.assertEqual(('2024-03-13', '1', '394,10'), mnb.history.lookup('2024-03-13', 'EUR'))
+        self.assertEqual({'date': '2024-03-13', 'rates': [('1', 'EUR', '394,10'), ('100', 'JPY', '242,00')]},
+                         mnb.history.get('2024-03-13', ['EUR']))
+
+    def test_newer_cached_rates_are_kept(self):
+        self._export()
+        mnb = self._use_home('target')
+        mnb.cache.save({'date': '2024-03-15', 'rates': [('1', 'EUR', '395,00')]})
+        bundle.import_bundle(mnb, self.bundle_path)
+        self.assertEqual('2024-03-15', mnb.cache.load()['date'])
+
+    def test_load_bundle_into_memory(self):
+        self._export()
+        self._use_home('target')
+        mnb = bundle.load_bundle(self.bundle_path, cache_only=True)
+        self.assertEqual({'date': '2024-03-14', 'unit': 1, 'currency': 'EUR', 'rate': 393.95},
+                         mnb.get_rate_for_currency('EUR'))
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir, 'target', 'cache')))
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir, 'target', 'history')))
+
+    def test_checksum_mismatch(self):
+        self._export()
+        self._rewrite(lambda lines: [line.replace(b'394,10', b'494,10') for line in lines])
+        with self.assertRaisesRegex(Exception, 'Bundle checksum mismatch'):
+            bundle.read_bundle(self.bundle_path)
+
+    def test_truncated_bundle(self):
+        self._export()
+        self._rewrite(lambda lines: lines[:-1])
+        with self.assertRaisesRegex(Exception, 'Truncated bundle'):
+            bundle.read_bundle(self.bundle_path)
+
+    def test_unsupported_version(self):
+        self._export()
+        self._rewrite(lambda lines: [lines[0].replace(b'"version":1', b'"version":2')] + lines[1:])
+        with self.assertRaisesRegex(Exception, 'Unsupported bundle version: 2'):
+            bundle.read_bundle(self.bundle_path)
+
+    def test_not_a_bundle(self):
+        with gzip.open(self.bundle_path, 'wb') as bundle_file:
+            bundle_file.write(b'{"type": "checksum", "sha256": ""}\n')
+        with self.assertRaisesRegex(Exception, 'Not an exchange rate bundle'):
+            bundle.read_bundle(self.bundle_path)
+        with open(self.bundle_path, 'wb') as bundle_file:
+            bundle_file.write(b'\x80 not gzip')
+        with self.assertRaisesRegex(Exception, 'Invalid bundle'):
+            bundle.read_bundle(self.bundle_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
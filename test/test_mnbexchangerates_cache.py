@@ -1,9 +1,15 @@
 from datetime import datetime
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
 
 import mock
 import unittest
 
 from mnbexchangerates import mnbexchangerates_cache as cache
+from mnbexchangerates import mnbexchangerates_metrics
 
 
 CACHE_VALID = {'date': '2018-01-03', 'rates': [('1', 'EUR', '600,000')]}
@@ -113,12 +119,36 @@ class MNBExchangeRateCacheTest(unittest.TestCase):
         self.mock_pickle.load.return_value = 'invalid'
         self.assertEqual(CACHE_INVALID, self.cache.load())
 
+    def test_load_metrics(self):
+        metrics = mnbexchangerates_metrics.enable(mnbexchangerates_metrics.MNBExchangeRateMetrics())
+        self.addCleanup(mnbexchangerates_metrics.disable)
+        self.mock_pickle.load.return_value = CACHE_VALID.copy()
+        self.cache.load()
+        self.mock_pickle.load.return_value = CACHE_OLD.copy()
+        self.cache.load()
+        self.mock_pickle.load.side_effect = EOFError('dummy')
+        self.cache.load()
+        snapshot = metrics.snapshot()
+        self.assertEqual({'cache_hits_total': 1, 'cache_stale_total': 1, 'cache_misses_total': 1},
+                         snapshot['counters'])
+        self.assertEqual(3, snapshot['histograms']['cache_load_seconds']['count'])
+
     def test_write_cache(self):
         self.cache.save({})
 
     def test_write_cache_error(self):
+        metrics = mnbexchangerates_metrics.enable(mnbexchangerates_metrics.MNBExchangeRateMetrics())
+        self.addCleanup(mnbexchangerates_metrics.disable)
         self.mock_open.side_effect = IOError('dummy')
         self.cache.save({})
+        self.mock_os.replace.assert_not_called()
+        self.assertEqual({'cache_save_failures_total': 1}, metrics.snapshot()['counters'])
+
+    def test_write_cache_is_atomic(self):
+        self.cache.save({})
+        self.mock_os.replace.assert_called_once()
+        self.assertEqual(self.mock_open.call_args[0][0], self.mock_os.replace.call_args[0][0])
+        self.mock_os.fsync.assert_called_once()
 
     def test_ensure_cache_dir(self):
         self.mock_os.path.isdir.return_value = False
@@ -128,3 +158,104 @@ class MNBExchangeRateCacheTest(unittest.TestCase):
         self.mock_os.path.isdir.return_value = False
         self.mock_os.makedirs.side_effect = IOError('dummy')
         self.cache._ensure_cache_dir()
+
+    def test_is_uptodate(self):
+        self.assertTrue(self.cache.is_uptodate('2018-01-03'))
+        self.assertFalse(self.cache.is_uptodate('2017-12-01'))
+        self.mock_pickle.load.assert_not_called()
+
+    def test_cache_before_holiday(self):
+        # 2024-03-15 is a holiday, so the rates of 2024-03-14 are valid until Monday 11:00
+        self.mock_datetime.now.return_value = datetime(2024, 3, 15, 14, 0)
+        self.assertTrue(self.cache.is_uptodate('2024-03-14'))
+        self.mock_datetime.now.return_value = datetime(2024, 3, 18, 10, 59)
+        self.assertTrue(self.cache.is_uptodate('2024-03-14'))
+        self.mock_datetime.now.return_value = datetime(2024, 3, 18, 11, 0)
+        self.assertFalse(self.cache.is_uptodate('2024-03-14'))
+
+    def test_expiry_is_computed_once_per_date(self):
+        with mock.patch('mnbexchangerates.mnbexchangerates_calendar.expiry',
+                        return_value=datetime(2018, 1, 4, 11)) as mock_expiry:
+            for _ in range(3):
+                self.assertTrue(self.cache.is_uptodate('2018-01-03'))
+        mock_expiry.assert_called_once_with('2018-01-03', cache.REFRESH_HOUR)
+
+    def test_postpone(self):
+        self.mock_datetime.now.return_value = datetime(2018, 1, 4, 11, 30)
+        self.assertFalse(self.cache.is_uptodate('2018-01-03'))
+        self.cache.postpone('2018-01-03', 600)
+        self.assertEqual(datetime(2018, 1, 4, 11, 40), self.cache.expiry('2018-01-03'))
+        self.assertTrue(self.cache.is_uptodate('2018-01-03'))
+        self.mock_datetime.now.return_value = datetime(2018, 1, 4, 11, 40)
+        self.assertFalse(self.cache.is_uptodate('2018-01-03'))
+
+
+def _hold_lock(lock_file, acquired, release):
+    with mock.patch('mnbexchangerates.mnbexchangerates_cache.LOCK_FILE', lock_file):
+        with cache.MNBExchangeRateCache().refresh_lock():
+            acquired.set()
+            release.wait(10)
+
+
+class MNBExchangeRateCacheFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.patch_cache_file = mock.patch('mnbexchangerates.mnbexchangerates_cache.RATES_CACHE_FILE',
+                                           os.path.join(self.tmp_dir, 'exchange_rates.cache'))
+        self.patch_cache_file.start()
+        self.lock_file = os.path.join(self.tmp_dir, 'exchange_rates.lock')
+        self.patch_lock_file = mock.patch('mnbexchangerates.mnbexchangerates_cache.LOCK_FILE', self.lock_file)
+        self.patch_lock_file.start()
+        self.cache = cache.MNBExchangeRateCache(debug=True)
+
+    def tearDown(self):
+        self.patch_cache_file.stop()
+        self.patch_lock_file.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_save_and_read(self):
+        self.cache.save(CACHE_VALID)
+        self.assertEqual(CACHE_VALID, self.cache._read_cache())
+        self.assertEqual(['exchange_rates.cache'], os.listdir(self.tmp_dir))
+
+    def test_torn_cache_file(self):
+        with open(os.path.join(self.tmp_dir, 'exchange_rates.cache'), 'wb') as cache_file:
+            cache_file.write(pickle.dumps(CACHE_VALID)[:10])
+        self.assertIsNone(self.cache._read_cache())
+
+    def test_write_atomically_removes_temp_file_on_error(self):
+        def dump(_):
+            raise IOError('dummy')
+        with self.assertRaises(IOError):
+            cache.write_atomically(os.path.join(self.tmp_dir, 'file'), dump)
+        self.assertEqual([], os.listdir(self.tmp_dir))
+
+    def test_refresh_lock(self):
+        with self.cache.refresh_lock() as acquired:
+            self.assertTrue(acquired)
+        with self.cache.refresh_lock(blocking=False) as acquired:
+            self.assertTrue(acquired)
+
+    def test_refresh_lock_held_by_other_process(self):
+        acquired_event = multiprocessing.Event()
+        release = multiprocessing.Event()
+        process = multiprocessing.Process(target=_hold_lock, args=(self.lock_file, acquired_event, release))
+        process.start()
+        try:
+            self.assertTrue(acquired_event.wait(10))
+            with self.cache.refresh_lock(blocking=False) as acquired:
+                self.assertFalse(acquired)
+            with self.cache.refresh_lock(timeout=0.1) as acquired:
+                self.assertFalse(acquired)
+        finally:
+            release.set()
+            process.join()
+        with self.cache.refresh_lock(blocking=False) as acquired:
+            self.assertTrue(acquired)
+
+    def test_refresh_lock_without_lock_file(self):
+        shutil.rmtree(self.tmp_dir)
+        with self.cache.refresh_lock() as acquired:
+            self.assertTrue(acquired)
+        os.makedirs(self.tmp_dir)
@@ -0,0 +1,41 @@
+from datetime import date
+from datetime import datetime
+import unittest
+
+import mock
+
+from mnbexchangerates import mnbexchangerates_calendar as calendar
+
+
+class MNBExchangeRateCalendarTest(unittest.TestCase):
+
+    def test_easter(self):
+        self.assertEqual([date(2018, 4, 1), date(2019, 4, 21), date(2024, 3, 31), date(2025, 4, 20)],
+                         [calendar.easter(year) for year in (2018, 2019, 2024, 2025)])
+
+    def test_holidays(self):
+        holidays = calendar.holidays(2024)
+        for holiday in (date(2024, 3, 15), date(2024, 3, 29), date(2024, 4, 1), date(2024, 5, 20),
+                        date(2024, 8, 20), date(2024, 10, 23), date(2024, 12, 26)):
+            self.assertIn(holiday, holidays)
+        self.assertNotIn(date(2016, 3, 25), calendar.holidays(2016))
+
+    def test_is_publication_day(self):
+        self.assertTrue(calendar.is_publication_day(date(2024, 3, 14)))
+        self.assertFalse(calendar.is_publication_day(date(2024, 3, 15)))
+        self.assertFalse(calendar.is_publication_day(date(2024, 3, 16)))
+
+    def test_extra_days(self):
+        with mock.patch.object(calendar, 'EXTRA_HOLIDAYS', {'2024-03-14'}), \
+                mock.patch.object(calendar, 'EXTRA_PUBLICATION_DAYS', {'2024-03-16'}):
+            self.assertFalse(calendar.is_publication_day(date(2024, 3, 14)))
+            self.assertTrue(calendar.is_publication_day(date(2024, 3, 16)))
+
+    def test_next_publication_day(self):
+        self.assertEqual(date(2024, 3, 14), calendar.next_publication_day(date(2024, 3, 13)))
+        self.assertEqual(date(2024, 3, 18), calendar.next_publication_day(date(2024, 3, 14)))
+        self.assertEqual(date(2024, 4, 2), calendar.next_publication_day(date(2024, 3, 28)))
+
+    def test_expiry(self):
+        self.assertEqual(datetime(2024, 3, 18, 11), calendar.expiry('2024-03-14', 11))
+        self.assertEqual(datetime(2018, 1, 4, 11), calendar.expiry('2018-01-03', 11))
@@ -1,10 +1,24 @@
+import io
 import mock
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
 import unittest
 
 import argparse
 
 from mnbexchangerates import mnbexchangerates_cli
 
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules that the cache-hit path must not import (see benchmarks/bench_startup.py).
+FORBIDDEN_MODULES = ('requests', 'urllib3', 'http.client', 'xml.etree.ElementTree', 'xml.parsers.expat', 'html')
+CACHE_HIT = ("import sys\n"
+             "from mnbexchangerates import mnbexchangerates_cli\n"
+             "mnbexchangerates_cli.main(['eur', '--cache-only'])\n"
+             f"print(','.join(m for m in {FORBIDDEN_MODULES!r} if m in sys.modules), file=sys.stderr)\n")
+
 
 class TestMenuCLI(unittest.TestCase):
 
@@ -15,40 +29,205 @@ class TestMenuCLI(unittest.TestCase):
         self.mock_mnb = self.patch_mnb.start()
         self.mock_rates = mock.MagicMock()
         self.mock_mnb.return_value = self.mock_rates
+        self._set_cache_arguments(self.mock_argparser.return_value.parse_args.return_value)
 
     def tearDown(self):
         self.patch_argparser.stop()
         self.patch_mnb.stop()
 
-    def _set_amount(self, amount):
+    @classmethod
+    def _set_cache_arguments(cls, args_mock, backend=None, cache_path=None):
+        args_mock.backend = backend
+        args_mock.cache_path = cache_path
+
+    def _set_amount(self, amount, date=None, currencies=('eur',)):
         args_mock = mock.MagicMock()
+        self._set_cache_arguments(args_mock)
+        args_mock.currency = [mnbexchangerates_cli.currency_with_amount(currency) for currency in currencies]
         args_mock.amount = None if amount is None else mnbexchangerates_cli.supported_float(amount)
+        args_mock.date = date
+        args_mock.server = None
+        args_mock.format = 'text'
         self.mock_argparser.return_value.parse_args.return_value = args_mock
 
     def test_cli_without_amount(self):
         self._set_amount(None)
         self.assertEqual(None, mnbexchangerates_cli.main())
-        self.mock_rates.get_str_of_rate_for_currency.assert_called_with(mock.ANY)
+        self.mock_rates.get_str_of_rate_for_currency.assert_called_with(mock.ANY, None)
         self.mock_rates.get_exchange_of_amount.assert_not_called()
 
+    @mock.patch("mnbexchangerates.mnbexchangerates_client.MNBExchangeRateClient")
+    def test_cli_with_server(self, mock_client):
+        self._set_amount('1')
+        self.mock_argparser.return_value.parse_args.return_value.server = 'http://127.0.0.1:8642'
+        self.assertEqual(None, mnbexchangerates_cli.main())
+        mock_client.assert_called_once_with('http://127.0.0.1:8642')
+        mock_client.return_value.get_exchange_of_amount.assert_called_with('eur', 1.0, None)
+        self.mock_mnb.assert_not_called()
+
     def test_cli_with_amount(self):
         self._set_amount('1')
         self.assertEqual(None, mnbexchangerates_cli.main())
-        self.mock_rates.get_exchange_of_amount.assert_called_with(mock.ANY, 1)
+        self.mock_rates.get_exchange_of_amount.assert_called_with(mock.ANY, 1, None)
         self.mock_rates.get_str_of_rate_for_currency.assert_not_called()
 
     def test_cli_with_float_amount(self):
         self._set_amount('2.5')
         self.assertEqual(None, mnbexchangerates_cli.main())
-        self.mock_rates.get_exchange_of_amount.assert_called_with(mock.ANY, 2.5)
+        self.mock_rates.get_exchange_of_amount.assert_called_with(mock.ANY, 2.5, None)
         self.mock_rates.get_str_of_rate_for_currency.assert_not_called()
 
     def test_cli_with_comma_separated_float_amount(self):
         self._set_amount('2,5')
         self.assertEqual(None, mnbexchangerates_cli.main())
-        self.mock_rates.get_exchange_of_amount.assert_called_with(mock.ANY, 2.5)
+        self.mock_rates.get_exchange_of_amount.assert_called_with(mock.ANY, 2.5, None)
         self.mock_rates.get_str_of_rate_for_currency.assert_not_called()
 
     def test_cli_amount_is_not_a_valid_number(self):
         with self.assertRaises(argparse.ArgumentTypeError):
             mnbexchangerates_cli.supported_float('not_a_number')
+
+    def test_cli_with_date(self):
+        self._set_amount('1', mnbexchangerates_cli.supported_date('2024-03-14'))
+        self.assertEqual(None, mnbexchangerates_cli.main())
+        self.mock_rates.get_exchange_of_amount.assert_called_with(mock.ANY, 1, '2024-03-14')
+
+    def test_cli_date_is_not_a_valid_date(self):
+        with self.assertRaises(argparse.ArgumentTypeError):
+            mnbexchangerates_cli.supported_date('2024-13-01')
+
+    def test_cli_with_several_currencies(self):
+        self._set_amount(None, currencies=('eur', 'usd:2,5', 'jpy:100'))
+        self.assertEqual(None, mnbexchangerates_cli.main())
+        self.mock_rates.get_str_of_rate_for_currency.assert_called_once_with('eur', None)
+        self.assertEqual([mock.call('usd', 2.5, None), mock.call('jpy', 100, None)],
+                         self.mock_rates.get_exchange_of_amount.call_args_list)
+        self.mock_mnb.assert_called_once()
+
+    def test_cli_pair_amount_overrides_amount(self):
+        self._set_amount('3', currencies=('eur', 'usd:2'))
+        self.assertEqual(None, mnbexchangerates_cli.main())
+        self.assertEqual([mock.call('eur', 3, None), mock.call('usd', 2, None)],
+                         self.mock_rates.get_exchange_of_amount.call_args_list)
+
+    def test_cli_structured_output(self):
+        self._set_amount(None, currencies=('eur:2', 'jpy', 'btc'))
+        self.mock_argparser.return_value.parse_args.return_value.format = 'csv'
+        self.mock_rates.exchange.return_value = {
+            'date': '2024-03-14', 'unit': 1, 'currency': 'EUR', 'rate': 393.95, 'amount': 2.0, 'value': 787.9}
+        self.mock_rates.get_rate_for_currency.side_effect = [
+            {'date': '2024-03-14', 'unit': 100, 'currency': 'JPY', 'rate': 243.5}, Exception('Currency not found: BTC')]
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            self.assertEqual(None, mnbexchangerates_cli.main())
+        self.assertEqual('date,currency,unit,rate,amount,value,error\n'
+                         '2024-03-14,EUR,1,393.95,2.0,787.9,\n'
+                         '2024-03-14,JPY,100,243.5,,,\n'
+                         ',BTC,,,,,Currency not found: BTC\n', stdout.getvalue())
+        self.mock_rates.exchange.assert_called_once_with('eur', 2.0, None)
+        self.mock_rates.get_str_of_rate_for_currency.assert_not_called()
+
+    def test_cli_pair_amount_is_not_a_valid_number(self):
+        with self.assertRaises(argparse.ArgumentTypeError):
+            mnbexchangerates_cli.currency_with_amount('eur:not_a_number')
+
+    @mock.patch('mnbexchangerates.mnbexchangerates_convert.MNBExchangeRateConverter')
+    def test_cli_convert(self, mock_converter):
+        args_mock = mock.MagicMock()
+        self._set_cache_arguments(args_mock)
+        args_mock.input = None
+        args_mock.output = None
+        args_mock.input_format = None
+        args_mock.output_format = None
+        self.mock_argparser.return_value.parse_args.return_value = args_mock
+        self.assertEqual(None, mnbexchangerates_cli.main(['convert']))
+        mock_converter.return_value.convert_stream.assert_called_with(mock.ANY, mock.ANY, 'csv', 'csv')
+
+    @mock.patch('mnbexchangerates.mnbexchangerates_convert.MNBExchangeRateConverter')
+    def test_cli_convert_error(self, mock_converter):
+        mock_converter.return_value.convert_stream.side_effect = Exception('Record 1: dummy')
+        self.mock_argparser.return_value.parse_args.return_value.input = None
+        self.mock_argparser.return_value.parse_args.return_value.output = None
+        self.assertEqual(1, mnbexchangerates_cli.main(['convert']))
+
+    def test_cli_with_cache_backend(self):
+        self._set_amount(None)
+        self._set_cache_arguments(self.mock_argparser.return_value.parse_args.return_value,
+                                  backend='sqlite', cache_path='/tmp/shared.sqlite')
+        mnbexchangerates_cli.main(['eur'])
+        backend = self.mock_mnb.call_args[1]['cache_backend']
+        self.assertEqual(('MNBExchangeRateSQLiteBackend', '/tmp/shared.sqlite'), (type(backend).__name__, backend.path))
+        self._set_cache_arguments(self.mock_argparser.return_value.parse_args.return_value, cache_path='~/rates.cache')
+        mnbexchangerates_cli.main(['eur'])
+        self.assertEqual('MNBExchangeRateFileBackend', type(self.mock_mnb.call_args[1]['cache_backend']).__name__)
+
+    @mock.patch('mnbexchangerates.mnbexchangerates_backfill.MNBExchangeRateBackfill')
+    def test_cli_backfill(self, mock_backfill):
+        args_mock = self.mock_argparser.return_value.parse_args.return_value
+        args_mock.start, args_mock.end, args_mock.currencies = '2000-01-01', '2024-03-14', None
+        mock_backfill.return_value.run.return_value = {'chunks': 2, 'fetched': 2, 'days': 500, 'failed': []}
+        self.assertEqual(None, mnbexchangerates_cli.main(['backfill']))
+        mock_backfill.return_value.run.assert_called_with('2000-01-01', '2024-03-14', None)
+        mock_backfill.return_value.run.return_value['failed'] = [('2000-01-01', '2000-12-31', 'Server response: 500')]
+        self.assertEqual(1, mnbexchangerates_cli.main(['backfill']))
+
+    @mock.patch('mnbexchangerates.mnbexchangerates_stats.MNBExchangeRateStats')
+    def test_cli_stats(self, mock_stats):
+        args_mock = self.mock_argparser.return_value.parse_args.return_value
+        args_mock.currency, args_mock.start, args_mock.end, args_mock.window = 'EUR', '2024-01-01', '2024-03-14', None
+        mock_stats.return_value.summary.return_value = {
+            'currency': 'EUR', 'unit': 1, 'start': '2024-01-02', 'end': '2024-03-14', 'days': 50,
+            'first': 380.5, 'last': 393.95, 'average': 388.25, 'min': 378.0, 'max': 395.5, 'volatility': None}
+        with mock.patch('sys.stdout') as stdout:
+            self.assertEqual(None, mnbexchangerates_cli.main(['stats']))
+        self.assertIn('average     388.2500', ''.join(call[0][0] for call in stdout.write.call_args_list))
+        mock_stats.return_value.summary.assert_called_with('EUR', '2024-01-01', '2024-03-14')
+        mock_stats.return_value.summary.side_effect = Exception('No exchange rates found for EUR')
+        self.assertEqual(1, mnbexchangerates_cli.main(['stats']))
+
+    @mock.patch('mnbexchangerates.mnbexchangerates_bundle.import_bundle')
+    @mock.patch('mnbexchangerates.mnbexchangerates_bundle.export_bundle')
+    def test_cli_bundle(self, mock_export, mock_import):
+        self.mock_argparser.return_value.parse_args.return_value.bundle = 'rates.bundle.gz'
+        mock_export.return_value = mock_import.return_value = {'rates_date': '2024-03-14', 'days': 10}
+        self.assertEqual(None, mnbexchangerates_cli.main(['export']))
+        mock_export.assert_called_once_with(self.mock_rates, 'rates.bundle.gz')
+        self.assertEqual(None, mnbexchangerates_cli.main(['import']))
+        mock_import.assert_called_once_with(self.mock_rates, 'rates.bundle.gz')
+        mock_import.side_effect = Exception('Bundle checksum mismatch')
+        self.assertEqual(1, mnbexchangerates_cli.main(['import']))
+
+    @mock.patch('mnbexchangerates.mnbexchangerates_currencies.MNBExchangeRateCurrencies')
+    def test_cli_validate(self, mock_currencies):
+        args_mock = self.mock_argparser.return_value.parse_args.return_value
+        args_mock.codes, args_mock.refresh = ['EUR', 'BTC'], False
+        currencies = mock_currencies.return_value.load.return_value
+        currencies.unknown.return_value = ['BTC']
+        with mock.patch('sys.stdout') as stdout:
+            self.assertEqual(1, mnbexchangerates_cli.main(['validate']))
+        self.assertIn('Unknown currency: BTC', ''.join(call[0][0] for call in stdout.write.call_args_list))
+        currencies.unknown.assert_called_with(['EUR', 'BTC'])
+        currencies.unknown.return_value = []
+        self.assertEqual(None, mnbexchangerates_cli.main(['validate']))
+        mock_currencies.return_value.load.side_effect = Exception('Server response: 500')
+        self.assertEqual(1, mnbexchangerates_cli.main(['validate']))
+
+    def test_date_or_today(self):
+        self.assertEqual('2024-03-14', mnbexchangerates_cli.supported_date_or_today('2024-03-14'))
+        self.assertEqual(10, len(mnbexchangerates_cli.supported_date_or_today('today')))
+        with self.assertRaises(argparse.ArgumentTypeError):
+            mnbexchangerates_cli.supported_date_or_today('yesterday')
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_cache_hit_does_not_import_network_or_xml_modules(self):
+        with tempfile.TemporaryDirectory() as home:
+            os.makedirs(os.path.join(home, '.config', 'mnbexchangerates'))
+            with open(os.path.join(home, '.config', 'mnbexchangerates', 'exchange_rates.cache'), 'wb') as cache:
+                pickle.dump({'date': '2024-03-14', 'rates': [('1', 'EUR', '393,95')]}, cache)
+            environment = dict(os.environ, HOME=home, PYTHONPATH=ROOT)
+            environment.pop('MNB_EXCHANGE_RATE_SERVER', None)
+            result = subprocess.run([sys.executable, '-c', CACHE_HIT], env=environment,
+                                    capture_output=True, text=True, check=True)
+        self.assertIn('393,95', result.stdout)
+        self.assertEqual('', result.stderr.strip().splitlines()[-1] if result.stderr.strip() else '')
@@ -0,0 +1,93 @@
+import io
+import json
+
+import mock
+import unittest
+
+from mnbexchangerates import mnbexchangerates_convert as convert
+
+
+RATES = {
+    'EUR': {'date': '2018-01-03', 'unit': 1, 'currency': 'EUR', 'rate': 310.0},
+    'JPY': {'date': '2018-01-03', 'unit': 100, 'currency': 'JPY', 'rate': 250.0},
+}
+
+CSV_INPUT = """id,currency,amount
+1,EUR,2
+2,jpy,"1000,5"
+3,EUR,0.5
+"""
+CSV_OUTPUT = """id,currency,amount,huf,rate_date
+1,EUR,2,620.00,2018-01-03
+2,jpy,"1000,5",2501.25,2018-01-03
+3,EUR,0.5,155.00,2018-01-03
+"""
+
+
+def get_rate_for_currency(currency, date=None):
+    if currency not in RATES:
+        raise Exception(f'Currency not found: {currency}')  # pylint: disable=W0719
+    return dict(RATES[currency], date=date or RATES[currency]['date'])
+
+
+class MNBExchangeRateConverterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mnb = mock.MagicMock()
+        self.mnb.get_rate_for_currency.side_effect = get_rate_for_currency
+        self.converter = convert.MNBExchangeRateConverter(self.mnb)
+
+    def _convert(self, data, input_format=convert.CSV, output_format=None):
+        output = io.StringIO()
+        self.converter.convert_stream(io.StringIO(data), output, input_format, output_format)
+        return output.getvalue()
+
+    def test_csv(self):
+        self.assertEqual(CSV_OUTPUT, self._convert(CSV_INPUT))
+
+    def test_rates_resolved_once_per_currency(self):
+        self._convert(CSV_INPUT)
+        self.assertEqual(2, self.mnb.get_rate_for_currency.call_count)
+
+    def test_jsonl(self):
+        data = '{"currency": "EUR", "amount": 2, "date": "2017-05-02"}\n\n{"currency": "JPY", "amount": 100}\n'
+        self.converter = convert.MNBExchangeRateConverter(self.mnb, fields={'date': 'date'})
+        lines = [json.loads(line) for line in self._convert(data, convert.JSONL).splitlines()]
+        self.assertEqual({'currency': 'EUR', 'amount': 2, 'date': '2017-05-02',
+                          'huf': 620.0, 'rate_date': '2017-05-02'}, lines[0])
+        self.assertEqual({'currency': 'JPY', 'amount': 100, 'huf': 250.0, 'rate_date': '2018-01-03'}, lines[1])
+        self.mnb.get_rate_for_currency.assert_has_calls([mock.call('EUR', '2017-05-02'), mock.call('JPY', None)])
+
+    def test_csv_to_jsonl(self):
+        output = self._convert(CSV_INPUT, convert.CSV, convert.JSONL)
+        self.assertEqual({'id': '1', 'currency': 'EUR', 'amount': '2', 'huf': 620.0, 'rate_date': '2018-01-03'},
+                         json.loads(output.splitlines()[0]))
+
+    def test_fixed_currency(self):
+        self.converter = convert.MNBExchangeRateConverter(self.mnb, currency='eur')
+        self.assertEqual('amount,huf,rate_date\n3,930.00,2018-01-03\n', self._convert('amount\n3\n'))
+
+    def test_unknown_currency(self):
+        with self.assertRaises(Exception) as context:
+            self._convert('currency,amount\nEUR,1\nBITCOIN,1\n')
+        self.assertEqual('Record 2: Currency not found: BITCOIN', str(context.exception))
+
+    def test_validated_currency(self):
+        known = mock.MagicMock()
+        known.is_known.side_effect = lambda currency: currency in RATES
+        self.converter = convert.MNBExchangeRateConverter(self.mnb, skip_errors=True, currencies=known)
+        self.assertEqual('currency,amount,huf,rate_date\nBTC,1,,\nEUR,1,310.00,2018-01-03\n',
+                         self._convert('currency,amount\nBTC,1\nEUR,1\n'))
+        self.mnb.get_rate_for_currency.assert_called_once_with('EUR', None)
+
+    def test_skip_errors(self):
+        self.converter = convert.MNBExchangeRateConverter(self.mnb, skip_errors=True)
+        output = self._convert('currency,amount\nBITCOIN,1\nEUR,x\nBITCOIN,2\nEUR,1\n')
+        self.assertEqual('currency,amount,huf,rate_date\nBITCOIN,1,,\nEUR,x,,\nBITCOIN,2,,\nEUR,1,310.00,2018-01-03\n',
+                         output)
+        self.assertEqual(2, self.mnb.get_rate_for_currency.call_count)
+
+    def test_guess_format(self):
+        self.assertEqual(convert.JSONL, convert.guess_format('ledger.JSONL'))
+        self.assertEqual(convert.CSV, convert.guess_format('ledger.csv'))
+        self.assertEqual(convert.CSV, convert.guess_format(None))
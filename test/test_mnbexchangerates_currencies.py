@@ -0,0 +1,126 @@
+from datetime import datetime
+from datetime import timedelta
+import json
+import os
+import shutil
+import tempfile
+
+import mock
+import unittest
+
+from mnbexchangerates import mnbexchangerates_currencies as currencies
+
+
+CURRENCIES = ['EUR', 'JPY', 'USD']
+RESPONSE = """<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
+<s:Body>
+<{operation}Response xmlns="http://www.mnb.hu/webservices/" xmlns:i="http://www.w3.org/2001/XMLSchema-instance">
+<{operation}Result>{result}</{operation}Result>
+</{operation}Response>
+</s:Body>
+</s:Envelope>"""
+RESPONSE_CURRENCIES = RESPONSE.format(
+    operation='GetCurrencies',
+    result='&lt;MNBCurrencies&gt;&lt;Currencies&gt;&lt;Curr&gt;HUF&lt;/Curr&gt;&lt;Curr&gt;EUR&lt;/Curr&gt;'
+           '&lt;Curr&gt;JPY&lt;/Curr&gt;&lt;Curr&gt;USD&lt;/Curr&gt;&lt;/Currencies&gt;&lt;/MNBCurrencies&gt;').encode()
+RESPONSE_UNITS = RESPONSE.format(
+    operation='GetCurrencyUnits',
+    result='&lt;MNBCurrencyUnits&gt;&lt;Units&gt;&lt;Unit curr="EUR"&gt;1&lt;/Unit&gt;'
+           '&lt;Unit curr="JPY"&gt;100&lt;/Unit&gt;&lt;Unit curr="USD"&gt;1&lt;/Unit&gt;'
+           '&lt;/Units&gt;&lt;/MNBCurrencyUnits&gt;').encode()
+RESPONSE_INFO = RESPONSE.format(
+    operation='GetInfo',
+    result='&lt;MNBExchangeRatesQueryValues&gt;&lt;FirstDate&gt;1949-01-03&lt;/FirstDate&gt;'
+           '&lt;LastDate&gt;2024-03-14&lt;/LastDate&gt;&lt;Currencies&gt;&lt;Curr&gt;EUR&lt;/Curr&gt;'
+           '&lt;/Currencies&gt;&lt;/MNBExchangeRatesQueryValues&gt;').encode()
+
+
+def post(body):
+    if 'GetCurrencyUnits' in body:
+        content = RESPONSE_UNITS
+    elif 'GetCurrencies' in body:
+        content = RESPONSE_CURRENCIES
+    else:
+        content = RESPONSE_INFO
+    return mock.MagicMock(status_code=200, content=content)
+
+
+class MNBExchangeRateCurrenciesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'currencies.json')
+        self.mnb = mock.MagicMock()
+        self.mnb.cache.cache_only = False
+        self.mnb.transport.post.side_effect = post
+        self.currencies = currencies.MNBExchangeRateCurrencies(self.mnb, path=self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _store(self, age):
+        with open(self.path, 'w', encoding='utf-8') as metadata_file:
+            json.dump({'fetched': (datetime.now() - timedelta(seconds=age)).isoformat(timespec='seconds'),
+                       'currencies': ['EUR', 'GBP'], 'units': {'EUR': 1, 'GBP': 1}}, metadata_file)
+
+    def test_fetch_and_store(self):
+        self.assertTrue(self.currencies.is_known(' eur'))
+        self.assertEqual(100, self.currencies.unit('JPY'))
+        self.assertEqual('1949-01-03', self.currencies.metadata['first_date'])
+        self.assertEqual('2024-03-14', self.currencies.metadata['last_date'])
+        self.assertEqual(3, self.mnb.transport.post.call_count)
+        with open(self.path, 'r', encoding='utf-8') as metadata_file:
+            self.assertEqual(['HUF'] + CURRENCIES, json.load(metadata_file)['currencies'])
+        self.assertFalse(self.currencies.is_known('BTC'))
+        self.assertEqual(3, self.mnb.transport.post.call_count)
+
+    def test_stored_list_is_used(self):
+        self._store(60)
+        self.assertTrue(self.currencies.is_known('GBP'))
+        self.mnb.transport.post.assert_not_called()
+
+    def test_expired_list_is_refreshed(self):
+        self._store(currencies.MAX_AGE + 60)
+        self.assertFalse(self.currencies.is_known('GBP'))
+        self.assertEqual(3, self.mnb.transport.post.call_count)
+
+    def test_expired_list_is_used_when_refresh_fails(self):
+        self._store(currencies.MAX_AGE + 60)
+        self.mnb.transport.post.side_effect = None
+        self.mnb.transport.post.return_value.status_code = 500
+        self.assertTrue(self.currencies.is_known('GBP'))
+        self.assertTrue(self.currencies.is_known('EUR'))
+        self.assertFalse(self.currencies.is_known('BTC'))
+        self.assertEqual(1, self.mnb.transport.post.call_count)
+        with mock.patch('mnbexchangerates.mnbexchangerates_currencies.datetime') as mock_datetime:
+            mock_datetime.now.return_value = datetime.now() + timedelta(seconds=currencies.ERROR_INTERVAL + 1)
+            mock_datetime.fromisoformat = datetime.fromisoformat
+            mock_datetime.max = datetime.max
+            self.assertTrue(self.currencies.is_known('GBP'))
+        self.assertEqual(2, self.mnb.transport.post.call_count)
+        os.remove(self.path)
+        with self.assertRaisesRegex(Exception, 'Server response: 500'):
+            currencies.MNBExchangeRateCurrencies(self.mnb, path=self.path).load()
+
+    def test_cache_only(self):
+        self._store(currencies.MAX_AGE + 60)
+        self.mnb.cache.cache_only = True
+        self.assertTrue(self.currencies.is_known('GBP'))
+        self.mnb.transport.post.assert_not_called()
+
+    def test_unknown(self):
+        self.assertEqual(['BTC', 'XYZ'], self.currencies.unknown(['eur', 'btc', 'XYZ', 'BTC ']))
+
+    def test_validate_records(self):
+        records = [{'currency': 'EUR'}, {'currency': 'btc'}, {'currency': ''}, {'currency': 'BTC'}, {}]
+        self.assertEqual({'BTC': [2, 4], '': [3, 5]}, self.currencies.validate_records(records))
+
+    def test_malformed_response(self):
+        self.mnb.transport.post.side_effect = None
+        self.mnb.transport.post.return_value = mock.MagicMock(status_code=200, content=b'<html>')
+        with self.assertRaisesRegex(Exception, 'Malformed content received from server'):
+            self.currencies.load()
+
+
+if __name__ == '__main__':
+    unittest.main()
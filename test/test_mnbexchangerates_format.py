@@ -0,0 +1,68 @@
+import io
+import json
+
+import unittest
+
+from mnbexchangerates import mnbexchangerates_format as output
+
+
+NUMBERS = ('393,95', 1234567.891, '0,0100', 100, 787.9, 1000.0, -1234.5, '2.5', 0, '1234.50')
+RECORDS = [{'date': '2024-03-14', 'unit': 1, 'currency': 'EUR', 'rate': 393.95, 'amount': 2.0, 'value': 787.9},
+           {'date': '2024-03-14', 'unit': 100, 'currency': 'JPY', 'rate': 243.5},
+           {'currency': 'BTC', 'error': 'Currency not found: BTC'}]
+
+
+class MNBExchangeRateNumberFormatterTest(unittest.TestCase):
+
+    def test_default_format(self):
+        expected = ['393,95', "1'234'567,891", '0,01', '100', '787,9', "1'000", "-1'234,5", '2,5', '0', "1'234,5"]
+        self.assertEqual(expected, [output.NUMBER_FORMATTER.format(number) for number in NUMBERS])
+        self.assertEqual(expected, output.NUMBER_FORMATTER.format_many(NUMBERS))
+        self.assertEqual([], output.NUMBER_FORMATTER.format_many([]))
+
+    def test_large_floats(self):
+        numbers = [39395000000000000.0, -4e17, 10 ** 20, 1.5]
+        expected = ["39'395'000'000'000'000", "-400'000'000'000'000'000", "100'000'000'000'000'000'000", '1,5']
+        self.assertEqual(expected, [output.NUMBER_FORMATTER.format(number) for number in numbers])
+        self.assertEqual(expected, output.NUMBER_FORMATTER.format_many(numbers))
+        self.assertEqual("40'000'000'000'000'000", output.TOTAL_FORMATTER.format(4e16))
+
+    def test_fixed_decimals(self):
+        formatter = output.MNBExchangeRateNumberFormatter('.', ',', decimals=2)
+        expected = ['393.95', '1,234,567.89', '0.01', '100', '787.9', '1,000', '-1,234.5', '2.5', '0', '1,234.5']
+        self.assertEqual(expected, [formatter.format(number) for number in NUMBERS])
+        self.assertEqual(expected, formatter.format_many(NUMBERS))
+
+    def test_zeros_kept(self):
+        formatter = output.MNBExchangeRateNumberFormatter(',', ' ', decimals=2, strip_zeros=False)
+        self.assertEqual(['1 000,00', '0,10', '-12 345,68'], formatter.format_many([1000, 0.1, -12345.678]))
+        self.assertEqual('1 000,00', formatter.format(1000))
+
+
+class WriteRecordsTest(unittest.TestCase):
+
+    def _write(self, output_format):
+        stream = io.StringIO()
+        output.write_records(iter(RECORDS), output_format, stream)
+        return stream.getvalue()
+
+    def test_json(self):
+        self.assertEqual(RECORDS, [json.loads(line) for line in self._write(output.JSON).splitlines()])
+
+    def test_csv(self):
+        self.assertEqual('date,currency,unit,rate,amount,value,error\n'
+                         '2024-03-14,EUR,1,393.95,2.0,787.9,\n'
+                         '2024-03-14,JPY,100,243.5,,,\n'
+                         ',BTC,,,,,Currency not found: BTC\n', self._write(output.CSV))
+
+    def test_tsv(self):
+        self.assertEqual('date\tcurrency\tunit\trate\tamount\tvalue\terror',
+                         self._write(output.TSV).splitlines()[0])
+
+    def test_unsupported_format(self):
+        with self.assertRaisesRegex(Exception, 'Unsupported output format: xml'):
+            self._write('xml')
+
+
+if __name__ == '__main__':
+    unittest.main()
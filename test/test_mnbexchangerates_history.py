@@ -0,0 +1,153 @@
+from datetime import date
+import os
+import shutil
+import tempfile
+
+import mock
+import unittest
+
+from mnbexchangerates import mnbexchangerates_history as history
+
+
+DAYS = [{'date': '2024-03-14', 'rates': [('1', 'EUR', '393,95'), ('100', 'JPY', '243,50')]},
+        {'date': '2024-03-13', 'rates': [('1', 'EUR', '394,10')]}]
+
+
+class MNBExchangeRateHistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.patch_file = mock.patch('mnbexchangerates.mnbexchangerates_history.RATES_HISTORY_FILE',
+                                     os.path.join(self.tmp_dir, 'history.cache'))
+        self.patch_file.start()
+        self.history = history.MNBExchangeRateHistory(debug=True)
+
+    def tearDown(self):
+        self.patch_file.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_empty_history(self):
+        self.assertIsNone(self.history.lookup('2024-03-14', 'EUR'))
+        self.assertIsNone(self.history.get('2024-03-14', ['EUR']))
+
+    def test_lookup(self):
+        self.history.add(DAYS, '2024-03-10', '2024-03-17', ['EUR', 'JPY'])
+        self.assertEqual(('2024-03-14', '1', '393,95'), self.history.lookup('2024-03-14', 'EUR'))
+        self.assertEqual(('2024-03-13', '1', '394,10'), self.history.lookup('2024-03-13', 'EUR'))
+        self.assertEqual(('2024-03-14', '1', '393,95'), self.history.lookup('2024-03-16', 'EUR'))
+        self.assertEqual(('2024-03-14', '100', '243,50'), self.history.lookup('2024-03-14', 'JPY'))
+        self.assertIsNone(self.history.lookup('2024-03-13', 'JPY'))
+        self.assertIsNone(self.history.lookup('2024-03-18', 'EUR'))
+        self.assertIsNone(self.history.lookup('2024-03-14', 'USD'))
+
+    def test_lookup_rate(self):
+        self.history.add(DAYS, '2024-03-10', '2024-03-17', ['EUR', 'JPY'])
+        self.assertEqual({'date': '2024-03-14', 'unit': 100, 'currency': 'JPY', 'rate': 243.5},
+                         self.history.lookup_rate('2024-03-15', 'JPY'))
+        self.assertIsNone(self.history.lookup_rate('2024-03-15', 'USD'))
+
+    def test_persisted(self):
+        self.history.add(DAYS, '2024-03-10', '2024-03-17', ['EUR'])
+        reloaded = history.MNBExchangeRateHistory()
+        self.assertEqual(('2024-03-14', '1', '393,95'), reloaded.lookup('2024-03-15', 'EUR'))
+
+    def test_get(self):
+        self.history.add(DAYS, '2024-03-10', '2024-03-17', ['EUR', 'JPY'])
+        self.assertEqual({'date': '2024-03-14', 'rates': [('1', 'EUR', '393,95'), ('100', 'JPY', '243,50')]},
+                         self.history.get('2024-03-17', ['EUR', 'JPY']))
+        self.assertIsNone(self.history.get('2024-03-17', ['EUR', 'USD']))
+        self.assertIsNone(self.history.get('2024-03-10', ['EUR']))
+
+    def test_covered_ranges_are_merged(self):
+        self.history.add([], '2024-03-01', '2024-03-05', ['EUR'])
+        self.history.add([], '2024-03-06', '2024-03-09', ['EUR'])
+        self.history.add([], '2024-03-20', '2024-03-21', ['EUR'])
+        self.assertEqual({'EUR': [['2024-03-01', '2024-03-09'], ['2024-03-20', '2024-03-21']]}, self.history.covered)
+        self.assertTrue(self.history.is_covered('2024-03-07', ['EUR']))
+        self.assertFalse(self.history.is_covered('2024-03-15', ['EUR']))
+
+    def test_currencies(self):
+        self.assertEqual([], self.history.currencies())
+        self.history.add([], '2024-03-05', '2024-03-09', ['JPY', 'EUR'])
+        self.history.add([], '2024-03-12', '2024-03-14', ['EUR'])
+        self.assertEqual(['EUR', 'JPY'], self.history.currencies())
+        self.assertEqual(['EUR'], self.history.currencies('2024-03-13'))
+        self.assertEqual([], self.history.currencies('2024-03-20'))
+
+    def test_add_many(self):
+        self.history.add_many([(DAYS[:1], '2024-03-14', '2024-03-14', ['EUR']),
+                               (DAYS[1:], '2024-03-13', '2024-03-13', ['EUR'])])
+        self.assertEqual({'EUR': [['2024-03-13', '2024-03-14']]}, self.history.covered)
+        self.assertEqual(('2024-03-13', '1', '394,10'), self.history.lookup('2024-03-13', 'EUR'))
+
+    def test_missing_ranges(self):
+        self.history.add([], '2024-03-05', '2024-03-09', ['EUR', 'JPY'])
+        self.history.add([], '2024-03-12', '2024-03-14', ['EUR'])
+        self.assertEqual([['2024-03-01', '2024-03-04'], ['2024-03-10', '2024-03-20']],
+                         self.history.missing_ranges('2024-03-01', '2024-03-20', ['EUR', 'JPY']))
+        self.assertEqual([['2024-03-10', '2024-03-11']],
+                         self.history.missing_ranges('2024-03-06', '2024-03-13', ['EUR']))
+        self.assertEqual([], self.history.missing_ranges('2024-03-06', '2024-03-08', ['EUR', 'JPY']))
+        self.assertEqual([['2024-03-06', '2024-03-08']],
+                         self.history.missing_ranges('2024-03-06', '2024-03-08', ['USD']))
+
+    def test_days_without_range(self):
+        self.history.add(DAYS[:1])
+        self.assertIsNone(self.history.lookup('2024-03-14', 'EUR'))
+
+    def test_invalid_history_file(self):
+        with open(os.path.join(self.tmp_dir, 'history.cache'), 'wb') as history_file:
+            history_file.write(b'invalid')
+        self.assertIsNone(self.history.lookup('2024-03-14', 'EUR'))
+
+    def test_write_error(self):
+        shutil.rmtree(self.tmp_dir)
+        with open(self.tmp_dir, 'wb'):
+            pass
+        self.history.add(DAYS, '2024-03-10', '2024-03-17', ['EUR'])
+        self.assertIsNone(self.history.lookup('2024-03-14', 'EUR'))
+        os.remove(self.tmp_dir)
+        os.makedirs(self.tmp_dir)
+
+    def test_add_appends_to_journal(self):
+        self.history.add(DAYS, '2024-03-10', '2024-03-17', ['EUR'])
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir, 'history.cache')))
+        self.assertTrue(os.path.getsize(os.path.join(self.tmp_dir, 'history.cache.journal')))
+        self.assertEqual({'2024-03-14': {'EUR': ('1', '393,95'), 'JPY': ('100', '243,50')},
+                          '2024-03-13': {'EUR': ('1', '394,10')}}, self.history.read_days())
+
+    def test_journal_is_compacted(self):
+        with mock.patch('mnbexchangerates.mnbexchangerates_history.JOURNAL_MAX_BYTES', 0):
+            self.history.add(DAYS, '2024-03-10', '2024-03-17', ['EUR'])
+        self.assertEqual(0, os.path.getsize(os.path.join(self.tmp_dir, 'history.cache.journal')))
+        self.assertEqual(2, self.history.file.day_count)
+        with mock.patch('mnbexchangerates.mnbexchangerates_history.JOURNAL_MAX_BYTES', 0):
+            self.history.add([{'date': '2024-03-14', 'rates': [('1', 'EUR', '395,00')]},
+                              {'date': '2024-03-12', 'rates': [('100', 'JPY', '240,00')]}])
+        self.assertEqual(0, os.path.getsize(os.path.join(self.tmp_dir, 'history.cache.journal')))
+        self.assertEqual(3, self.history.file.day_count)
+        self.assertEqual({'2024-03-12': {'JPY': ('100', '240,00')},
+                          '2024-03-13': {'EUR': ('1', '394,10')},
+                          '2024-03-14': {'EUR': ('1', '395,00'), 'JPY': ('100', '243,50')}}, self.history.read_days())
+        self.history.compact()
+        self.assertEqual(('2024-03-14', '1', '395,00'), self.history.lookup('2024-03-15', 'EUR'))
+        self.assertEqual({'date': '2024-03-14', 'rates': [('1', 'EUR', '395,00'), ('100', 'JPY', '243,50')]},
+                         self.history.get('2024-03-15', ['EUR']))
+        first = date(2024, 3, 13).toordinal()
+        self.assertEqual([(first, 1, 394100000), (first + 1, 1, 395000000)], self.history.series('EUR'))
+
+    def test_concurrent_writers_keep_each_others_ranges(self):
+        other = history.MNBExchangeRateHistory().load()
+        self.history.load()
+        self.history.add(DAYS[1:], '2024-03-13', '2024-03-13', ['EUR'])
+        other.add(DAYS[:1], '2024-03-14', '2024-03-14', ['EUR'])
+        reloaded = history.MNBExchangeRateHistory().load()
+        self.assertEqual({'EUR': [['2024-03-13', '2024-03-14']]}, reloaded.covered)
+        self.assertEqual(('2024-03-13', '1', '394,10'), reloaded.lookup('2024-03-13', 'EUR'))
+
+    def test_torn_journal_line_is_skipped(self):
+        with open(os.path.join(self.tmp_dir, 'history.cache.journal'), 'wb') as journal:
+            journal.write(b'{"days":{"2024-03-1')
+        self.history.add(DAYS, '2024-03-10', '2024-03-17', ['EUR'])
+        reloaded = history.MNBExchangeRateHistory()
+        self.assertEqual(('2024-03-14', '1', '393,95'), reloaded.lookup('2024-03-15', 'EUR'))
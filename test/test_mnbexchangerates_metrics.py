@@ -0,0 +1,87 @@
+import unittest
+
+import mock
+
+from mnbexchangerates import mnbexchangerates_metrics as metrics
+
+
+class MNBExchangeRateMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = metrics.MNBExchangeRateMetrics(buckets=(0.01, 0.1, 1))
+
+    def test_counters(self):
+        self.metrics.increment('cache_hits_total')
+        self.metrics.increment('bytes_received_total', 100)
+        self.metrics.increment('bytes_received_total', 50)
+        self.assertEqual({'cache_hits_total': 1, 'bytes_received_total': 150}, self.metrics.snapshot()['counters'])
+
+    def test_histogram(self):
+        for seconds in (0.005, 0.01, 0.5, 3):
+            self.metrics.observe('parse_seconds', seconds)
+        histogram = self.metrics.snapshot()['histograms']['parse_seconds']
+        self.assertEqual([2, 0, 1, 1], histogram['buckets'])
+        self.assertEqual(4, histogram['count'])
+        self.assertAlmostEqual(3.515, histogram['sum'])
+
+    @mock.patch('mnbexchangerates.mnbexchangerates_metrics.time.perf_counter')
+    def test_timer(self, mock_perf_counter):
+        mock_perf_counter.side_effect = [10.0, 10.05]
+        with self.metrics.timer('soap_request_seconds'):
+            pass
+        self.assertEqual([0, 1, 0, 0], self.metrics.snapshot()['histograms']['soap_request_seconds']['buckets'])
+
+    def test_timer_records_failures(self):
+        with self.assertRaises(ValueError):
+            with self.metrics.timer('parse_seconds'):
+                raise ValueError('dummy')
+        self.assertEqual(1, self.metrics.snapshot()['histograms']['parse_seconds']['count'])
+
+    def test_sink(self):
+        sink = self.metrics.add_sink(mock.MagicMock())
+        self.metrics.increment('cache_misses_total')
+        self.metrics.observe('cache_load_seconds', 0.2)
+        self.assertEqual([mock.call(metrics.COUNTER, 'cache_misses_total', 1),
+                          mock.call(metrics.HISTOGRAM, 'cache_load_seconds', 0.2)], sink.call_args_list)
+        self.metrics.remove_sink(sink)
+        self.metrics.increment('cache_misses_total')
+        self.assertEqual(2, sink.call_count)
+
+    def test_prometheus(self):
+        self.metrics.increment('cache_hits_total', 2)
+        self.metrics.observe('parse_seconds', 0.05)
+        self.metrics.observe('parse_seconds', 2)
+        self.assertEqual('# TYPE mnbexchangerates_cache_hits_total counter\n'
+                         'mnbexchangerates_cache_hits_total 2\n'
+                         '# TYPE mnbexchangerates_parse_seconds histogram\n'
+                         'mnbexchangerates_parse_seconds_bucket{le="0.01"} 0\n'
+                         'mnbexchangerates_parse_seconds_bucket{le="0.1"} 1\n'
+                         'mnbexchangerates_parse_seconds_bucket{le="1"} 1\n'
+                         'mnbexchangerates_parse_seconds_bucket{le="+Inf"} 2\n'
+                         'mnbexchangerates_parse_seconds_sum 2.05\n'
+                         'mnbexchangerates_parse_seconds_count 2\n',
+                         self.metrics.to_prometheus())
+
+
+class MNBExchangeRateMetricsRegistryTest(unittest.TestCase):
+
+    def tearDown(self):
+        metrics.disable()
+
+    def test_disabled_by_default(self):
+        null_metrics = metrics.get_metrics()
+        self.assertFalse(null_metrics.enabled)
+        null_metrics.increment('cache_hits_total')
+        null_metrics.observe('parse_seconds', 1)
+        with null_metrics.timer('parse_seconds'):
+            pass
+        self.assertEqual('', null_metrics.to_prometheus())
+
+    def test_enable(self):
+        enabled = metrics.enable()
+        self.assertIs(enabled, metrics.get_metrics())
+        self.assertIs(enabled, metrics.enable())
+        custom = metrics.MNBExchangeRateMetrics()
+        self.assertIs(custom, metrics.enable(custom))
+        metrics.disable()
+        self.assertIs(metrics.NULL_METRICS, metrics.get_metrics())
@@ -0,0 +1,72 @@
+import html
+import tracemalloc
+
+import unittest
+import xml.etree.ElementTree as ET
+
+from mnbexchangerates import mnbexchangerates_parser as parser
+
+from test.test_mnbexchangerates import RESPONSE_HISTORY_VALID
+from test.test_mnbexchangerates import RESPONSE_VALID
+
+
+HISTORY_DAYS = [{'date': '2024-03-14', 'rates': [('1', 'EUR', '393,95')]},
+                {'date': '2024-03-13', 'rates': [('1', 'EUR', '394,10')]}]
+
+
+def large_response(days):
+    yield (b'<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"><s:Body>'
+           b'<GetExchangeRatesResponse xmlns="http://www.mnb.hu/webservices/"><GetExchangeRatesResult>'
+           b'&lt;MNBExchangeRates&gt;')
+    for day in range(days):
+        yield (f'&lt;Day date="{day:06d}"&gt;'.encode() +
+               b''.join(f'&lt;Rate unit="1" curr="C{curr:02d}"&gt;{day},{curr}&lt;/Rate&gt;'.encode()
+                        for curr in range(30)) +
+               b'&lt;/Day&gt;')
+    yield b'&lt;/MNBExchangeRates&gt;</GetExchangeRatesResult></GetExchangeRatesResponse></s:Body></s:Envelope>'
+
+
+class MNBExchangeRateParserTest(unittest.TestCase):
+
+    def test_current_rates(self):
+        self.assertEqual([('2018-01-03', '1', 'EUR', '500,000')], list(parser.iter_rates(RESPONSE_VALID)))
+
+    def test_days(self):
+        self.assertEqual(HISTORY_DAYS, list(parser.iter_days(RESPONSE_HISTORY_VALID)))
+
+    def test_small_chunks(self):
+        chunks = [RESPONSE_HISTORY_VALID[index:index + 5] for index in range(0, len(RESPONSE_HISTORY_VALID), 5)]
+        self.assertEqual(HISTORY_DAYS, list(parser.iter_days(chunks)))
+
+    def test_string_content(self):
+        self.assertEqual(HISTORY_DAYS, list(parser.iter_days(RESPONSE_HISTORY_VALID.decode())))
+
+    def test_unescaped_content(self):
+        self.assertEqual(HISTORY_DAYS, list(parser.iter_days(html.unescape(RESPONSE_HISTORY_VALID.decode()))))
+
+    def test_records_are_yielded_incrementally(self):
+        rates = parser.iter_rates(large_response(1000000))
+        self.assertEqual(('000000', '1', 'C00', '0,0'), next(rates))
+
+    def test_memory_is_bounded(self):
+        tracemalloc.start()
+        count = sum(1 for _ in parser.iter_rates(large_response(500)))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.assertEqual(15000, count)
+        self.assertLess(peak, 512 * 1024)
+
+    def test_no_rates(self):
+        self.assertEqual([], list(parser.iter_days(b'<validxml><sometag>aaa</sometag></validxml>')))
+
+    def test_invalid_envelope(self):
+        with self.assertRaises(ET.ParseError):
+            list(parser.iter_days(b'some invalid response'))
+
+    def test_truncated_content(self):
+        with self.assertRaises(ET.ParseError):
+            list(parser.iter_days(RESPONSE_VALID[:-30]))
+
+    def test_invalid_inner_document(self):
+        with self.assertRaises(ET.ParseError):
+            list(parser.iter_days(RESPONSE_VALID.replace(b'&lt;/Day&gt;', b'&lt;/Dax&gt;')))
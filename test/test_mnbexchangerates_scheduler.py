@@ -0,0 +1,80 @@
+from datetime import datetime
+from datetime import timedelta
+import threading
+import unittest
+
+import mock
+
+from mnbexchangerates import mnbexchangerates_scheduler as scheduler
+from mnbexchangerates import mnbexchangerates_table
+
+
+OLD_RATES = {'date': '2024-03-14', 'rates': [('1', 'EUR', '393,95')]}
+NEW_RATES = {'date': '2024-03-18', 'rates': [('1', 'EUR', '394,50')]}
+
+
+class MNBExchangeRatePrefetchSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mnb = mock.MagicMock()
+        self.mnb.cache.cache_only = False
+        self.mnb.get_table.return_value = mnbexchangerates_table.MNBExchangeRateTable.from_rates(OLD_RATES)
+        self.mnb.use_rates.side_effect = mnbexchangerates_table.MNBExchangeRateTable.from_rates
+        self.on_update = mock.MagicMock()
+        self.scheduler = scheduler.MNBExchangeRatePrefetchScheduler(self.mnb, on_update=self.on_update,
+                                                                    retry_interval=10, max_retry_interval=30)
+
+    def test_waits_until_expiry(self):
+        self.mnb.cache.expiry.return_value = datetime.now() + timedelta(seconds=120)
+        self.assertAlmostEqual(120, self.scheduler.run_once(), delta=1)
+        self.mnb.cache.expiry.assert_called_with('2024-03-14')
+        self.mnb.fetch_rates.assert_not_called()
+
+    def test_cache_only(self):
+        self.mnb.cache.cache_only = True
+        self.mnb.cache.expiry.return_value = datetime.now() - timedelta(seconds=1)
+        self.assertEqual(scheduler.MAX_WAIT, self.scheduler.run_once())
+        self.mnb.fetch_rates.assert_not_called()
+        self.mnb.get_table.assert_not_called()
+
+    def test_long_wait_is_capped(self):
+        self.mnb.cache.expiry.return_value = datetime.now() + timedelta(days=3)
+        self.assertEqual(scheduler.MAX_WAIT, self.scheduler.run_once())
+
+    def test_prefetch_after_expiry(self):
+        self.mnb.cache.expiry.return_value = datetime.now() - timedelta(seconds=1)
+        self.mnb.fetch_rates.return_value = NEW_RATES
+        self.assertEqual(0, self.scheduler.run_once())
+        self.mnb.fetch_rates.assert_called_once_with('2024-03-14')
+        self.mnb.use_rates.assert_called_once_with(NEW_RATES)
+        self.assertEqual('2024-03-18', self.on_update.call_args[0][0].date)
+        self.assertEqual('2024-03-18', self.scheduler.state['table'].date)
+
+    def test_retry_with_backoff_until_published(self):
+        self.mnb.cache.expiry.return_value = datetime.now() - timedelta(seconds=1)
+        self.mnb.fetch_rates.return_value = OLD_RATES
+        for _ in range(4):
+            self.scheduler.run_once()
+        self.assertEqual([mock.call('2024-03-14', 10), mock.call('2024-03-14', 20), mock.call('2024-03-14', 30),
+                          mock.call('2024-03-14', 30)], self.mnb.cache.postpone.call_args_list)
+        self.on_update.assert_not_called()
+        self.mnb.fetch_rates.return_value = NEW_RATES
+        self.scheduler.run_once()
+        self.assertEqual(0, self.scheduler.state['retries'])
+        self.on_update.assert_called_once()
+
+    def test_background_thread(self):
+        self.mnb.cache.expiry.return_value = datetime.now() - timedelta(seconds=1)
+        updated = threading.Event()
+        self.mnb.fetch_rates.return_value = NEW_RATES
+        self.scheduler.on_update = lambda table: updated.set()
+        self.scheduler.start()
+        self.assertTrue(updated.wait(5))
+        self.scheduler.stop()
+        self.assertIsNone(self.scheduler.thread)
+
+    def test_errors_are_retried(self):
+        self.mnb.get_table.side_effect = Exception('Connection refused')
+        with mock.patch.object(self.scheduler.stopped, 'wait', side_effect=[False, True]) as mock_wait:
+            self.scheduler._run()
+        self.assertEqual([mock.call(0), mock.call(scheduler.ERROR_INTERVAL)], mock_wait.call_args_list)
@@ -0,0 +1,156 @@
+from datetime import datetime
+import json
+import threading
+import unittest
+
+import mock
+
+from mnbexchangerates import mnbexchangerates
+from mnbexchangerates import mnbexchangerates_client
+from mnbexchangerates import mnbexchangerates_metrics
+from mnbexchangerates import mnbexchangerates_server as server
+from mnbexchangerates import mnbexchangerates_table
+
+
+RATES = {'date': '2018-01-03', 'rates': [('1', 'EUR', '310,25'), ('100', 'JPY', '230,50')]}
+NEW_RATES = {'date': '2018-01-04', 'rates': [('1', 'EUR', '311,00')]}
+
+
+class MNBExchangeRateServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mnb = mock.MagicMock()
+        self.mnb.format_rate = mnbexchangerates.MNBExchangeRates.format_rate
+        self.mnb.format_exchange = mnbexchangerates.MNBExchangeRates.format_exchange
+        self.table = mnbexchangerates_table.MNBExchangeRateTable.from_rates(RATES)
+        self.mnb.get_table.return_value = self.table
+        self.mnb.cache.expiry.return_value = datetime.max
+        self.server = server.MNBExchangeRateServer(self.mnb, port=0)
+
+    def tearDown(self):
+        self.server.httpd.server_close()
+
+    def test_rates(self):
+        status, body, content_type = self.server.handle('/rates', {})
+        self.assertEqual((200, server.JSON), (status, content_type))
+        self.assertEqual({'date': '2018-01-03', 'rates': {'EUR': {'unit': 1, 'rate': 310.25},
+                                                          'JPY': {'unit': 100, 'rate': 230.5}}},
+                         json.loads(body))
+
+    def test_rate(self):
+        status, body, _ = self.server.handle('/rate/jpy', {})
+        self.assertEqual(200, status)
+        self.assertEqual({'date': '2018-01-03', 'unit': 100, 'currency': 'JPY', 'rate': 230.5}, json.loads(body))
+
+    def test_rate_text(self):
+        status, body, content_type = self.server.handle('/rate/EUR', {'format': 'text'})
+        self.assertEqual((200, server.TEXT), (status, content_type))
+        self.assertEqual(b'MNB exchange rate of  1 EUR = 310,25 HUF  (2018-01-03)', body)
+
+    def test_responses_are_rendered_once(self):
+        first = self.server.handle('/rate/EUR', {})[1]
+        self.assertIs(first, self.server.handle('/rate/EUR', {})[1])
+        self.mnb.get_table.assert_called_once_with()
+
+    def test_refresh_renders_new_table(self):
+        self.server.handle('/rate/EUR', {})
+        self.mnb.get_table.return_value = mnbexchangerates_table.MNBExchangeRateTable.from_rates(NEW_RATES)
+        self.server.refresh()
+        self.assertEqual('2018-01-04', json.loads(self.server.handle('/rate/EUR', {})[1])['date'])
+
+    def test_historical_rate(self):
+        status, _, _ = self.server.handle('/rate/EUR', {'date': '2018-01-03'})
+        self.assertEqual(200, status)
+        self.mnb.get_table.assert_called_once_with('2018-01-03')
+
+    def test_days_without_publication_are_rendered_once(self):
+        past_table = mnbexchangerates_table.MNBExchangeRateTable.from_rates(dict(RATES, date='2018-01-05'))
+        self.mnb.get_table.return_value = past_table
+        first = self.server.handle('/rates', {'date': '2018-01-06'})[1]
+        self.assertIs(first, self.server.handle('/rates', {'date': '2018-01-07'})[1])
+        self.assertEqual(1, len(self.server.rendered))
+
+    def test_past_dates_are_bounded(self):
+        with mock.patch.object(self.server.rendered, 'maxsize', 2):
+            for day in range(1, 6):
+                date = f'2018-01-0{day}'
+                self.mnb.get_table.return_value = mnbexchangerates_table.MNBExchangeRateTable.from_rates(
+                    dict(RATES, date=date))
+                self.server.handle('/rates', {'date': date})
+        self.assertEqual(2, len(self.server.rendered))
+
+    def test_convert(self):
+        status, body, _ = self.server.handle('/convert', {'currency': 'eur', 'amount': '2'})
+        self.assertEqual(200, status)
+        self.assertEqual(620.5, json.loads(body)['value'])
+
+    def test_convert_text(self):
+        status, body, _ = self.server.handle('/convert', {'currency': 'EUR', 'amount': '1000', 'format': 'text'})
+        self.assertEqual(200, status)
+        self.assertEqual(b"MNB exchange rate of  1'000 EUR = 310'250 HUF  (2018-01-03)", body)
+
+    def test_convert_invalid_amount(self):
+        status, body, _ = self.server.handle('/convert', {'currency': 'EUR', 'amount': 'abc'})
+        self.assertEqual(400, status)
+        self.assertIn('error', json.loads(body))
+
+    def test_unknown_currency(self):
+        self.assertEqual((404, b'Currency not found: USD', server.TEXT),
+                         self.server.handle('/rate/USD', {'format': 'text'}))
+
+    def test_metrics(self):
+        mnbexchangerates_metrics.enable(mnbexchangerates_metrics.MNBExchangeRateMetrics()).increment('cache_hits_total')
+        self.addCleanup(mnbexchangerates_metrics.disable)
+        status, body, content_type = self.server.handle('/metrics', {})
+        self.assertEqual((200, mnbexchangerates_metrics.PROMETHEUS_CONTENT_TYPE), (status, content_type))
+        self.assertIn(b'mnbexchangerates_cache_hits_total 1\n', body)
+
+    def test_unknown_path(self):
+        self.assertEqual(404, self.server.handle('/unknown', {})[0])
+
+    def test_fetch_failure(self):
+        self.mnb.get_table.side_effect = Exception('Connection refused')
+        self.assertEqual((503, b'{"error":"Connection refused"}', server.JSON), self.server.handle('/rates', {}))
+
+
+class MNBExchangeRateClientTest(unittest.TestCase):
+
+    def setUp(self):
+        mnb = mock.MagicMock()
+        mnb.format_rate = mnbexchangerates.MNBExchangeRates.format_rate
+        mnb.format_exchange = mnbexchangerates.MNBExchangeRates.format_exchange
+        mnb.get_table.return_value = mnbexchangerates_table.MNBExchangeRateTable.from_rates(RATES)
+        mnb.cache.expiry.return_value = datetime.max
+        self.server = server.MNBExchangeRateServer(mnb, port=0)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.client = mnbexchangerates_client.MNBExchangeRateClient(
+            'http://%s:%s' % self.server.httpd.server_address[:2])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+
+    def test_rate(self):
+        self.assertEqual('MNB exchange rate of  1 EUR = 310,25 HUF  (2018-01-03)',
+                         self.client.get_str_of_rate_for_currency('eur'))
+
+    def test_exchange(self):
+        self.assertEqual('MNB exchange rate of  2 EUR = 620,5 HUF  (2018-01-03)',
+                         self.client.get_exchange_of_amount('eur', 2.0))
+
+    def test_error(self):
+        self.assertEqual('Currency not found: USD', self.client.get_str_of_rate_for_currency('usd'))
+
+    def test_structured(self):
+        self.assertEqual({'date': '2018-01-03', 'unit': 100, 'currency': 'JPY', 'rate': 230.5},
+                         self.client.get_rate_for_currency('jpy'))
+        self.assertEqual(620.5, self.client.exchange('eur', 2.0)['value'])
+        with self.assertRaisesRegex(Exception, 'Currency not found: USD'):
+            self.client.exchange('usd', 1)
+
+    def test_server_not_available(self):
+        client = mnbexchangerates_client.MNBExchangeRateClient('http://127.0.0.1:1', timeout=1)
+        self.assertTrue(client.get_str_of_rate_for_currency('eur').startswith('Server not available'))
+        with self.assertRaisesRegex(Exception, 'Server not available'):
+            client.get_rate_for_currency('eur')
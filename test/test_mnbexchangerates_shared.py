@@ -0,0 +1,104 @@
+from datetime import datetime
+from datetime import timedelta
+import threading
+import time
+
+import mock
+import unittest
+
+from mnbexchangerates import mnbexchangerates_shared as shared
+from mnbexchangerates import mnbexchangerates_table
+
+
+OLD_TABLE = mnbexchangerates_table.MNBExchangeRateTable('2024-03-14', [('1', 'EUR', '393,95'), ('100', 'JPY', '243,5')])
+NEW_TABLE = mnbexchangerates_table.MNBExchangeRateTable('2024-03-15', [('1', 'EUR', '394,10')])
+PAST_TABLE = mnbexchangerates_table.MNBExchangeRateTable('2020-01-02', [('1', 'EUR', '330,52')])
+
+
+class MNBExchangeRateSharedClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mnb = mock.MagicMock()
+        self.mnb.cache.cache_only = False
+        self.mnb.cache.expiry.return_value = datetime.now() + timedelta(hours=1)
+        self.mnb.get_table.return_value = OLD_TABLE
+        self.client = shared.MNBExchangeRateSharedClient(self.mnb)
+
+    def test_table_is_read_without_refresh(self):
+        self.assertIs(OLD_TABLE, self.client.get_table())
+        self.assertIs(OLD_TABLE, self.client.get_table())
+        self.mnb.get_table.assert_called_once_with()
+        self.mnb.cache.expiry.assert_called_once_with('2024-03-14')
+
+    def test_expired_table_is_swapped(self):
+        self.client.get_table()
+        self.client.current = (OLD_TABLE, datetime.now() - timedelta(seconds=1))
+        self.mnb.get_table.return_value = NEW_TABLE
+        self.assertIs(NEW_TABLE, self.client.get_table())
+        self.assertIs(NEW_TABLE, self.client.current[0])
+
+    def test_cache_only_never_expires(self):
+        self.mnb.cache.cache_only = True
+        self.client.get_table()
+        self.assertEqual(datetime.max, self.client.current[1])
+
+    def test_old_table_is_served_while_refreshing(self):
+        self.client.current = (OLD_TABLE, datetime.now() - timedelta(seconds=1))
+        with self.client.lock:
+            self.assertIs(OLD_TABLE, self.client.get_table())
+        self.mnb.get_table.assert_not_called()
+
+    def test_concurrent_readers_refresh_once(self):
+        def slow_table():
+            time.sleep(0.05)
+            return OLD_TABLE
+        self.mnb.get_table.side_effect = slow_table
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.client.get_table())) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([OLD_TABLE] * 20, results)
+        self.mnb.get_table.assert_called_once_with()
+
+    def test_refresh_error(self):
+        self.mnb.get_table.side_effect = Exception('Server response: 500')
+        with self.assertRaises(Exception):
+            self.client.get_table()
+        self.assertIsNone(self.client.current)
+        self.client.current = (OLD_TABLE, datetime.now() - timedelta(seconds=1))
+        with self.assertRaisesRegex(Exception, 'Server response: 500'):
+            self.client.get_table()
+        self.assertIs(OLD_TABLE, self.client.get_table())
+        self.assertEqual(2, self.mnb.get_table.call_count)
+
+    def test_past_tables(self):
+        self.mnb.get_table.return_value = PAST_TABLE
+        self.assertIs(PAST_TABLE, self.client.get_table('2020-01-02'))
+        self.assertIs(PAST_TABLE, self.client.get_table('2020-01-02'))
+        self.mnb.get_table.assert_called_once_with('2020-01-02')
+
+    def test_rates(self):
+        self.assertEqual({'date': '2024-03-14', 'unit': 100, 'currency': 'JPY', 'rate': 243.5},
+                         self.client.get_rate_for_currency('jpy'))
+        self.assertEqual(787.9, self.client.exchange('EUR', 2)['value'])
+        self.assertAlmostEqual(393.95 / 2.435, self.client.cross_rate('eur', 'jpy'))
+        self.assertAlmostEqual(787.9, self.client.convert(2, 'EUR', 'HUF'))
+        self.assertEqual(2, len(self.client.convert_many([('EUR', 1), ('JPY', 100)])))
+        with self.assertRaisesRegex(Exception, 'Currency not found: USD'):
+            self.client.get_rate_for_currency('usd')
+
+    @mock.patch('mnbexchangerates.mnbexchangerates_scheduler.MNBExchangeRatePrefetchScheduler')
+    def test_prefetch(self, mock_scheduler):
+        self.client.start_prefetch(retry_interval=10)
+        mock_scheduler.assert_called_once_with(self.mnb, on_update=self.client._update, lock=self.client.lock,
+                                               retry_interval=10)
+        self.client._update(NEW_TABLE)
+        self.assertIs(NEW_TABLE, self.client.get_table())
+        self.client.close()
+        mock_scheduler.return_value.start.return_value.stop.assert_called_once_with()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import math
+import os
+import random
+import shutil
+import statistics
+import tempfile
+
+import mock
+import unittest
+
+from mnbexchangerates import mnbexchangerates_binary
+from mnbexchangerates import mnbexchangerates_history
+from mnbexchangerates import mnbexchangerates_stats as stats
+
+
+DAYS = [{'date': '2024-03-11', 'rates': [('1', 'EUR', '390,00'), ('100', 'JPY', '240,00')]},
+        {'date': '2024-03-12', 'rates': [('1', 'EUR', '392,00'), ('100', 'JPY', '242,00')]},
+        {'date': '2024-03-13', 'rates': [('1', 'EUR', '388,00')]},
+        {'date': '2024-03-14', 'rates': [('1', 'EUR', '394,00'), ('100', 'JPY', '243,00')]},
+        {'date': '2024-03-15', 'rates': [('1', 'EUR', '393,00'), ('100', 'JPY', '241,00')]}]
+
+
+class SparseTableTest(unittest.TestCase):
+
+    def test_range_query(self):
+        values = [random.Random(index).random() for index in range(37)]
+        table = stats.sparse_table(values, min)
+        for first in range(len(values)):
+            for last in range(first + 1, len(values) + 1):
+                self.assertEqual(min(values[first:last]), stats.range_query(table, min, first, last))
+
+
+class MNBExchangeRateSeriesTest(unittest.TestCase):
+
+    def setUp(self):
+        generator = random.Random(1)
+        self.rates = [300 + generator.random() * 100 for _ in range(200)]
+        self.series = stats.MNBExchangeRateSeries(
+            'EUR', [(738000 + index, 1, round(rate * 10 ** 6)) for index, rate in enumerate(self.rates)])
+
+    def test_aggregate_matches_direct_computation(self):
+        for first, last in ((0, 200), (17, 18), (17, 19), (5, 120), (199, 200)):
+            rates = self.rates[first:last]
+            aggregate = self.series.aggregate(first, last)
+            self.assertEqual(last - first, aggregate['days'])
+            self.assertAlmostEqual(statistics.mean(rates), aggregate['average'], places=5)
+            self.assertAlmostEqual(min(rates), aggregate['min'], places=5)
+            self.assertAlmostEqual(max(rates), aggregate['max'], places=5)
+            returns = [math.log(current / previous) for previous, current in zip(rates, rates[1:])]
+            if len(returns) < 2:
+                self.assertIsNone(aggregate['volatility'])
+            else:
+                self.assertAlmostEqual(statistics.stdev(returns), aggregate['volatility'], places=9)
+
+    def test_empty_range(self):
+        self.assertIsNone(self.series.aggregate(5, 5))
+
+    def test_rolling(self):
+        windows = self.series.rolling(0, 10, 3)
+        self.assertEqual(8, len(windows))
+        self.assertEqual(mnbexchangerates_binary.from_ordinal(738002), windows[0]['end'])
+        self.assertAlmostEqual(statistics.mean(self.rates[7:10]), windows[-1]['average'], places=5)
+
+    def test_unit_change(self):
+        series = stats.MNBExchangeRateSeries('JPY', [(738000, 1, 2430000), (738001, 100, 245000000)])
+        self.assertEqual(100, series.unit)
+        self.assertEqual([243.0, 245.0], series.rates)
+
+
+class MNBExchangeRateStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.patch_file = mock.patch('mnbexchangerates.mnbexchangerates_history.RATES_HISTORY_FILE',
+                                     os.path.join(self.tmp_dir, 'history.cache'))
+        self.patch_file.start()
+        self.mnb = mock.MagicMock()
+        self.mnb.history = mnbexchangerates_history.MNBExchangeRateHistory()
+        self.mnb.history.add(DAYS, '2024-03-11', '2024-03-17', ['EUR', 'JPY'])
+        self.stats = stats.MNBExchangeRateStats(self.mnb)
+
+    def tearDown(self):
+        self.patch_file.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_summary(self):
+        summary = self.stats.summary('eur', '2024-03-12', '2024-03-17')
+        self.assertEqual({'currency': 'EUR', 'unit': 1, 'start': '2024-03-12', 'end': '2024-03-15', 'days': 4,
+                          'first': 392.0, 'last': 393.0, 'average': 391.75, 'min': 388.0, 'max': 394.0},
+                         {key: value for key, value in summary.items() if key != 'volatility'})
+        self.assertGreater(summary['volatility'], 0)
+        self.mnb.fetch_rate_history.assert_not_called()
+
+    def test_summary_of_unit_currency(self):
+        summary = self.stats.summary('JPY', '2024-03-11', '2024-03-15')
+        self.assertEqual((100, 4, 240.0, 243.0), (summary['unit'], summary['days'], summary['min'], summary['max']))
+
+    def test_missing_dates_are_fetched(self):
+        self.mnb.fetch_rate_history.return_value = [{'date': '2024-03-08', 'rates': [('1', 'EUR', '380,00')]}]
+        summary = self.stats.summary('EUR', '2024-03-04', '2024-03-15')
+        self.mnb.fetch_rate_history.assert_called_once_with('2024-03-04', '2024-03-10', ['EUR'], store=False)
+        self.assertEqual((6, 380.0), (summary['days'], summary['min']))
+
+    def test_failed_fetch(self):
+        self.mnb.fetch_rate_history.side_effect = Exception('Server response: 500')
+        with self.assertRaisesRegex(Exception, 'Server response: 500'):
+            self.stats.summary('EUR', '2024-03-04', '2024-03-15')
+
+    def test_without_fetch(self):
+        rate_stats = stats.MNBExchangeRateStats(self.mnb, fetch=False)
+        self.assertEqual(5, rate_stats.summary('EUR', '2024-03-04', '2024-03-15')['days'])
+        with self.assertRaisesRegex(Exception, 'No exchange rates found for EUR'):
+            rate_stats.summary('EUR', '2024-02-01', '2024-02-10')
+        self.mnb.fetch_rate_history.assert_not_called()
+
+    def test_series_is_built_once_per_history_file(self):
+        series = self.stats.series('EUR')
+        self.assertIs(series, self.stats.series('EUR'))
+        self.mnb.history.add(DAYS[:1], '2024-03-11', '2024-03-11', ['EUR'])
+        self.assertIsNot(series, self.stats.series('EUR'))
+
+    def test_rolling(self):
+        windows = self.stats.rolling('EUR', '2024-03-11', '2024-03-15', 2)
+        self.assertEqual(['2024-03-12', '2024-03-13', '2024-03-14', '2024-03-15'],
+                         [window['end'] for window in windows])
+        self.assertEqual([391.0, 390.0, 391.0, 393.5], [window['average'] for window in windows])
+        with self.assertRaises(ValueError):
+            self.stats.rolling('EUR', '2024-03-11', '2024-03-15', 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+
+from mnbexchangerates import mnbexchangerates_table as table
+
+
+RATES = {'date': '2018-01-03', 'rates': [('1', 'EUR', '310,25'), ('100', 'JPY', '230,50')]}
+
+
+class MNBExchangeRateTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table = table.MNBExchangeRateTable.from_rates(RATES)
+
+    def test_index(self):
+        self.assertEqual('2018-01-03', self.table.date)
+        self.assertEqual({'EUR': (1, 310.25), 'JPY': (100, 230.5)}, self.table.index)
+        self.assertEqual(2, len(self.table))
+        self.assertIn('EUR', self.table)
+
+    def test_get(self):
+        self.assertEqual((100, 230.5), self.table.get('JPY'))
+        self.assertIsNone(self.table.get('USD'))
+
+    def test_rate_string_is_not_a_currency(self):
+        self.assertIsNone(self.table.get('310,25'))
+
+    def test_exchange(self):
+        self.assertEqual(620.5, self.table.exchange('EUR', 2))
+        self.assertEqual(461.0, self.table.exchange('JPY', '200'))
+
+    def test_exchange_unknown_currency(self):
+        with self.assertRaises(KeyError):
+            self.table.exchange('USD', 1)
+
+    def test_parse_rate(self):
+        self.assertEqual(310.25, table.parse_rate('310,25'))
+
+    def test_cross_rates(self):
+        cross_rates = self.table.cross_rates()
+        self.assertEqual(['EUR', 'HUF', 'JPY'], cross_rates['currencies'])
+        self.assertIs(cross_rates, self.table.cross_rates())
+        self.assertEqual(1.0, self.table.cross_rate('EUR', 'EUR'))
+        self.assertEqual(310.25, self.table.cross_rate('EUR', 'HUF'))
+        self.assertAlmostEqual(1 / 310.25, self.table.cross_rate('HUF', 'EUR'))
+        # 100 JPY = 230.50 HUF, so 1 EUR = 310.25 / 2.305 JPY
+        self.assertAlmostEqual(134.598698, self.table.cross_rate('EUR', 'JPY'), places=6)
+        self.assertAlmostEqual(1.0, self.table.cross_rate('EUR', 'JPY') * self.table.cross_rate('JPY', 'EUR'))
+
+    def test_cross_rate_unknown_currency(self):
+        with self.assertRaisesRegex(Exception, 'Currency not found: USD'):
+            self.table.cross_rate('EUR', 'USD')
+
+    def test_rate_dict(self):
+        self.assertEqual({'date': '2018-01-03', 'unit': 100, 'currency': 'JPY', 'rate': 230.5},
+                         self.table.rate_dict('JPY'))
+        self.assertIsNone(self.table.rate_dict('USD'))
+
+    def test_convert_many(self):
+        records = self.table.convert_many([('eur', 2), ('JPY', 200)])
+        self.assertEqual([620.5, 461.0], [record['value'] for record in records])
+
+    def test_convert_many_unknown_currency(self):
+        with self.assertRaises(Exception):
+            self.table.convert_many([('USD', 1)])
+
+    def test_fixed_point_rates(self):
+        self.assertEqual(393950000, table.parse_fixed('393,95'))
+        self.assertEqual(1234, table.parse_fixed('0,001234'))
+        self.assertEqual('393,95', table.fixed_to_str(393950000))
+        self.assertEqual('500,00', table.fixed_to_str(table.parse_fixed('500,000')))
+        self.assertEqual('0,001234', table.fixed_to_str(1234))
+        self.assertEqual('-1,50', table.fixed_to_str(-1500000))
+
+
+class MNBExchangeRateTableCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = table.MNBExchangeRateTableCache(maxsize=2)
+
+    def test_days_without_publication_share_the_value(self):
+        self.cache.put('2024-03-16', '2024-03-14', 'rates of 03-14')
+        self.assertEqual('rates of 03-14', self.cache.get('2024-03-16'))
+        self.assertEqual('rates of 03-14', self.cache.get('2024-03-14'))
+        self.assertIsNone(self.cache.get('2024-03-17'))
+        self.assertEqual(1, len(self.cache))
+
+    def test_least_recently_used_are_evicted(self):
+        self.cache.put('2024-03-12', '2024-03-12', 'rates of 03-12')
+        self.cache.put('2024-03-13', '2024-03-13', 'rates of 03-13')
+        self.cache.get('2024-03-12')
+        self.cache.put('2024-03-14', '2024-03-14', 'rates of 03-14')
+        self.assertIsNone(self.cache.get('2024-03-13'))
+        self.assertEqual('rates of 03-12', self.cache.get('2024-03-12'))
+        self.assertEqual(2, len(self.cache))
+        self.assertEqual(2, len(self.cache.dates))
@@ -0,0 +1,110 @@
+import mock
+import unittest
+
+import requests
+
+from mnbexchangerates import mnbexchangerates_metrics
+from mnbexchangerates import mnbexchangerates_transport as transport
+
+
+URL = 'http://localhost/arfolyamok.asmx?wsdl'
+HEADERS = {'content-type': 'application/soap+xml'}
+
+
+def response(status_code):
+    mock_response = mock.MagicMock()
+    mock_response.status_code = status_code
+    return mock_response
+
+
+class MNBExchangeRateTransportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.patch_session = mock.patch('mnbexchangerates.mnbexchangerates_transport.requests.Session')
+        self.mock_session = self.patch_session.start()
+        self.mock_post = self.mock_session.return_value.post
+        self.patch_sleep = mock.patch('mnbexchangerates.mnbexchangerates_transport.time.sleep')
+        self.mock_sleep = self.patch_sleep.start()
+        self.transport = transport.MNBExchangeRateTransport(URL, HEADERS, debug=True,
+                                                            connect_timeout=1, read_timeout=5, retries=2)
+
+    def tearDown(self):
+        self.patch_session.stop()
+        self.patch_sleep.stop()
+
+    def test_post(self):
+        self.mock_post.return_value = response(200)
+        self.assertEqual(200, self.transport.post('body').status_code)
+        self.mock_post.assert_called_with(URL, data='body', timeout=(1, 5), stream=False)
+        self.mock_session.return_value.headers.update.assert_called_with(HEADERS)
+        self.mock_sleep.assert_not_called()
+
+    def test_session_is_reused(self):
+        self.mock_post.return_value = response(200)
+        self.transport.post('body')
+        self.transport.post('body')
+        self.mock_session.assert_called_once()
+        self.assertEqual(2, self.transport.stats()['requests'])
+
+    def test_retry_on_server_error(self):
+        self.mock_post.side_effect = [response(503), response(200)]
+        self.assertEqual(200, self.transport.post('body').status_code)
+        self.assertEqual(1, self.mock_sleep.call_count)
+        self.assertEqual([503, 200], [attempt['status'] for attempt in self.transport.attempts])
+        self.assertEqual({'requests': 1, 'attempts': 2}, {key: self.transport.stats()[key]
+                                                          for key in ('requests', 'attempts')})
+
+    def test_metrics(self):
+        metrics = mnbexchangerates_metrics.enable(mnbexchangerates_metrics.MNBExchangeRateMetrics())
+        self.addCleanup(mnbexchangerates_metrics.disable)
+        self.mock_post.side_effect = [response(503), response(200), requests.Timeout('dummy'),
+                                      requests.Timeout('dummy'), requests.Timeout('dummy')]
+        self.transport.post('body')
+        with self.assertRaises(requests.Timeout):
+            self.transport.post('body')
+        snapshot = metrics.snapshot()
+        self.assertEqual({'soap_requests_total': 2, 'soap_retries_total': 3, 'soap_request_errors_total': 1},
+                         snapshot['counters'])
+        self.assertEqual(5, snapshot['histograms']['soap_request_seconds']['count'])
+
+    def test_no_retry_on_client_error(self):
+        self.mock_post.return_value = response(404)
+        self.assertEqual(404, self.transport.post('body').status_code)
+        self.mock_post.assert_called_once()
+
+    def test_retries_exhausted(self):
+        self.mock_post.return_value = response(500)
+        self.assertEqual(500, self.transport.post('body').status_code)
+        self.assertEqual(3, self.mock_post.call_count)
+        self.assertEqual(2, self.mock_sleep.call_count)
+
+    def test_retry_on_connection_error(self):
+        self.mock_post.side_effect = [requests.ConnectionError('dummy'), requests.Timeout('dummy'), response(200)]
+        self.assertEqual(200, self.transport.post('body').status_code)
+        self.assertEqual(['ConnectionError', 'Timeout', 200],
+                         [attempt['status'] for attempt in self.transport.attempts])
+
+    def test_connection_error_after_retries(self):
+        self.mock_post.side_effect = requests.ConnectionError('dummy')
+        with self.assertRaises(requests.ConnectionError):
+            self.transport.post('body')
+        self.assertEqual(3, self.mock_post.call_count)
+
+    def test_backoff_is_bounded_and_jittered(self):
+        self.transport = transport.MNBExchangeRateTransport(URL, HEADERS, backoff=1, max_backoff=4, retries=5)
+        self.mock_post.return_value = response(500)
+        self.transport.post('body')
+        delays = [call[0][0] for call in self.mock_sleep.call_args_list]
+        for delay, limit in zip(delays, [1, 2, 4, 4, 4]):
+            self.assertTrue(limit / 2 <= delay <= limit)
+
+    def test_stats_without_requests(self):
+        self.assertEqual({'requests': 0, 'attempts': 0, 'last_latency': None, 'max_latency': None},
+                         self.transport.stats())
+
+    def test_close(self):
+        self.mock_post.return_value = response(200)
+        self.transport.post('body')
+        self.transport.close()
+        self.mock_session.return_value.close.assert_called_once()
+        self.assertIsNone(self.transport.session)
@@ -0,0 +1,106 @@
+from decimal import Decimal
+import random
+import unittest
+
+import mock
+
+from mnbexchangerates import mnbexchangerates_table
+from mnbexchangerates import mnbexchangerates_vector as vector
+
+np = vector.np
+
+RATES = {'date': '2024-03-14', 'rates': [('1', 'EUR', '393,95'), ('100', 'JPY', '242,37'), ('1', 'USD', '360,1234')]}
+OLD_RATES = {'date': '2024-03-01', 'rates': [('1', 'EUR', '390,00')]}
+
+
+def expected(amount, currency, rates, rounding, amount_decimals=2, decimals=2):
+    unit, rate = mnbexchangerates_table.MNBExchangeRateTable.from_rates(rates).fixed_index()[currency.upper()]
+    value = Decimal(amount).scaleb(-amount_decimals) * rate / mnbexchangerates_table.RATE_SCALE / unit
+    return int(value.scaleb(decimals).quantize(Decimal(1), rounding=rounding))
+
+
+@unittest.skipIf(np is None, 'NumPy is not installed')
+class MNBExchangeRateVectorEngineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mnb = mock.MagicMock()
+        tables = {None: mnbexchangerates_table.MNBExchangeRateTable.from_rates(RATES),
+                  '2024-03-01': mnbexchangerates_table.MNBExchangeRateTable.from_rates(OLD_RATES)}
+        self.mnb.get_table.side_effect = lambda date=None: tables[date]
+        self.engine = vector.MNBExchangeRateVectorEngine(self.mnb)
+
+    def test_convert(self):
+        values = self.engine.convert(np.array([100, 250, -1]), ['EUR', 'jpy', 'USD'], amounts_scaled=True)
+        self.assertEqual(np.int64, values.dtype)
+        # 1 EUR = 393.95 HUF, 2.50 JPY = 6.05925 HUF, -0.01 USD = -3.601234 HUF
+        self.assertEqual([39395, 606, -360], values.tolist())
+
+    def test_convert_integers_as_currency_units(self):
+        self.assertEqual([39395, 242], self.engine.convert([1, 1], ['EUR', 'JPY']).tolist())
+        self.assertEqual([39395], self.engine.convert(np.array([1], dtype=np.uint8), ['EUR']).tolist())
+
+    def test_convert_strings_and_decimals_exactly(self):
+        values = self.engine.convert(['0,1', Decimal('1234567890.12'), '3'], ['USD', 'EUR', 'JPY'])
+        self.assertEqual([3601, 48635802031277, 727], values.tolist())
+
+    def test_convert_floats(self):
+        self.assertEqual([39395, 3601], self.engine.convert([1.0, 0.1], ['EUR', 'USD']).tolist())
+
+    def test_rounding_modes_match_decimal(self):
+        rng = random.Random(1)
+        amounts = [rng.randint(-10 ** 15, 10 ** 15) for _ in range(2000)] + [-1, 1, 50, -50, 0]
+        currencies = [rng.choice(['EUR', 'JPY', 'USD']) for _ in amounts]
+        for rounding in vector.ROUNDING_MODES:
+            engine = vector.MNBExchangeRateVectorEngine(self.mnb, rounding=rounding)
+            values = engine.convert(np.array(amounts, dtype=np.int64), currencies, amounts_scaled=True)
+            self.assertEqual([expected(amount, currency, RATES, rounding)
+                              for amount, currency in zip(amounts, currencies)], values.tolist(), rounding)
+
+    def test_half_rounding(self):
+        # 0.05 EUR = 19.6975 HUF and 0.15 EUR = 59.0925 HUF are ties at 3 decimals
+        amounts = np.array([5, -5, 15, -15])
+        currencies = ['EUR'] * 4
+        for rounding, values in ((vector.ROUND_HALF_EVEN, [19698, -19698, 59092, -59092]),
+                                 (vector.ROUND_HALF_UP, [19698, -19698, 59093, -59093]),
+                                 (vector.ROUND_HALF_DOWN, [19697, -19697, 59092, -59092])):
+            engine = vector.MNBExchangeRateVectorEngine(self.mnb, decimals=3, rounding=rounding)
+            self.assertEqual(values, engine.convert(amounts, currencies, amounts_scaled=True).tolist())
+
+    def test_convert_with_dates(self):
+        values = self.engine.convert(np.array([[100, 100], [200, 100]]), [['EUR', 'EUR'], ['EUR', 'USD']],
+                                     dates=[['2024-03-01', ''], ['2024-03-01', '']], amounts_scaled=True)
+        self.assertEqual([[39000, 39395], [78000, 36012]], values.tolist())
+        self.assertEqual(2, self.mnb.get_table.call_count)
+
+    def test_unknown_currency(self):
+        with self.assertRaisesRegex(Exception, 'Currency not found: CHF'):
+            self.engine.convert([1], ['chf'])
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            vector.MNBExchangeRateVectorEngine(self.mnb, rounding='nearest')
+        with self.assertRaises(ValueError):
+            vector.MNBExchangeRateVectorEngine(self.mnb, decimals=9)
+        with self.assertRaises(ValueError):
+            self.engine.convert([1, 2], ['EUR'])
+        with self.assertRaisesRegex(ValueError, 'Scaled amounts must be integers'):
+            self.engine.convert([1.5], ['EUR'], amounts_scaled=True)
+
+    def test_overflow(self):
+        # At 393.95 HUF the products fit in int64 up to about 1.17 * 10^16 cents
+        self.assertEqual([expected(10 ** 16, 'EUR', RATES, vector.ROUND_HALF_EVEN)],
+                         self.engine.convert([10 ** 16], ['EUR'], amounts_scaled=True).tolist())
+        for amounts, scaled in (([3 * 10 ** 16], True), ([10 ** 17], False), ([1e17], False), (['1e17'], False)):
+            with self.assertRaisesRegex(ValueError, 'too large', msg=amounts):
+                self.engine.convert(amounts, ['EUR'], amounts_scaled=scaled)
+
+    def test_factorize(self):
+        codes, inverse = vector.factorize(np.array([['EUR', 'usd'], ['EUR', '']]))
+        self.assertEqual(['', 'EUR', 'usd'], codes.tolist())
+        self.assertEqual([[1, 2], [1, 0]], inverse.tolist())
+        codes, inverse = vector.factorize(['2024-03-01', '2024-02-01', '2024-03-01'])
+        self.assertEqual(['2024-02-01', '2024-03-01'], codes.tolist())
+        self.assertEqual([1, 0, 1], inverse.tolist())
+
+    def test_to_decimal(self):
+        self.assertEqual([Decimal('393.95'), Decimal('-0.05')], self.engine.to_decimal(np.array([39395, -5])))